@@ -0,0 +1,382 @@
+import argparse
+import contextlib
+import http.server
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Iterator
+
+import ytad
+
+
+FIXTURES = {
+    'audio.webm': ['-f', 'lavfi', '-i', 'sine=frequency=440:duration={duration}', '-c:a', 'libopus', '-b:a', '128k'],
+    'audio.m4a': ['-f', 'lavfi', '-i', 'sine=frequency=440:duration={duration}', '-c:a', 'aac', '-b:a', '128k'],
+    'video.mp4': ['-f', 'lavfi', '-i', 'testsrc=duration={duration}:size=1280x720:rate=30',
+                  '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p'],
+    'thumb.jpg': ['-f', 'lavfi', '-i', 'testsrc=size=480x360', '-frames:v', '1'],
+}
+
+def generate_fixtures(directory: str, duration: int, ffmpeg: str) -> Dict[str, bytes]:
+    """Generate (or reuse) the media fixtures served by the benchmark server"""
+    os.makedirs(directory, exist_ok=True)
+    fixtures = {}
+    for name, args in FIXTURES.items():
+        path = os.path.join(directory, f'{duration}s_{name}')
+        if not os.path.exists(path):
+            command = [ffmpeg, '-loglevel', 'error', '-y'] + [arg.format(duration=duration) for arg in args] + [path]
+            subprocess.run(command, check=True)
+        with open(path, 'rb') as f:
+            fixtures[name] = f.read()
+    return fixtures
+
+class MediaHandler(http.server.BaseHTTPRequestHandler):
+    """Serves fixtures with Range support, injected latency, bandwidth limits and errors"""
+    protocol_version = 'HTTP/1.1'
+    server: 'MediaServer'
+
+    def _serve(self, send_body: bool) -> None:
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and server.random.random() < server.error_rate:
+            with server.lock:
+                server.errors_injected += 1
+            self.send_error(server.error_status)
+            return
+
+        data = server.fixtures.get(self.path.split('?', 1)[0].lstrip('/'))
+        if data is None:
+            self.send_error(404)
+            return
+
+        start, end = 0, len(data) - 1
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(end, int(match.group(2))) if match.group(2) else end
+            else:
+                start = max(0, len(data) - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+
+        chunk_size = 64 * 1024
+        position = start
+        while position <= end:
+            chunk = data[position:min(end + 1, position + chunk_size)]
+            self.wfile.write(chunk)
+            position += len(chunk)
+            with server.lock:
+                server.bytes_sent += len(chunk)
+            if server.bandwidth:
+                time.sleep(len(chunk) / server.bandwidth)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def log_message(self, format, *args):
+        pass
+
+class MediaServer(http.server.ThreadingHTTPServer):
+    """Local media server for offline benchmarks"""
+    daemon_threads = True
+
+    def __init__(self, fixtures: Dict[str, bytes], latency: float = 0.0, bandwidth: Optional[float] = None,
+                 error_rate: float = 0.0, error_status: int = 503, seed: int = 0):
+        super().__init__(('127.0.0.1', 0), MediaHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+        self.errors_injected = 0
+
+    def handle_error(self, request, client_address):
+        # Clients abandon connections when they retry or cancel a range; that is not a server error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self) -> None:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+class FakeExtractor:
+    """Stands in for yt-dlp extraction: info dicts whose formats point at the local media server"""
+    def __init__(self, server: MediaServer, duration: int, latency: float = 0.0):
+        self.server = server
+        self.duration = duration
+        self.latency = latency
+        self.extractions = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, url: str) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.extractions += 1
+        video_id = url.rsplit('=', 1)[-1]
+        base = self.server.base_url
+        sizes = {name: len(data) for name, data in self.server.fixtures.items()}
+        return {
+            'id': video_id,
+            'title': f'Benchmark {video_id}',
+            'extractor': 'benchmark',
+            'extractor_key': 'Benchmark',
+            'webpage_url': url,
+            'duration': self.duration,
+            'thumbnails': [{'id': '0', 'url': f'{base}/thumb.jpg'}],
+            'formats': [
+                {'format_id': '251', 'url': f'{base}/audio.webm', 'ext': 'webm', 'protocol': 'http',
+                 'acodec': 'opus', 'vcodec': 'none', 'abr': 128, 'filesize': sizes['audio.webm']},
+                {'format_id': '140', 'url': f'{base}/audio.m4a', 'ext': 'm4a', 'protocol': 'http',
+                 'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 128, 'filesize': sizes['audio.m4a']},
+                {'format_id': '136', 'url': f'{base}/video.mp4', 'ext': 'mp4', 'protocol': 'http',
+                 'acodec': 'none', 'vcodec': 'avc1.64001f', 'height': 720, 'width': 1280, 'fps': 30,
+                 'filesize': sizes['video.mp4']},
+            ],
+        }
+
+class BenchDownloader(ytad.Downloader):
+    """Downloader whose playlists are generated locally instead of extracted"""
+    def extract_playlist(self, url: str) -> Optional[dict]:
+        playlist_id = url.rsplit('=', 1)[-1]
+        size = int(playlist_id.rsplit('-', 1)[-1])
+
+        def entries() -> Iterator[dict]:
+            for i in range(size):
+                video_id = f'{playlist_id}-{i:04d}'
+                yield {'_type': 'url', 'id': video_id, 'title': f'Benchmark {video_id}',
+                       'url': f'https://www.youtube.com/watch?v={video_id}'}
+
+        return {'_type': 'playlist', 'id': playlist_id, 'title': f'Benchmark {playlist_id}', 'entries': entries()}
+
+def cpu_seconds() -> float:
+    """CPU time used so far by this process and its finished children (FFmpeg)"""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+class DiskSampler:
+    """Samples the size of a directory tree in the background and keeps the peak"""
+    def __init__(self, directory: str, interval: float = 0.01):
+        self.directory = directory
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def size(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                with contextlib.suppress(OSError):
+                    total += os.path.getsize(os.path.join(root, name))
+        return total
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.size())
+
+    def __enter__(self) -> 'DiskSampler':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+def run_scenario(name: str, urls: List[str], download_format: ytad.DownloadFormat,
+                 server: MediaServer, args: argparse.Namespace) -> dict:
+    """Run one scenario in a scratch directory and return its measurements"""
+    extractor = FakeExtractor(server, args.duration, args.extract_latency)
+    with tempfile.TemporaryDirectory(prefix='ytad-bench-') as output_dir, \
+            open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        downloader = BenchDownloader(info_cache=ytad.InfoCache(extractor),
+                                     cache_dir=os.path.join(output_dir, '.cache'))
+        downloader.options = ytad.JobOptions(download_format=download_format,
+                                             audio_codec=ytad.AudioCodec(args.audio_format))
+        downloader.max_workers = args.workers
+        downloader.retry_policy = ytad.RetryPolicy(args.retries, args.retry_budget, base_delay=args.retry_delay)
+        downloader.segment_connections = args.segments
+        downloader.stream_merge_enabled = args.stream_merge
+        downloader.segment_min_bytes = int(args.segment_min_size * 1024 * 1024)
+        if args.postprocess_workers:
+            downloader.postprocess_workers = args.postprocess_workers
+
+        bytes_before = server.bytes_sent
+        cpu_before = cpu_seconds()
+        start = time.monotonic()
+        with DiskSampler(output_dir) as disk:
+            results = downloader.run_batch(urls, output_dir)
+        wall = time.monotonic() - start
+        cpu = cpu_seconds() - cpu_before
+        output_bytes = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, dirs, files in os.walk(output_dir) if '/.' not in root.replace(os.sep, '/')
+            for name in files if not name.startswith('.')
+        )
+        received = server.bytes_sent - bytes_before
+
+    items = results.succeeded + results.failed
+    return {
+        'scenario': name,
+        'items': items,
+        'succeeded': results.succeeded,
+        'failed': results.failed,
+        'retries': results.retries,
+        'extractions': extractor.extractions,
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'peak_disk_bytes': disk.peak,
+        'output_bytes': output_bytes,
+        'copied': results.copied,
+        'transcoded': results.transcoded,
+        'items_per_second': items / wall if wall else 0.0,
+        'megabytes_per_second': received / wall / (1024 * 1024) if wall else 0.0,
+        'stages': {
+            stage: {'count': count, 'p50': p50, 'p95': p95, 'total': total}
+            for stage, (count, p50, p95, total) in downloader.metrics.stage_summary().items()
+        },
+    }
+
+def scenarios(sizes: List[int], modes: List[str]) -> Iterator[tuple]:
+    """Yield (name, urls, format) for every mode and size; size 1 is a single URL"""
+    for mode in modes:
+        download_format = ytad.DownloadFormat(mode)
+        for size in sizes:
+            if size == 1:
+                yield f'{mode}-single', ['https://www.youtube.com/watch?v=single'], download_format
+            else:
+                yield (f'{mode}-playlist-{size}',
+                       [f'https://www.youtube.com/playlist?list={mode}-{size}'], download_format)
+
+def compare(results: List[dict], baseline: dict) -> None:
+    """Print the throughput change of each scenario against a baseline run"""
+    previous = {result['scenario']: result for result in baseline.get('results', [])}
+    print(f"\n{'scenario':<24} {'items/s':>9} {'baseline':>9} {'change':>8}")
+    for result in results:
+        old = previous.get(result['scenario'])
+        if not old or not old['items_per_second']:
+            print(f"{result['scenario']:<24} {result['items_per_second']:>9.2f} {'-':>9} {'-':>8}")
+            continue
+        change = (result['items_per_second'] / old['items_per_second'] - 1) * 100
+        print(f"{result['scenario']:<24} {result['items_per_second']:>9.2f} {old['items_per_second']:>9.2f} {change:>+7.1f}%")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse benchmark options"""
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for ytad.py")
+    parser.add_argument('--sizes', default='1,10,100',
+                        help="comma-separated playlist sizes; 1 means a single URL (default: 1,10,100)")
+    parser.add_argument('--modes', default='audio,video', help="comma-separated modes (default: audio,video)")
+    parser.add_argument('--audio-format', default='mp3', choices=[codec.value for codec in ytad.AudioCodec],
+                        help="audio output format for audio scenarios (default: mp3)")
+    parser.add_argument('--duration', type=int, default=10, help="fixture length in seconds (default: 10)")
+    parser.add_argument('--latency', type=float, default=0.05, help="server latency per request in seconds")
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help="per-connection bandwidth limit in KiB/s (default: unlimited)")
+    parser.add_argument('--extract-latency', type=float, default=0.2,
+                        help="simulated extraction time per video in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument('--error-status', type=int, default=503, help="HTTP status used for injected errors")
+    parser.add_argument('--retries', type=int, default=3, help="retries per item after a transient failure")
+    parser.add_argument('--retry-budget', type=int, default=1000, help="retries allowed per scenario")
+    parser.add_argument('--retry-delay', type=float, default=0.1, help="base backoff before a retry in seconds")
+    parser.add_argument('--segments', type=int, default=4, help="connections per file for range downloads (1 disables)")
+    parser.add_argument('--segment-min-size', type=float, default=10,
+                        help="only split files of at least this many MiB (default: 10)")
+    parser.add_argument('--no-stream-merge', dest='stream_merge', action='store_false',
+                        help="download video streams one after the other and merge them with yt-dlp's Merger")
+    parser.add_argument('-w', '--workers', type=int, default=5, help="download workers")
+    parser.add_argument('--postprocess-workers', type=int, default=None, help="FFmpeg workers (default: CPU count)")
+    parser.add_argument('--results-dir', default='bench_results', help="where result files are stored")
+    parser.add_argument('--baseline', metavar='FILE', help="result file to compare against")
+    parser.add_argument('--seed', type=int, default=0, help="seed for error injection")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark scenarios and store the results"""
+    args = parse_args(argv)
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        print("❌ FFmpeg is required to generate fixtures and run postprocessing.")
+        return 1
+
+    fixtures = generate_fixtures(os.path.join(args.results_dir, 'fixtures'), args.duration, ffmpeg)
+    server = MediaServer(
+        fixtures,
+        latency=args.latency,
+        bandwidth=args.bandwidth * 1024 if args.bandwidth else None,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    server.start()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    results = []
+    print(f"{'scenario':<24} {'items':>6} {'ok':>6} {'wall':>9} {'cpu':>9} {'items/s':>9} {'MB/s':>8} {'copied':>7} {'transcoded':>10} {'peak disk':>10}")
+    for name, urls, download_format in scenarios(sizes, modes):
+        result = run_scenario(name, urls, download_format, server, args)
+        results.append(result)
+        print(f"{name:<24} {result['items']:>6} {result['succeeded']:>6} {result['wall_seconds']:>8.2f}s "
+              f"{result['cpu_seconds']:>8.2f}s {result['items_per_second']:>9.2f} {result['megabytes_per_second']:>8.2f} "
+              f"{result['copied']:>7} {result['transcoded']:>10} "
+              f"{result['peak_disk_bytes'] / result['output_bytes'] if result['output_bytes'] else 0:>9.1f}x")
+    server.shutdown()
+
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {key: value for key, value in vars(args).items() if key not in ('baseline', 'results_dir')},
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+    print(f"\n💾 {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            compare(results, json.load(f))
+    return 0 if all(result['failed'] == 0 for result in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+import collections
+import http.server
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def load_info(name: str) -> dict:
+    """A recorded yt-dlp info dict (id, duration and formats) from tests/data"""
+    with open(os.path.join(DATA_DIR, f'formats_{name}.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+class MediaHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the files of MediaServer.files with Range support, after any injected failures"""
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        data = self.server.files.get(self.path.lstrip('/'))
+        if data is None:
+            self.send_error(404)
+            return
+        failures = self.server.failures.get(self.path.lstrip('/'))
+        if failures:
+            status = failures.pop(0)
+            self.server.failed.append((self.path, status))
+            self.send_error(status)
+            return
+        self.server.requests.append((self.path, self.headers.get('Range')))
+        started = time.monotonic()
+        time.sleep(self.server.delay)
+        start, end = 0, len(data) - 1
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+        self.server.intervals.append((self.path, started, time.monotonic()))
+
+class MediaServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), MediaHandler)
+        self.files: Dict[str, bytes] = {}
+        self.requests: List[tuple] = []
+        # (path, start, end) of every served response, after a delay of self.delay seconds
+        self.intervals: List[tuple] = []
+        self.delay = 0.0
+        # Statuses to answer for a file, in order, before serving it; (path, status) of each one sent
+        self.failures: Dict[str, List[int]] = {}
+        self.failed: List[tuple] = []
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+@pytest.fixture(scope='session')
+def media_files(tmp_path_factory) -> Dict[str, bytes]:
+    """Two-second audio and video fixtures and a cover image generated with FFmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        pytest.skip('FFmpeg is required')
+    directory = tmp_path_factory.mktemp('media')
+    tone = ['-f', 'lavfi', '-i', 'sine=frequency=440:duration=2']
+    commands = {
+        'audio.m4a': tone + ['-c:a', 'aac', '-b:a', '64k'],
+        'audio.webm': tone + ['-c:a', 'libopus', '-b:a', '48k'],
+        'video.mp4': ['-f', 'lavfi', '-i', 'testsrc=duration=2:size=320x240:rate=25',
+                      '-c:v', 'libx264', '-preset', 'ultrafast', '-an'],
+        'cover.jpg': ['-f', 'lavfi', '-i', 'color=red:size=64x64', '-frames:v', '1'],
+    }
+    files = {}
+    for name, args in commands.items():
+        path = str(directory / name)
+        subprocess.run([ffmpeg, '-v', 'error', '-y'] + args + [path], check=True)
+        with open(path, 'rb') as f:
+            files[name] = f.read()
+    return files
+
+@pytest.fixture
+def media_server(media_files):
+    server = MediaServer()
+    server.files.update(media_files)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+class StubExtractor:
+    """Counts extractions and returns info dicts whose formats point at the media server"""
+    def __init__(self, server: MediaServer):
+        self.server = server
+        self.calls: Dict[str, int] = collections.Counter()
+
+    def __call__(self, url: str) -> dict:
+        self.calls[url] += 1
+        video_id = url.rsplit('=', 1)[-1]
+        base = self.server.base_url
+        return {
+            'id': video_id,
+            'title': f'Test {video_id}',
+            'extractor': 'test',
+            'extractor_key': 'Test',
+            'webpage_url': url,
+            'duration': 2,
+            'formats': [
+                {'format_id': '251', 'url': f'{base}/audio.webm', 'ext': 'webm', 'protocol': 'http',
+                 'acodec': 'opus', 'vcodec': 'none', 'abr': 48, 'filesize': len(self.server.files['audio.webm'])},
+                {'format_id': '140', 'url': f'{base}/audio.m4a', 'ext': 'm4a', 'protocol': 'http',
+                 'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 64, 'filesize': len(self.server.files['audio.m4a'])},
+                {'format_id': '136', 'url': f'{base}/video.mp4', 'ext': 'mp4', 'protocol': 'http',
+                 'acodec': 'none', 'vcodec': 'avc1.64001f', 'height': 240, 'width': 320, 'fps': 25,
+                 'filesize': len(self.server.files['video.mp4'])},
+            ],
+        }
+
+@pytest.fixture
+def extractor(media_server) -> StubExtractor:
+    return StubExtractor(media_server)
@@ -0,0 +1,82 @@
+import os
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=archive'
+OPTIONS = ytad.JobOptions(audio_codec=ytad.AudioCodec.M4A)
+
+def make_downloader(extractor, cache_dir):
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.dedupe_enabled = False
+    downloader.retry_policy = ytad.RetryPolicy(retries=0)
+    return downloader
+
+def archive_of(downloader, extractor, out):
+    """The output directory's archive and the test video's key in it"""
+    return downloader.open_archive(out), downloader.archive_key(extractor(URL), OPTIONS)
+
+def stem_of(downloader, out):
+    title = downloader.sanitize_filename('Test archive')
+    return os.path.join(out, f'{title}_archive')
+
+def media_requests(media_server):
+    return [request for request in media_server.requests if request[0] == '/audio.m4a']
+
+def test_rerun_skips_completed_items(extractor, media_server, cache_dir, tmp_path):
+    out = str(tmp_path / 'out')
+    first = make_downloader(extractor, cache_dir).download([URL], out, OPTIONS)
+    fetches = len(media_requests(media_server))
+    second = make_downloader(extractor, cache_dir).download([URL], out, OPTIONS)
+
+    assert first.succeeded == 1
+    assert second.skipped == 1 and second.succeeded == 0
+    assert second.items[0].path == first.items[0].path
+    assert len(media_requests(media_server)) == fetches
+
+def test_rerun_retries_failed_items(extractor, media_server, cache_dir, tmp_path):
+    out = str(tmp_path / 'out')
+    media_server.failures['audio.m4a'] = [404]
+    downloader = make_downloader(extractor, cache_dir)
+    first = downloader.download([URL], out, OPTIONS)
+    archive, key = archive_of(downloader, extractor, out)
+    assert first.failed == 1
+    assert archive.get(key)[0] == ytad.JobStatus.FAILED
+
+    second = make_downloader(extractor, cache_dir).download([URL], out, OPTIONS)
+
+    assert second.succeeded == 1
+    assert archive.get(key) == (ytad.JobStatus.COMPLETED, second.items[0].path)
+
+def test_partials_of_an_old_stem_are_removed(extractor, cache_dir, tmp_path):
+    out = str(tmp_path / 'out')
+    downloader = make_downloader(extractor, cache_dir)
+    archive, key = archive_of(downloader, extractor, out)
+    # Left by an interrupted run that named the item differently
+    old_stem = os.path.join(out, 'Renamed_archive')
+    archive.mark(key, ytad.JobStatus.IN_PROGRESS, path=old_stem)
+    leftovers = [f'{old_stem}.m4a.part', f'{old_stem}.f140.m4a.ytdl', f'{old_stem}.part']
+    for path in leftovers:
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+
+    results = downloader.download([URL], out, OPTIONS)
+
+    assert results.succeeded == 1
+    assert not any(os.path.exists(path) for path in leftovers)
+
+def test_in_progress_item_resumes_its_partial_download(extractor, media_server, media_files, cache_dir, tmp_path):
+    out = str(tmp_path / 'out')
+    downloader = make_downloader(extractor, cache_dir)
+    archive, key = archive_of(downloader, extractor, out)
+    stem = stem_of(downloader, out)
+    archive.mark(key, ytad.JobStatus.IN_PROGRESS, path=stem)
+    done = len(media_files['audio.m4a']) // 2
+    with open(f'{stem}.m4a.part', 'wb') as f:
+        f.write(media_files['audio.m4a'][:done])
+
+    results = downloader.download([URL], out, OPTIONS)
+
+    assert results.succeeded == 1
+    assert media_requests(media_server) == [('/audio.m4a', f'bytes={done}-')]
+    assert not os.path.exists(f'{stem}.m4a.part')
+    assert archive.get(key) == (ytad.JobStatus.COMPLETED, results.items[0].path)
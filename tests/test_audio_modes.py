@@ -0,0 +1,28 @@
+import pytest
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=modes'
+
+def download(extractor, cache_dir, out, options, stream_merge=True):
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.dedupe_enabled = False
+    downloader.stream_merge_enabled = stream_merge
+    return downloader, downloader.download([URL], out, options)
+
+def test_audio_items_count_their_mode(extractor, cache_dir, tmp_path):
+    options = ytad.JobOptions(audio_codec=ytad.AudioCodec.M4A)
+    downloader, results = download(extractor, cache_dir, str(tmp_path / 'out'), options)
+
+    assert results.succeeded == 1
+    assert (results.copied, results.transcoded) == (1, 0)
+    assert 'ytad_audio_items_total{mode="copy"} 1' in downloader.metrics.to_prometheus()
+
+@pytest.mark.parametrize('stream_merge', [True, False])
+def test_video_items_not_counted_as_audio(extractor, cache_dir, tmp_path, stream_merge):
+    options = ytad.JobOptions(download_format=ytad.DownloadFormat.VIDEO)
+    downloader, results = download(extractor, cache_dir, str(tmp_path / 'out'), options, stream_merge)
+
+    assert results.succeeded == 1
+    assert (results.copied, results.transcoded) == (0, 0)
+    assert 'ytad_audio_items_total{' not in downloader.metrics.to_prometheus()
@@ -0,0 +1,37 @@
+import resource
+import sqlite3
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=content'
+
+def stored_seconds(cache_dir):
+    with sqlite3.connect(f'{cache_dir}/{ytad.ContentIndex.FILENAME}') as db:
+        return [seconds for seconds, in db.execute('SELECT seconds FROM content')]
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def test_records_ffmpeg_cpu_seconds_per_item(extractor, cache_dir, tmp_path):
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.max_workers = downloader.postprocess_workers = 8
+    urls = [f'{URL}{n}' for n in range(16)]
+    cpu_before = children_cpu_seconds()
+    results = downloader.download(urls, str(tmp_path / 'out'))
+    cpu = children_cpu_seconds() - cpu_before
+
+    assert results.succeeded == len(urls)
+    seconds = stored_seconds(cache_dir)
+    assert len(seconds) == len(urls) and min(seconds) > 0
+    # Each item counts only its own FFmpeg runs (reported to the millisecond),
+    # not those other workers finished at the same time
+    assert sum(seconds) <= cpu + 0.001 * len(urls)
+
+def test_reuse_reports_saved_cpu_seconds(extractor, cache_dir, tmp_path):
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.download([URL], str(tmp_path / 'first'))
+    results = downloader.download([URL], str(tmp_path / 'second'))
+
+    assert results.reused == 1
+    assert results.saved_seconds == stored_seconds(cache_dir)[0] > 0
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=daemon'
+
+@pytest.fixture
+def daemon(tmp_path, cache_dir):
+    downloader = ytad.Downloader(cache_dir=cache_dir)
+    return ytad.DownloadDaemon(downloader, ytad.JobQueue(str(tmp_path / 'queue.sqlite3')), str(tmp_path / 'out'))
+
+def test_job_output_dir_inside_daemon_output_dir(daemon):
+    root = os.path.realpath(daemon.output_dir)
+    assert daemon.submit(URL)['output_dir'] == daemon.output_dir
+    assert daemon.submit(URL, 'music/live')['output_dir'] == os.path.join(root, 'music', 'live')
+    assert daemon.submit(URL, os.path.join(root, 'abs'))['output_dir'] == os.path.join(root, 'abs')
+
+@pytest.mark.parametrize('output_dir', ['/etc', '..', 'music/../../elsewhere'])
+def test_job_output_dir_outside_rejected(daemon, output_dir):
+    with pytest.raises(ValueError):
+        daemon.submit(URL, output_dir)
+
+def test_symlink_out_of_output_dir_rejected(daemon, tmp_path):
+    os.makedirs(daemon.output_dir)
+    os.symlink(str(tmp_path), os.path.join(daemon.output_dir, 'escape'))
+    with pytest.raises(ValueError):
+        daemon.submit(URL, 'escape/x')
+
+@pytest.mark.parametrize('address, local', [
+    ('8765', True), (':8765', True), ('127.0.0.1:8765', True), ('localhost:8765', True),
+    ('[::1]:8765', True), ('/run/ytad.sock', True),
+    ('0.0.0.0:8765', False), ('192.168.1.5:8765', False), ('example.com:8765', False),
+])
+def test_is_local_address(address, local):
+    assert ytad.DownloadDaemon.is_local_address(address) == local
+
+def test_public_serve_needs_flag():
+    with pytest.raises(SystemExit):
+        ytad.parse_args(['--serve', '0.0.0.0:8765'])
+    assert ytad.parse_args(['--serve', '0.0.0.0:8765', '--serve-public']).serve_public
+    assert not ytad.parse_args(['--serve', '8765']).serve_public
@@ -0,0 +1,58 @@
+import errno
+import threading
+import time
+
+import pytest
+
+import ytad
+
+MIB = 1024 * 1024
+
+@pytest.fixture
+def disk(tmp_path, monkeypatch):
+    """An output and a scratch directory on two simulated filesystems with settable free space"""
+    output, scratch = tmp_path / 'output', tmp_path / 'scratch'
+    output.mkdir()
+    scratch.mkdir()
+    free = {str(output): 10 * 1024 * MIB, str(scratch): 64 * MIB}
+    monkeypatch.setattr(ytad.DiskReservation, 'device', staticmethod(lambda directory: hash(str(directory))))
+    monkeypatch.setattr(ytad.shutil, 'disk_usage',
+                        lambda directory: ytad.shutil._ntuple_diskusage(0, 0, free[str(directory)]))
+    return str(output), str(scratch), free
+
+def test_min_free_applies_to_output_only(disk):
+    output, scratch, free = disk
+    gate = ytad.DiskSpaceGate(min_free=512 * MIB)
+    # A 64 MiB tmpfs is below the 512 MiB output floor, but scratch has its own (zero) floor
+    reservation = gate.reserve({scratch: 10 * MIB, output: 5 * MIB}, [scratch + '/a'], scratch=[scratch])
+    reservation.release()
+
+    gate.scratch_min_free = 60 * MIB
+    with pytest.raises(OSError) as excinfo:
+        gate.reserve({scratch: 10 * MIB, output: 5 * MIB}, [scratch + '/a'], scratch=[scratch])
+    assert excinfo.value.errno == errno.ENOSPC
+
+def test_output_floor_still_enforced(disk):
+    output, scratch, free = disk
+    free[output] = 520 * MIB
+    gate = ytad.DiskSpaceGate(min_free=512 * MIB)
+    with pytest.raises(OSError) as excinfo:
+        gate.reserve({scratch: 1 * MIB, output: 10 * MIB}, [scratch + '/a'], scratch=[scratch])
+    assert excinfo.value.errno == errno.ENOSPC
+    assert not gate.reservations
+
+def test_waits_for_items_in_flight(disk):
+    output, scratch, free = disk
+    gate = ytad.DiskSpaceGate(min_free=0)
+    gate.POLL_INTERVAL = 0.05
+    first = gate.reserve({scratch: 40 * MIB}, [scratch + '/a'], scratch=[scratch])
+    waits = []
+    reserved = []
+    thread = threading.Thread(target=lambda: reserved.append(
+        gate.reserve({scratch: 40 * MIB}, [scratch + '/b'], scratch=[scratch], on_wait=lambda *args: waits.append(args))))
+    thread.start()
+    time.sleep(0.2)
+    assert not reserved and waits == [(scratch, 40 * MIB, 24 * MIB)]
+    first.release()
+    thread.join(2)
+    assert reserved and gate.waits == 1
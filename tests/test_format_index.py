@@ -0,0 +1,134 @@
+import pytest
+
+import ytad
+from ytad import AudioCodec, DownloadFormat, FormatIndex, FormatStrategy, FormatTarget, FORMAT_COSTS
+from conftest import load_info
+
+BEST, SMALLEST, NO_TRANSCODE = FormatStrategy.BEST, FormatStrategy.SMALLEST, FormatStrategy.NO_TRANSCODE
+
+def audio(bitrate: int, codec: AudioCodec = AudioCodec.MP3) -> FormatTarget:
+    return FormatTarget(DownloadFormat.AUDIO, bitrate, 0, codec)
+
+def video(height: int) -> FormatTarget:
+    return FormatTarget(DownloadFormat.VIDEO, 320, height)
+
+def select(name: str, target: FormatTarget, strategy: FormatStrategy):
+    return FormatIndex.from_info(load_info(name)).select(target, FORMAT_COSTS[strategy])
+
+@pytest.mark.parametrize('name, target, strategy, spec', [
+    # YouTube: no audio stream is MP3, so every strategy takes the highest bitrate (opus 251)
+    ('youtube', audio(320), NO_TRANSCODE, '251'),
+    ('youtube', audio(320), BEST, '251'),
+    ('youtube', audio(320), SMALLEST, '251'),
+    # ... unless a lower target lets the smallest file meet it
+    ('youtube', audio(64), SMALLEST, '250'),
+    # 128 kbps HLS audio (size estimated from its bitrate) is smaller than the 129.5 kbps DASH 140
+    ('youtube', audio(128), SMALLEST, '234'),
+    # M4A output: AAC can be stream-copied, so no-transcode prefers it over the better opus stream
+    ('youtube', audio(320, AudioCodec.M4A), NO_TRANSCODE, '140'),
+    ('youtube', audio(320, AudioCodec.M4A), BEST, '251'),
+    ('youtube', audio(320, AudioCodec.OPUS), NO_TRANSCODE, '251'),
+    ('youtube', audio(320, AudioCodec.NATIVE), NO_TRANSCODE, '251'),
+    # SoundCloud: MP3 is copyable; plain HTTP beats the identical HLS stream
+    ('soundcloud', audio(320), NO_TRANSCODE, 'http_mp3_128'),
+    ('soundcloud', audio(320), BEST, 'http_mp3_128'),
+    ('soundcloud', audio(320, AudioCodec.OPUS), NO_TRANSCODE, 'hls_opus_64'),
+    ('soundcloud', audio(320, AudioCodec.OPUS), BEST, 'http_mp3_128'),
+    ('soundcloud', audio(64), SMALLEST, 'hls_opus_64'),
+    # Vimeo has no audio-only formats: audio comes from the smallest combined file
+    ('vimeo', audio(320), NO_TRANSCODE, 'http-360p'),
+    ('vimeo', audio(320), SMALLEST, 'http-360p'),
+])
+def test_select_audio(name, target, strategy, spec):
+    assert select(name, target, strategy).spec == spec
+
+@pytest.mark.parametrize('name, target, strategy, spec', [
+    # 720p: H.264+AAC for a stream copy, the 50 fps VP9 for quality, the smallest pair for size
+    ('youtube', video(720), NO_TRANSCODE, '136+140'),
+    ('youtube', video(720), BEST, '302+251'),
+    ('youtube', video(720), SMALLEST, '247+233'),
+    ('youtube', video(1080), NO_TRANSCODE, '137+140'),
+    # Nothing at 2160p: the highest available height (1080p) wins instead of failing
+    ('youtube', video(2160), NO_TRANSCODE, '137+140'),
+    ('youtube', video(2160), BEST, '399+251'),
+    ('youtube', video(2160), SMALLEST, '399+233'),
+    # Nothing at or below 240p: the lowest available height (360p) is the closest
+    ('youtube', video(240), NO_TRANSCODE, '134+140'),
+    ('youtube', video(240), BEST, '134+251'),
+    ('youtube', video(240), SMALLEST, '134+233'),
+    # Vimeo: progressive HTTP is preferred over the equivalent HLS rendition
+    ('vimeo', video(1080), NO_TRANSCODE, 'http-1080p'),
+    ('vimeo', video(1080), BEST, 'http-1080p'),
+    ('vimeo', video(720), SMALLEST, 'http-720p'),
+    ('vimeo', video(2160), BEST, 'http-1080p'),
+    ('vimeo', video(240), NO_TRANSCODE, 'http-360p'),
+])
+def test_select_video(name, target, strategy, spec):
+    assert select(name, target, strategy).spec == spec
+
+@pytest.mark.parametrize('strategy', list(FormatStrategy))
+def test_never_selects_above_requested_height(strategy):
+    for height in (360, 480, 720, 1080):
+        assert select('youtube', video(height), strategy).height == height
+
+def test_storyboards_are_not_indexed():
+    index = FormatIndex.from_info(load_info('youtube'))
+    ids = {entry.format_id for entry in index.entries}
+    assert not ids & {'sb0', 'sb2'}
+    assert {'18', '96', '137', '140', '251', '233'} <= ids
+
+def test_hls_entries_keep_protocol_and_estimated_size():
+    index = FormatIndex.from_info(load_info('youtube'))
+    entry = next(entry for entry in index.entries if entry.format_id == '96')
+    assert entry.protocol == 'm3u8_native'
+    assert (entry.acodec, entry.vcodec, entry.height) == ('mp4a', 'avc1', 1080)
+    assert entry.filesize == 4670 * 125 * 212
+
+def test_no_usable_format():
+    assert select('soundcloud', video(720), NO_TRANSCODE) is None
+    assert FormatIndex([]).select(audio(320)) is None
+
+@pytest.mark.parametrize('strategy', list(FormatStrategy))
+def test_rank_starts_with_selection(strategy):
+    index = FormatIndex.from_info(load_info('youtube'))
+    for target in (audio(128), video(720)):
+        assert index.rank(target, FORMAT_COSTS[strategy])[0] == index.select(target, FORMAT_COSTS[strategy])
+
+@pytest.mark.parametrize('options, first', [
+    (ytad.JobOptions(), '251'),
+    (ytad.JobOptions(download_format=DownloadFormat.VIDEO), '136+140'),
+    (ytad.JobOptions(download_format=DownloadFormat.VIDEO, video_quality=ytad.VideoQuality.FULL_HD,
+                     format_strategy=BEST), '399+251'),
+])
+def test_get_available_formats(cache_dir, options, first):
+    # Used to build its tuples with the wrong arity, raise, and return None
+    info = load_info('youtube')
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(lambda url: info), cache_dir=cache_dir)
+    choices = downloader.get_available_formats('https://www.youtube.com/watch?v=dQw4w9WgXcQ', options)
+    assert choices is not None
+    assert choices[0].spec == first
+    assert choices[0] == downloader.choose_format(info, options)
+    assert 1 < len(choices) <= 10
+    streams = [(choice.video or choice.audio).format_id for choice in choices]
+    assert len(streams) == len(set(streams))
+
+def test_unprocessed_info_gets_protocol():
+    # As stored by InfoCache (process=False): YouTube's https formats have no 'protocol' key
+    index = FormatIndex.from_info(load_info('youtube_unprocessed'))
+    protocols = {entry.format_id: entry.protocol for entry in index.entries}
+    assert protocols['140'] == protocols['137'] == 'https'
+    assert protocols['96'] == 'm3u8_native'
+
+@pytest.mark.parametrize('strategy', list(FormatStrategy))
+@pytest.mark.parametrize('target', [audio(320), audio(128), audio(320, AudioCodec.M4A), video(720), video(1080)])
+def test_unprocessed_info_selects_like_processed(strategy, target):
+    # Entries compare equal, protocol included
+    assert select('youtube_unprocessed', target, strategy) == select('youtube', target, strategy)
+
+def test_unprocessed_choice_can_stream_merge(cache_dir):
+    downloader = ytad.Downloader(cache_dir=cache_dir)
+    downloader.ffmpeg_path = downloader.ffmpeg_path or 'ffmpeg'
+    options = ytad.JobOptions(download_format=DownloadFormat.VIDEO)
+    choice = downloader.choose_format(load_info('youtube_unprocessed'), options)
+    assert choice.spec == '136+140'
+    assert downloader.can_stream_merge(choice, options)
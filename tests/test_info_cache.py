@@ -0,0 +1,51 @@
+import os
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=once'
+
+def test_single_extraction_per_url(extractor, tmp_path):
+    info_cache = ytad.InfoCache(extractor)
+    downloader = ytad.Downloader(info_cache=info_cache, cache_dir=str(tmp_path / 'cache'))
+
+    choices = downloader.get_available_formats(URL)
+    assert choices and choices[0].spec == '140'
+    ok, path = downloader.download_single_file(URL, str(tmp_path / 'out'), None, None)
+
+    assert ok and os.path.getsize(path) > 0
+    assert info_cache.extraction_count(URL) == 1
+    assert extractor.calls[URL] == 1
+
+def test_concurrent_gets_extract_once(extractor):
+    info_cache = ytad.InfoCache(extractor)
+    with ytad.ThreadPoolExecutor(max_workers=8) as executor:
+        infos = list(executor.map(info_cache.get, [URL] * 16))
+
+    assert info_cache.extraction_count(URL) == 1
+    # Every caller gets a private copy it may modify
+    infos[0]['formats'].clear()
+    assert info_cache.get(URL)['formats']
+
+def test_discard_extracts_again(extractor):
+    info_cache = ytad.InfoCache(extractor)
+    info_cache.get(URL)
+    info_cache.discard(URL)
+    info_cache.get(URL)
+    assert extractor.calls[URL] == 2
+
+def test_expire_keeps_extraction_counters(extractor):
+    info_cache = ytad.InfoCache(extractor)
+    info_cache.get(URL)
+    info_cache.expire(URL)
+    info_cache.get(URL)
+    assert info_cache.extraction_count(URL) == 2
+
+def test_download_forgets_recorded_items(extractor, tmp_path):
+    info_cache = ytad.InfoCache(extractor)
+    downloader = ytad.Downloader(info_cache=info_cache, cache_dir=str(tmp_path / 'cache'))
+    results = downloader.download([URL], str(tmp_path / 'out'))
+
+    assert results.succeeded == 1
+    assert extractor.calls[URL] == 1
+    assert not (info_cache.infos or info_cache.url_locks or info_cache.failures
+                or info_cache.extraction_counts or info_cache.extraction_seconds)
@@ -0,0 +1,73 @@
+import threading
+
+import yt_dlp
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=jobs'
+
+def make_downloader(extractor, cache_dir):
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.dedupe_enabled = False
+    return downloader
+
+def test_concurrent_jobs_on_one_video_keep_separate_records(extractor, cache_dir, tmp_path):
+    downloader = make_downloader(extractor, cache_dir)
+    options = ytad.JobOptions(audio_codec=ytad.AudioCodec.M4A)
+    jobs = [None, None]
+
+    def run(n):
+        jobs[n] = downloader.download([URL], str(tmp_path / f'out{n}'), options)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for results in jobs:
+        assert results.succeeded == 1
+        assert list(results.metrics.items) == [URL]
+        summary = results.metrics.stage_summary()
+        assert summary['fetch'][0] == summary['postprocess'][0] == 1
+    # The process-wide export has one record per job and item
+    assert sorted(downloader.metrics.finished) == sorted(f'{results.job_id}:{URL}' for results in jobs)
+    assert downloader.metrics.stage_summary()['fetch'][0] == 2
+
+def test_duplicate_playlist_entries_get_their_own_retries(tmp_path):
+    def extractor(url):
+        raise yt_dlp.utils.DownloadError('HTTP Error 429: Too Many Requests')
+
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=str(tmp_path / 'cache'))
+    downloader.retry_policy = ytad.RetryPolicy(retries=1, base_delay=0.01)
+    results = ytad.JobResults(downloader.options)
+    info = {'title': 'Duplicates', 'entries': [{'url': URL}, {'url': URL}]}
+    downloader.create_pipeline(2, 1).run(downloader.playlist_jobs(info, str(tmp_path / 'out'), None, results))
+
+    assert results.failed == 2
+    assert results.retries == 2
+    assert [item.attempts for item in results.items] == [2, 2]
+    assert sorted(results.metrics.items) == [f'{URL}#1', f'{URL}#2']
+
+def test_summary_reports_only_the_jobs_counters(extractor, media_server, cache_dir, tmp_path, capsys):
+    def with_cover(url):
+        info = extractor(url)
+        info['thumbnail'] = f'{media_server.base_url}/cover.jpg'
+        return info
+
+    downloader = make_downloader(with_cover, cache_dir)
+    options = ytad.JobOptions(audio_codec=ytad.AudioCodec.M4A)
+    first = downloader.download([URL], str(tmp_path / 'first'), options)
+    second = downloader.download([URL], str(tmp_path / 'second'), options)
+
+    assert (first.thumbnail_hits, first.thumbnail_misses) == (0, 1)
+    assert (second.thumbnail_hits, second.thumbnail_misses) == (1, 0)
+    assert (downloader.thumbnail_cache.hits, downloader.thumbnail_cache.misses) == (1, 1)
+
+    pipeline = downloader.create_pipeline(1, 1)
+    pipeline.run([])
+    downloader.print_pipeline_summary(pipeline, second)
+    out = capsys.readouterr().out
+    assert downloader.t('thumbnail_cache', 1, 0) in out
+    fetch_row = next(line for line in out.splitlines() if line.split()[:1] == ['fetch'])
+    assert fetch_row.split()[1] == '1'
@@ -0,0 +1,46 @@
+import ytad
+
+def record(seconds, status='ok'):
+    return {'stages': {'fetch': seconds}, 'bytes': 100, 'retries': 1, 'status': status, 'audio': 'copy'}
+
+def test_finished_records_are_bounded_but_counted():
+    metrics = ytad.Metrics(window=3)
+    for n in range(10):
+        metrics.add_item(f'job:{n}', record(float(n)))
+
+    assert list(metrics.finished) == ['job:7', 'job:8', 'job:9']
+    count, p50, p95, total = metrics.stage_summary()['fetch']
+    assert (count, total) == (10, 45.0)
+    # Percentiles cover the retained window
+    assert (p50, p95) == (8.0, 9.0)
+    assert len(metrics.to_json()['items']) == 3
+    text = metrics.to_prometheus()
+    assert 'ytad_items_total{status="ok"} 10' in text
+    assert 'ytad_audio_items_total{mode="copy"} 10' in text
+    assert 'ytad_bytes_total 1000' in text
+    assert 'ytad_retries_total 10' in text
+
+def test_summary_includes_items_in_progress():
+    metrics = ytad.Metrics()
+    metrics.add_item('job:done', record(1.0))
+    metrics.add_time('running', 'fetch', 3.0)
+
+    assert metrics.stage_summary()['fetch'] == (2, 1.0, 3.0, 4.0)
+
+def test_least_recently_used_archives_are_closed(tmp_path):
+    downloader = ytad.Downloader(cache_dir=str(tmp_path / 'cache'))
+    downloader.MAX_OPEN_ARCHIVES = 2
+    key = ('id', 'audio', '192')
+    first = downloader.open_archive(str(tmp_path / 'a'))
+    first.mark(key, ytad.JobStatus.COMPLETED, path='a.mp3')
+    downloader.open_archive(str(tmp_path / 'b'))
+    downloader.open_archive(str(tmp_path / 'a'))
+    downloader.open_archive(str(tmp_path / 'c'))
+
+    assert [archive.path for archive in downloader.archives.values()] == [
+        str(tmp_path / name / ytad.JobStore.FILENAME) for name in ('a', 'c')]
+    second = downloader.open_archive(str(tmp_path / 'd'))
+    assert first.conn is None and first not in downloader.archives.values()
+    assert second.conn is not None
+    # A store closed while a worker still holds it reconnects
+    assert first.get(key) == (ytad.JobStatus.COMPLETED, 'a.mp3')
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+
+import yt_dlp
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=pipeline'
+
+def test_host_lookup_runs_inside_global_limit():
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def host_of(n):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return f'host{n}.example'
+
+    pipeline = ytad.DownloadPipeline(lambda n: None, lambda *item: None, 4, 1, host_of=host_of)
+    # As after throttling: the host lookup extracts, so it must respect the lowered limit too
+    pipeline.global_limiter.limit = 1
+    pipeline.run((n,) for n in range(6))
+
+    assert active[1] == 1
+    assert pipeline.scheduler_stats.outcomes[ytad.FetchOutcome.SKIPPED] == 6
+
+def test_failed_extraction_once_per_attempt(tmp_path):
+    calls = Counter()
+
+    def extractor(url):
+        calls[url] += 1
+        raise yt_dlp.utils.DownloadError('HTTP Error 429: Too Many Requests')
+
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=str(tmp_path / 'cache'))
+    downloader.retry_policy = ytad.RetryPolicy(retries=1, base_delay=0.01)
+    results = downloader.download([URL], str(tmp_path / 'out'))
+
+    assert results.failed == 1
+    assert results.retries == 1
+    # The host lookup's failure is reported by the fetch instead of extracting again
+    assert calls[URL] == 2
+
+def test_waiting_for_a_host_does_not_hold_a_global_slot():
+    lock = threading.Lock()
+    events = []
+
+    def fetch(name):
+        with lock:
+            events.append(('start', name))
+        time.sleep(0.2 if name.startswith('slow') else 0)
+        with lock:
+            events.append(('end', name))
+        return None
+
+    pipeline = ytad.DownloadPipeline(fetch, lambda *item: None, 4, 1, per_host_limit=1,
+                                     host_of=lambda name: name.rstrip('0123456789') + '.example')
+    # As after throttling: fewer global slots than jobs waiting for the slow host
+    pipeline.global_limiter.limit = 2
+    pipeline.run((name,) for name in ('slow1', 'slow2', 'slow3', 'fast1'))
+
+    assert events.index(('start', 'fast1')) < events.index(('end', 'slow1'))
+
+def run_limiter(limiter, outcomes):
+    """Limit after each acquire/release of the given outcomes"""
+    async def run():
+        limits = []
+        for outcome in outcomes:
+            await limiter.acquire()
+            await limiter.release(outcome)
+            limits.append(limiter.limit)
+        return limits
+    return asyncio.run(run())
+
+def test_limiter_halves_when_throttled():
+    limiter = ytad.AdaptiveLimiter(8, minimum=1)
+    assert run_limiter(limiter, [ytad.FetchOutcome.THROTTLED] * 4) == [4, 2, 1, 1]
+
+def test_limiter_ramps_up_after_a_healthy_window():
+    limiter = ytad.AdaptiveLimiter(4)
+    limiter.limit = 1
+    ok = ytad.FetchOutcome.OK
+    # One more slot after `limit` healthy completions in a row, up to the maximum
+    assert run_limiter(limiter, [ok] * 10) == [2, 2, 3, 3, 3, 4, 4, 4, 4, 4]
+
+def test_limiter_slow_and_throttled_reset_the_window():
+    limiter = ytad.AdaptiveLimiter(4)
+    outcomes = [ytad.FetchOutcome.OK] * 3 + [ytad.FetchOutcome.SLOW] + [ytad.FetchOutcome.OK] * 2
+    assert run_limiter(limiter, outcomes) == [4, 4, 4, 3, 3, 3]
+    assert limiter.healthy_streak == 2
+
+def test_limits_back_off_and_recover_against_a_throttling_server(extractor, media_server, cache_dir, tmp_path):
+    media_server.failures['audio.m4a'] = [429, 429]
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.dedupe_enabled = False
+    downloader.retry_policy = ytad.RetryPolicy(retries=3, base_delay=0.01)
+    results = ytad.JobResults(ytad.JobOptions(audio_codec=ytad.AudioCodec.M4A))
+    pipeline = downloader.create_pipeline(4, 2)
+
+    limits = []
+    release = pipeline.global_limiter.release
+
+    async def traced(outcome):
+        await release(outcome)
+        limits.append(pipeline.global_limiter.limit)
+    pipeline.global_limiter.release = traced
+
+    urls = [f'{URL}{n}' for n in range(10)]
+    pipeline.run(downloader.batch_jobs(urls, str(tmp_path / 'out'), results))
+
+    assert results.succeeded == 10
+    assert pipeline.scheduler_stats.throttled == 2
+    assert min(limits) == 1
+    changes = [(before, after) for before, after in zip([4] + limits, limits) if before != after]
+    # Multiplicative decrease, additive increase
+    assert all(after == before // 2 or after == before + 1 for before, after in changes)
+    assert changes[-1][1] > 1
+    (host,) = pipeline.host_limiters.values()
+    assert host.limit > 1
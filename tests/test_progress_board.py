@@ -0,0 +1,36 @@
+import yt_dlp
+
+import ytad
+
+def test_finished_bytes_running_total():
+    board = ytad.ProgressBoard(lambda key, *args: ' '.join(map(str, args)))
+    board.hook({'status': 'downloading', 'filename': 'a', 'downloaded_bytes': 10, 'total_bytes': 100})
+    board.hook({'status': 'finished', 'filename': 'a', 'total_bytes': 100})
+    board.hook({'status': 'downloading', 'filename': 'b', 'downloaded_bytes': 30})
+    board.hook({'status': 'finished', 'filename': 'b'})
+    board.hook({'status': 'downloading', 'filename': 'c', 'downloaded_bytes': 5, 'total_bytes': 50})
+
+    assert board.finished_bytes == 130
+    assert '135.00B' in board.summary()
+
+def test_finished_bytes_from_threads():
+    board = ytad.ProgressBoard(lambda key, *args: '')
+    with ytad.ThreadPoolExecutor(max_workers=8) as executor:
+        executor.map(board.hook, [{'status': 'finished', 'filename': str(n), 'total_bytes': 1} for n in range(4000)])
+    assert board.finished_bytes == 4000
+
+def test_progress_line_only_for_playlist_entries(tmp_path, capsys):
+    def extractor(url):
+        raise yt_dlp.utils.DownloadError('ERROR: [youtube] x: Private video')
+
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=str(tmp_path / 'cache'))
+    url = 'https://www.youtube.com/watch?v=progress'
+    results = downloader.download([f'{url}1', f'{url}2'], str(tmp_path / 'out'))
+    assert results.failed == 2
+    assert '📋' not in capsys.readouterr().out
+
+    results = ytad.JobResults(downloader.options)
+    info = {'title': 'Progress', 'entries': [{'url': f'{url}1'}, {'url': f'{url}2'}]}
+    downloader.create_pipeline(1, 1).run(downloader.playlist_jobs(info, str(tmp_path / 'out'), None, results))
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith('📋')]
+    assert lines == [f"📋 {downloader.t('discovery_progress', done, 2)}" for done in (1, 2)]
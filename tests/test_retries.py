@@ -0,0 +1,88 @@
+import pytest
+import yt_dlp
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=retries'
+OPTIONS = ytad.JobOptions(audio_codec=ytad.AudioCodec.M4A)
+ALWAYS = 1000
+
+def download(extractor, cache_dir, out, urls=(URL,), retries=3, budget=50):
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.dedupe_enabled = False
+    downloader.retry_policy = ytad.RetryPolicy(retries=retries, budget=budget, base_delay=0.01)
+    return downloader.download(list(urls), out, OPTIONS)
+
+@pytest.mark.parametrize('status', [403, 429, 500, 503])
+def test_server_errors_are_transient(extractor, media_server, cache_dir, tmp_path, status):
+    media_server.failures['audio.m4a'] = [status] * ALWAYS
+    results = download(extractor, cache_dir, str(tmp_path / 'out'), retries=0)
+
+    assert results.failed == 1
+    item = results.items[0]
+    assert f'HTTP Error {status}' in item.error
+    assert item.failure == ytad.FailureKind.TRANSIENT.value
+
+@pytest.mark.parametrize('error', [
+    yt_dlp.utils.DownloadError('ERROR: [youtube] retries: Private video. Sign in if you\'ve been granted access'),
+    yt_dlp.utils.DownloadError('ERROR: [youtube] retries: Blocked',
+                               (yt_dlp.utils.GeoRestrictedError, yt_dlp.utils.GeoRestrictedError('Blocked'), None)),
+])
+def test_unavailable_videos_are_permanent(tmp_path, error):
+    calls = []
+
+    def extractor(url):
+        calls.append(url)
+        raise error
+
+    results = download(extractor, str(tmp_path / 'cache'), str(tmp_path / 'out'))
+
+    assert results.failed == 1
+    assert results.items[0].failure == ytad.FailureKind.PERMANENT.value
+    assert results.retries == 0
+    assert calls == [URL]
+
+def test_retry_goes_to_the_end_of_the_queue():
+    fetched = []
+
+    def fetch(name):
+        fetched.append(name)
+        if name == 'a' and fetched.count('a') == 1:
+            raise ytad.RetryLater(0.1)
+        return None
+
+    pipeline = ytad.DownloadPipeline(fetch, lambda *item: None, 1, 1)
+    pipeline.run((name,) for name in 'abc')
+
+    # The backing-off job does not hold the only download worker
+    assert fetched == ['a', 'b', 'c', 'a']
+    assert pipeline.scheduler_stats.outcomes[ytad.FetchOutcome.RETRIED] == 1
+
+def test_item_recovers_within_its_retries(extractor, media_server, cache_dir, tmp_path):
+    media_server.failures['audio.m4a'] = [429, 429]
+    results = download(extractor, cache_dir, str(tmp_path / 'out'), retries=3)
+
+    assert results.succeeded == 1
+    assert results.retries == 2
+    assert results.items[0].attempts == 3
+    assert [status for _, status in media_server.failed] == [429, 429]
+
+def test_item_fails_once_its_retries_are_used(extractor, media_server, cache_dir, tmp_path):
+    media_server.failures['audio.m4a'] = [429] * ALWAYS
+    results = download(extractor, cache_dir, str(tmp_path / 'out'), retries=2)
+
+    assert results.failed == 1
+    assert results.retries == 2
+    assert results.items[0].attempts == 3
+    assert results.items[0].failure == ytad.FailureKind.TRANSIENT.value
+    assert len(media_server.failed) == 3
+
+def test_job_budget_caps_retries_across_items(extractor, media_server, cache_dir, tmp_path):
+    # yt-dlp retries 5xx itself first; each of those fetches counts as one attempt here
+    media_server.failures['audio.m4a'] = [503] * ALWAYS
+    urls = [f'{URL}{n}' for n in range(3)]
+    results = download(extractor, cache_dir, str(tmp_path / 'out'), urls, retries=5, budget=4)
+
+    assert results.failed == 3
+    assert results.retries == 4
+    assert sum(item.attempts - 1 for item in results.items) == 4
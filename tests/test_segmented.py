@@ -0,0 +1,69 @@
+import os
+import re
+
+import pytest
+import yt_dlp
+
+import ytad
+
+SIZE = 3 * 1024 * 1024
+SEGMENT = 256 * 1024
+
+@pytest.fixture
+def blob(media_server):
+    data = os.urandom(SIZE)
+    media_server.files['blob.bin'] = data
+    return data
+
+def download(server, path, hooks=()):
+    ydl = ytad.SegmentedYoutubeDL({'quiet': True, 'segment_connections': 4, 'segment_size': SEGMENT,
+                                   'progress_hooks': list(hooks), 'retries': 0})
+    info = {'url': f'{server.base_url}/blob.bin', 'protocol': 'http', 'ext': 'bin', 'filesize': SIZE}
+    return ydl.dl(path, info)
+
+def served_bytes(server) -> int:
+    """Bytes requested since the last reset, from the Range headers (the 0-0 probe counts as 1)"""
+    total = 0
+    for _, header in server.requests:
+        match = re.match(r'bytes=(\d+)-(\d*)', header or '')
+        start, end = int(match.group(1)), int(match.group(2) or SIZE - 1)
+        total += min(end, SIZE - 1) - start + 1
+    return total
+
+def test_segmented_download(media_server, blob, tmp_path):
+    path = str(tmp_path / 'blob.bin')
+    assert download(media_server, path)
+    with open(path, 'rb') as f:
+        assert f.read() == blob
+    assert not os.path.exists(path + '.part.segments')
+    assert len(media_server.requests) > 4
+
+def test_resume_after_interruption(media_server, blob, tmp_path):
+    path = str(tmp_path / 'blob.bin')
+
+    def interrupt(status):
+        if status['status'] == 'downloading' and status['downloaded_bytes'] >= SIZE // 2:
+            raise yt_dlp.utils.DownloadCancelled('interrupted')
+
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        download(media_server, path, [interrupt])
+    assert os.path.getsize(path + '.part') == SIZE
+    assert os.path.exists(path + '.part.segments')
+
+    media_server.requests.clear()
+    assert download(media_server, path)
+    with open(path, 'rb') as f:
+        assert f.read() == blob
+    # Only the missing bytes are fetched again
+    assert served_bytes(media_server) < SIZE * 3 // 4
+    assert not os.path.exists(path + '.part') and not os.path.exists(path + '.part.segments')
+
+def test_foreign_part_file_resumes_with_http_downloader(media_server, blob, tmp_path):
+    path = str(tmp_path / 'blob.bin')
+    with open(path + '.part', 'wb') as f:
+        f.write(blob[:SIZE // 3])
+
+    assert download(media_server, path)
+    with open(path, 'rb') as f:
+        assert f.read() == blob
+    assert (f'/blob.bin', f'bytes={SIZE // 3}-') in media_server.requests
@@ -0,0 +1,101 @@
+import glob
+import os
+import subprocess
+
+import pytest
+import yt_dlp
+
+import ytad
+
+URL = 'https://www.youtube.com/watch?v=merge'
+CHUNK = 4 * 1024
+
+@pytest.fixture
+def mergers(monkeypatch):
+    """Paths merged by yt-dlp's FFmpegMergerPP"""
+    calls = []
+    run = yt_dlp.postprocessor.FFmpegMergerPP.run
+
+    def spy(self, info):
+        calls.append(info['filepath'])
+        return run(self, info)
+
+    monkeypatch.setattr(yt_dlp.postprocessor.FFmpegMergerPP, 'run', spy)
+    return calls
+
+def chunked(extractor):
+    # Like YouTube's https formats: no protocol and a chunk size in downloader_options
+    def extract(url):
+        info = extractor(url)
+        for f in info['formats']:
+            del f['protocol']
+            f['downloader_options'] = {'http_chunk_size': CHUNK}
+        return info
+    return extract
+
+def download(extractor, cache_dir, out, stream_merge=True):
+    downloader = ytad.Downloader(info_cache=ytad.InfoCache(extractor), cache_dir=cache_dir)
+    downloader.dedupe_enabled = False
+    downloader.stream_merge_enabled = stream_merge
+    options = ytad.JobOptions(download_format=ytad.DownloadFormat.VIDEO)
+    return downloader.download([URL], out, options)
+
+def streams(path):
+    """Stream kinds of a media file in order, e.g. ['Video', 'Audio', 'Cover']"""
+    output = subprocess.run([ytad.shutil.which('ffmpeg'), '-hide_banner', '-i', path],
+                            capture_output=True, text=True).stderr
+    lines = [line for line in output.splitlines() if 'Stream #' in line]
+    return ['Cover' if 'attached pic' in line else 'Video' if ': Video:' in line else 'Audio'
+            for line in lines]
+
+def test_streams_fetched_in_parallel_and_merged_once(extractor, media_server, mergers, cache_dir, tmp_path):
+    media_server.delay = 0.05
+    out = str(tmp_path / 'out')
+    results = download(chunked(extractor), cache_dir, out)
+
+    assert results.succeeded == 1
+    [item] = results.items
+    assert streams(item.path) == ['Video', 'Audio']
+    assert not mergers
+    assert glob.glob(os.path.join(out, '*')) == [item.path]
+
+    video = [(start, end) for path, start, end in media_server.intervals if path == '/video.mp4']
+    audio = [(start, end) for path, start, end in media_server.intervals if path == '/audio.m4a']
+    # Both streams are fetched in chunks, at the same time
+    ranges = [header for path, header in media_server.requests if path == '/video.mp4']
+    assert all(int(end) - int(start) < CHUNK for start, end in
+               (header.split('=')[1].split('-') for header in ranges))
+    assert len(video) >= -(-len(media_server.files['video.mp4']) // CHUNK) > 1
+    assert len(audio) > 1
+    assert min(end for _, end in video) > min(start for start, _ in audio)
+    assert min(end for _, end in audio) > min(start for start, _ in video)
+
+def test_merge_embeds_cover(extractor, media_server, cache_dir, tmp_path):
+    def with_cover(url):
+        info = chunked(extractor)(url)
+        info['thumbnail'] = f'{media_server.base_url}/cover.jpg'
+        return info
+
+    results = download(with_cover, cache_dir, str(tmp_path / 'out'))
+    assert results.succeeded == 1
+    assert streams(results.items[0].path) == ['Video', 'Audio', 'Cover']
+
+def test_failed_stream_stops_the_other(extractor, media_server, cache_dir, tmp_path):
+    def missing_audio(url):
+        info = chunked(extractor)(url)
+        for f in info['formats']:
+            f['url'] = f['url'].replace('/audio.', '/missing.')
+        return info
+
+    media_server.delay = 0.05
+    results = download(missing_audio, cache_dir, str(tmp_path / 'out'))
+
+    assert results.failed == 1
+    assert 'HTTP Error 404' in results.items[0].error
+    video = [path for path, _, _ in media_server.intervals if path == '/video.mp4']
+    assert len(video) < -(-len(media_server.files['video.mp4']) // CHUNK)
+
+def test_disabled_uses_yt_dlp_merger(extractor, mergers, cache_dir, tmp_path):
+    results = download(extractor, cache_dir, str(tmp_path / 'out'), stream_merge=False)
+    assert results.succeeded == 1
+    assert len(mergers) == 1
@@ -0,0 +1,53 @@
+import os
+
+import ytad
+
+JPEG = b'\xff\xd8\xff' + b'\0' * 1000
+
+def image(n: int) -> bytes:
+    return JPEG + bytes([n])
+
+def listing(cache, folder):
+    path = os.path.join(cache.directory, folder)
+    return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+def not_fetched(url):
+    raise AssertionError(f'fetched {url} again')
+
+def test_hit_returns_cached_image(tmp_path):
+    cache = ytad.ThumbnailCache(str(tmp_path))
+    first = cache.get('https://i.ytimg.com/vi/a/hq.jpg', lambda url: image(1))
+    second = cache.get('https://i.ytimg.com/vi/a/hq.jpg', not_fetched)
+    assert first == second and first.endswith('.jpg')
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_evict_removes_pointers_of_evicted_images(tmp_path):
+    cache = ytad.ThumbnailCache(str(tmp_path), max_bytes=2500)
+    for n in range(5):
+        os.utime(cache.get(f'https://i.ytimg.com/vi/{n}/hq.jpg', lambda url, n=n: image(n)), (n, n))
+
+    objects = listing(cache, 'objects')
+    assert len(objects) == 2
+    # Every remaining pointer names an image that still exists
+    names = [open(os.path.join(cache.directory, 'urls', p)).read() for p in listing(cache, 'urls')]
+    assert sorted(names) == objects
+
+def test_pointers_count_towards_size(tmp_path):
+    cache = ytad.ThumbnailCache(str(tmp_path), max_bytes=1100)
+    cache.get('https://i.ytimg.com/vi/a/hq.jpg', lambda url: image(1))
+    # Image and pointer alone stay; many pointers to one image push it past the limit
+    for n in range(40):
+        cache._write(cache._pointer(f'https://example.com/{n}.jpg'), listing(cache, 'objects')[0].encode())
+    kept = cache.get('https://i.ytimg.com/vi/b/hq.jpg', lambda url: image(2))
+
+    assert listing(cache, 'objects') == [os.path.basename(kept)]
+    assert len(listing(cache, 'urls')) == 1
+
+def test_evict_prunes_stale_pointers(tmp_path):
+    cache = ytad.ThumbnailCache(str(tmp_path), max_bytes=1100)
+    cache._write(cache._pointer('https://example.com/gone.jpg'), b'missing.jpg')
+    cache.get('https://i.ytimg.com/vi/a/hq.jpg', lambda url: image(1))
+    kept = cache.get('https://i.ytimg.com/vi/b/hq.jpg', lambda url: image(2))
+
+    assert listing(cache, 'objects') == [os.path.basename(kept)]
+    assert len(listing(cache, 'urls')) == 1
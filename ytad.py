@@ -2,13 +2,40 @@ import yt_dlp
 import os
 import sys
 import re
-from datetime import datetime
-from typing import Optional, Tuple, List, Dict
+import copy
+import math
+import http.client
+import http.server
+import collections
+import itertools
+import errno
+import queue
+import random
+import socketserver
+import stat
+import json
+import argparse
+import contextlib
+import glob
+import sqlite3
+import hashlib
+from typing import Optional, Tuple, List, Dict, Callable, Iterable, Iterator, TextIO, NamedTuple
 from enum import Enum
 import unicodedata
 import shutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+import time
+import asyncio
+import ipaddress
+import urllib.parse
+import ssl
+import functools
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 
 LANGUAGES = {
@@ -34,7 +61,16 @@ LANGUAGES = {
         'thank_you': "Thank you for using YouTube Downloader!",
         'cancelled': "Operation cancelled by user.",
         'error': "An unexpected error occurred:",
-        'playlist_download': "Playlist download started ({} videos)",
+        'playlist_download': "Playlist download started",
+        'discovery_progress': "Playlist progress: {} done / {} discovered",
+        'thumbnail_cache': "Thumbnail cache: {} hits, {} downloaded",
+        'audio_modes': "Audio: {} stream-copied, {} transcoded",
+        'retry_scheduled': "Retrying {} in {:.1f}s: {}",
+        'retry_summary': "Retries: {} (failures: {} transient, {} permanent)",
+        'disk_wait': "Waiting for disk space in {}: {:.1f} MiB needed, {:.1f} MiB available",
+        'disk_waits': "Disk space: {} items waited for free space",
+        'content_reused': "{} reused ({}) from {}",
+        'content_saved': "Deduplicated: {} items reused, {:.1f} MiB and {:.1f} FFmpeg CPU-seconds saved",
         'playlist_item': "Downloading {}/{}: {}",
         'available_formats': "Available formats:",
         'format_info': "{}. {} {} ({}MB)",
@@ -42,7 +78,23 @@ LANGUAGES = {
         'download_progress': "Progress: {}/{} completed ({} failed)",
         'ffmpeg_missing': "Warning: FFmpeg not found. Audio conversion may not work properly.",
         'checking_formats': "Checking available formats...",
-        'best_quality': "Best available"
+        'best_quality': "Best available",
+        'format_selected': "(selected)",
+        'pipeline_workers': "Pipeline: {} download workers, {} postprocessing workers",
+        'stage_utilization': "{} stage: {:.0f}% busy ({} workers, {} items)",
+        'scheduler_stats': "Scheduler: {:.2f} items/s, {:.2f} MB/s, {:.1f}% errors, {} throttled, concurrency {}/{}",
+        'host_limit': "{}: concurrency {}/{}",
+        'timing_header': "Stage timings per item:",
+        'dashboard_summary': "{} downloading · {} converting · {}/s · {} done · ETA {}",
+        'archive_skip': "Skipping {} items already in the download archive",
+        'archive_resume': "Resuming {} unfinished items",
+        'already_downloaded': "Already downloaded:",
+        'daemon_listening': "Accepting jobs on {}",
+        'daemon_resumed': "Resuming {} queued jobs",
+        'daemon_stopping': "Stopping; unfinished jobs resume on the next start",
+        'job_submitted': "Job {} queued: {}",
+        'job_finished': "Job {} {}: {} ok, {} skipped, {} failed",
+        'output_dir_outside': "output_dir must be inside {}"
     },
     'tr': {
         'welcome': "YouTube İndirici",
@@ -66,7 +118,16 @@ LANGUAGES = {
         'thank_you': "YouTube İndirici'yi kullandığınız için teşekkürler!",
         'cancelled': "Kullanıcı tarafından iptal edildi.",
         'error': "Beklenmeyen bir hata oluştu:",
-        'playlist_download': "Playlist indirme başladı ({} video)",
+        'playlist_download': "Playlist indirme başladı",
+        'discovery_progress': "Playlist ilerlemesi: {} tamamlandı / {} bulundu",
+        'thumbnail_cache': "Küçük resim önbelleği: {} isabet, {} indirildi",
+        'audio_modes': "Ses: {} kopyalandı, {} yeniden kodlandı",
+        'retry_scheduled': "{} {:.1f} sn sonra yeniden denenecek: {}",
+        'retry_summary': "Yeniden denemeler: {} (hatalar: {} geçici, {} kalıcı)",
+        'disk_wait': "{} içinde disk alanı bekleniyor: {:.1f} MiB gerekli, {:.1f} MiB boş",
+        'disk_waits': "Disk alanı: {} öğe boş alan bekledi",
+        'content_reused': "{} yeniden kullanıldı ({}): {}",
+        'content_saved': "Tekilleştirme: {} öğe yeniden kullanıldı, {:.1f} MiB ve {:.1f} FFmpeg CPU saniyesi kazanıldı",
         'playlist_item': "{}/{} indiriliyor: {}",
         'available_formats': "Mevcut formatlar:",
         'format_info': "{}. {} {} ({}MB)",
@@ -74,7 +135,23 @@ LANGUAGES = {
         'download_progress': "İlerleme: {}/{} tamamlandı ({} başarısız)",
         'ffmpeg_missing': "Uyarı: FFmpeg bulunamadı. Ses dönüşümü düzgün çalışmayabilir.",
         'checking_formats': "Mevcut formatlar kontrol ediliyor...",
-        'best_quality': "En iyi kalite"
+        'best_quality': "En iyi kalite",
+        'format_selected': "(seçildi)",
+        'pipeline_workers': "İşlem hattı: {} indirme, {} dönüştürme iş parçacığı",
+        'stage_utilization': "{} aşaması: %{:.0f} meşgul ({} iş parçacığı, {} öğe)",
+        'scheduler_stats': "Zamanlayıcı: {:.2f} öğe/sn, {:.2f} MB/sn, %{:.1f} hata, {} kısıtlama, eşzamanlılık {}/{}",
+        'host_limit': "{}: eşzamanlılık {}/{}",
+        'timing_header': "Öğe başına aşama süreleri:",
+        'dashboard_summary': "{} indiriliyor · {} dönüştürülüyor · {}/sn · {} tamamlandı · Kalan {}",
+        'archive_skip': "İndirme arşivinde bulunan {} öğe atlanıyor",
+        'archive_resume': "Tamamlanmamış {} öğeye devam ediliyor",
+        'already_downloaded': "Zaten indirildi:",
+        'daemon_listening': "İşler {} adresinden kabul ediliyor",
+        'daemon_resumed': "Kuyruktaki {} işe devam ediliyor",
+        'daemon_stopping': "Durduruluyor; tamamlanmamış işler bir sonraki başlatmada devam edecek",
+        'job_submitted': "İş {} kuyruğa alındı: {}",
+        'job_finished': "İş {} {}: {} başarılı, {} atlandı, {} başarısız",
+        'output_dir_outside': "output_dir {} içinde olmalıdır"
     }
 }
 
@@ -82,6 +159,12 @@ class DownloadFormat(Enum):
     AUDIO = "audio"
     VIDEO = "video"
 
+class AudioCodec(Enum):
+    MP3 = "mp3"
+    M4A = "m4a"
+    OPUS = "opus"
+    NATIVE = "native"
+
 class AudioQuality(Enum):
     BEST = "320"
     HIGH = "256"
@@ -98,17 +181,2234 @@ class VideoQuality(Enum):
     LOW = "360"
     POOR = "240"
 
+class HTTPConnectionPool:
+    """Keep-alive HTTP(S) connections to one origin, each lent to one user at a time (thread-safe)"""
+    def __init__(self, url: str, timeout: float = 20.0, verify: bool = True):
+        parts = urllib.parse.urlsplit(url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.context = ssl.create_default_context() if verify else ssl._create_unverified_context()
+        self.lock = threading.Lock()
+        self.idle: List[http.client.HTTPConnection] = []
+        self.created = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        with self.lock:
+            self.created += 1
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout, context=self.context)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def get(self, url: str, headers: Dict[str, str]) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """Send a GET on an idle connection (or a new one); release() it once the body has been read"""
+        parts = urllib.parse.urlsplit(url)
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is not None:
+            try:
+                conn.request('GET', target, headers=headers)
+                return conn, conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                # The server closed the idle connection; retry once on a fresh one
+                conn.close()
+        conn = self._connect()
+        try:
+            conn.request('GET', target, headers=headers)
+            return conn, conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool = True) -> None:
+        """Return a connection to the pool, or close it if its response was not fully read"""
+        if reusable:
+            with self.lock:
+                self.idle.append(conn)
+        else:
+            conn.close()
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+class SegmentedHttpFD(yt_dlp.downloader.common.FileDownloader):
+    """Download one HTTP(S) stream as concurrent byte ranges over pooled keep-alive connections
+
+    The .part file is preallocated and each segment is written in place at its
+    offset, so segments can finish in any order. A failed segment is retried from
+    the last byte it wrote, without affecting the others. The written position of
+    every segment is checkpointed in a .part.segments file next to the .part, so an
+    interrupted download resumes where each segment stopped. Servers that ignore
+    Range requests, and .part files left by yt-dlp's regular HTTP downloader, fall
+    back to that downloader, which resumes them itself.
+
+    Parameters (in the YoutubeDL params): segment_connections, segment_size, retries.
+    """
+    FD_NAME = 'segmented'
+    CHUNK_SIZE = 64 * 1024
+    RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+    CHECKPOINT_INTERVAL = 1.0
+
+    @staticmethod
+    def suitable(info: dict, params: dict) -> bool:
+        """True for plain HTTP(S) media at least segment_min_bytes large (or of unknown size)"""
+        if (params.get('segment_connections') or 1) < 2 or params.get('proxy'):
+            return False
+        if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+            return False
+        size = info.get('filesize') or info.get('filesize_approx')
+        return not size or size >= (params.get('segment_min_bytes') or 0)
+
+    def _fetch_range(self, pool: HTTPConnectionPool, url: str, headers: Dict[str, str], path: str,
+                     start: int, end: int, position: int, retries: int,
+                     progress: Callable[[int, int, int], None]) -> None:
+        """Write bytes position-end (inclusive) of the segment starting at start into path,
+        resuming from the last written byte on errors; progress(start, position, nbytes)
+        is called after every chunk"""
+        attempt = 0
+        while position <= end:
+            conn = None
+            try:
+                conn, response = pool.get(url, {**headers, 'Range': f'bytes={position}-{end}'})
+                if response.status != 206:
+                    message = f'HTTP Error {response.status}: {response.reason} (bytes {position}-{end})'
+                    if response.status in self.RETRY_STATUSES:
+                        raise http.client.HTTPException(message)
+                    pool.release(conn, reusable=False)
+                    raise yt_dlp.utils.DownloadError(message)
+                with open(path, 'r+b') as f:
+                    f.seek(position)
+                    while position <= end:
+                        chunk = response.read(min(self.CHUNK_SIZE, end + 1 - position))
+                        if not chunk:
+                            raise http.client.IncompleteRead(b'', end + 1 - position)
+                        f.write(chunk)
+                        position += len(chunk)
+                        progress(start, position, len(chunk))
+                pool.release(conn)
+            except (OSError, http.client.HTTPException) as e:
+                if conn is not None:
+                    pool.release(conn, reusable=False)
+                attempt += 1
+                if attempt > retries:
+                    raise
+                self.report_retry(e, attempt, retries)
+                time.sleep(min(0.5 * 2 ** (attempt - 1), 10.0))
+
+    def _probe(self, url: str, headers: Dict[str, str], retries: int) -> Tuple[str, Optional[int]]:
+        """Follow redirects and return (final url, total size), or a None size if ranges are unsupported"""
+        verify = not self.params.get('nocheckcertificate')
+        attempt = redirects = 0
+        while True:
+            conn = None
+            try:
+                conn, response = HTTPConnectionPool(url, verify=verify).get(url, {**headers, 'Range': 'bytes=0-0'})
+                if response.status != 200:
+                    response.read()
+                location = response.getheader('Location')
+                if response.status in (301, 302, 303, 307, 308) and location:
+                    redirects += 1
+                    if redirects > 10:
+                        raise yt_dlp.utils.DownloadError('too many redirects')
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+                if response.status == 206:
+                    match = re.match(r'bytes \d+-\d+/(\d+)', response.getheader('Content-Range') or '')
+                    return url, int(match.group(1)) if match else None
+                if response.status in self.RETRY_STATUSES:
+                    raise http.client.HTTPException(f'HTTP Error {response.status}: {response.reason}')
+                if response.status >= 400:
+                    raise yt_dlp.utils.DownloadError(f'HTTP Error {response.status}: {response.reason}')
+                return url, None
+            except (OSError, http.client.HTTPException) as e:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                self.report_retry(e, attempt, retries)
+                time.sleep(min(0.5 * 2 ** (attempt - 1), 10.0))
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    @staticmethod
+    def _load_checkpoint(path: str, total: int, segment_size: int) -> Optional[Dict[int, int]]:
+        """Written position per segment start from a checkpoint file, or None if it does not match"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data['total'] != total or data['segment_size'] != segment_size:
+                return None
+            return {int(first): int(position) for first, position in data['positions'].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def _save_checkpoint(path: str, total: int, segment_size: int, positions: Dict[int, int]) -> None:
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'total': total, 'segment_size': segment_size,
+                       'positions': {str(first): position for first, position in positions.items()}}, f)
+        os.replace(temp_path, path)
+
+    def _fallback(self, filename, info_dict):
+        fallback = yt_dlp.downloader.http.HttpFD(self.ydl, self.params)
+        for hook in self._progress_hooks:
+            fallback.add_progress_hook(hook)
+        return fallback.real_download(filename, info_dict)
+
+    def real_download(self, filename, info_dict):
+        url = info_dict['url']
+        headers = {**(info_dict.get('http_headers') or {}), 'Accept-Encoding': 'identity'}
+        cookies = self.ydl.cookiejar.get_cookie_header(url)
+        if cookies:
+            headers['Cookie'] = cookies
+
+        retries = self.params.get('retries', 10)
+        retries = 1000 if retries == float('inf') else int(retries)
+        url, total = self._probe(url, headers, retries)
+        if not total:
+            return self._fallback(filename, info_dict)
+
+        connections = self.params.get('segment_connections') or 4
+        # Fixed-size segments let fast connections take over the remaining work, but never
+        # fewer segments than connections
+        segment_size = self.params.get('segment_size') or 4 * 1024 * 1024
+        segment_size = max(256 * 1024, min(segment_size, -(-total // connections)))
+        tmpfilename = self.temp_name(filename)
+        checkpoint = tmpfilename + '.segments'
+        ranges = [(offset, min(offset + segment_size, total) - 1) for offset in range(0, total, segment_size)]
+
+        positions = None
+        if self.params.get('continuedl', True) and os.path.exists(tmpfilename):
+            positions = self._load_checkpoint(checkpoint, total, segment_size)
+            if positions is None and os.path.getsize(tmpfilename) > 0:
+                return self._fallback(filename, info_dict)
+        self.report_destination(filename)
+        if positions is not None:
+            self.to_screen(f'[download] Resuming {len(ranges)} segments of {tmpfilename}')
+        else:
+            positions = {}
+            with open(tmpfilename, 'wb') as f:
+                if hasattr(os, 'posix_fallocate'):
+                    with contextlib.suppress(OSError):
+                        os.posix_fallocate(f.fileno(), 0, total)
+                f.truncate(total)
+        positions = {first: min(max(positions.get(first, first), first), last + 1) for first, last in ranges}
+        self._save_checkpoint(checkpoint, total, segment_size, positions)
+
+        lock = threading.Lock()
+        start = time.time()
+        resumed = sum(position - first for first, position in positions.items())
+        state = {'downloaded': resumed, 'reported': 0.0, 'saved': time.time()}
+
+        def save() -> None:
+            self._save_checkpoint(checkpoint, total, segment_size, positions)
+            state['saved'] = time.time()
+
+        def progress(first: int, position: int, nbytes: int) -> None:
+            with lock:
+                positions[first] = position
+                state['downloaded'] += nbytes
+                now = time.time()
+                if now - state['saved'] >= self.CHECKPOINT_INTERVAL:
+                    save()
+                if now - state['reported'] < 0.2 and state['downloaded'] < total:
+                    return
+                state['reported'] = now
+                elapsed = now - start
+                speed = (state['downloaded'] - resumed) / elapsed if elapsed else None
+                self._hook_progress({
+                    'status': 'downloading',
+                    'filename': filename,
+                    'tmpfilename': tmpfilename,
+                    'downloaded_bytes': state['downloaded'],
+                    'total_bytes': total,
+                    'elapsed': elapsed,
+                    'speed': speed,
+                    'eta': (total - state['downloaded']) / speed if speed else None,
+                }, info_dict)
+
+        pool = HTTPConnectionPool(url, verify=not self.params.get('nocheckcertificate'))
+        remaining = [(first, last) for first, last in ranges if positions[first] <= last]
+        try:
+            if remaining:
+                with ThreadPoolExecutor(max_workers=min(connections, len(remaining))) as executor:
+                    futures = [
+                        executor.submit(self._fetch_range, pool, url, headers, tmpfilename, first, last,
+                                        positions[first], retries, progress)
+                        for first, last in remaining
+                    ]
+                    done, pending = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+                    for future in pending:
+                        future.cancel()
+                    for future in done:
+                        future.result()
+        except BaseException:
+            with lock, contextlib.suppress(OSError):
+                save()
+            raise
+        finally:
+            pool.close()
+
+        self.try_rename(tmpfilename, filename)
+        with contextlib.suppress(OSError):
+            os.remove(checkpoint)
+        self._hook_progress({
+            'status': 'finished',
+            'filename': filename,
+            'downloaded_bytes': total,
+            'total_bytes': total,
+            'elapsed': time.time() - start,
+        }, info_dict)
+        return True
+
+class SegmentedYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that sends large plain HTTP(S) downloads through SegmentedHttpFD"""
+    def dl(self, name, info, subtitle=False, test=False):
+        if test or subtitle or name == '-' or not SegmentedHttpFD.suitable(info, self.params):
+            return super().dl(name, info, subtitle, test)
+        fd = SegmentedHttpFD(self, self.params)
+        for hook in self.params.get('progress_hooks') or []:
+            fd.add_progress_hook(hook)
+        self.write_debug(f'Invoking {fd.FD_NAME} downloader on "{info["url"]}"')
+        return fd.download(name, info, subtitle)
+
+class YoutubeDLPool:
+    """Per-thread YoutubeDL instances reused across items instead of rebuilt for every call"""
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.instances: List[yt_dlp.YoutubeDL] = []
+
+    def get(self, params: dict) -> yt_dlp.YoutubeDL:
+        """Return this thread's YoutubeDL for the given options, creating it on first use
+
+        The output template is applied per call, so jobs that differ only in
+        their file names share one instance.
+        """
+        params = dict(params)
+        outtmpl = params.pop('outtmpl', None)
+        key = repr(sorted(params.items()))
+        instances = getattr(self.local, 'instances', None)
+        if instances is None:
+            instances = self.local.instances = {}
+
+        ydl = instances.get(key)
+        if ydl is None:
+            ydl = SegmentedYoutubeDL(params)
+            instances[key] = ydl
+            with self.lock:
+                self.instances.append(ydl)
+        if outtmpl is not None:
+            ydl.params['outtmpl']['default'] = outtmpl
+        return ydl
+
+    def close(self) -> None:
+        """Close every instance created by the pool"""
+        with self.lock:
+            instances, self.instances = self.instances, []
+        for ydl in instances:
+            ydl.close()
+
+class InfoCache:
+    """Thread-safe cache of extracted info dicts so each URL is extracted only once"""
+    def __init__(self, extractor: Optional[Callable[[str], Optional[dict]]] = None,
+                 ydl_pool: Optional[YoutubeDLPool] = None):
+        self.extractor = extractor or self.extract
+        self.ydl_pool = ydl_pool or YoutubeDLPool()
+        self.lock = threading.Lock()
+        self.url_locks: Dict[str, threading.Lock] = {}
+        self.infos: Dict[str, dict] = {}
+        self.extraction_counts: Dict[str, int] = {}
+        self.extraction_seconds: Dict[str, float] = {}
+        self.failures: Dict[str, Optional[Exception]] = {}
+
+    def extract(self, url: str) -> Optional[dict]:
+        """Extract the unprocessed info dict for a URL"""
+        ydl = self.ydl_pool.get({'quiet': True, 'no_warnings': True})
+        return ydl.extract_info(url, download=False, process=False)
+
+    def get(self, url: str, remember_failure: bool = False) -> Optional[dict]:
+        """Return a private copy of the info dict for a URL, extracting it on first use
+
+        With remember_failure, a failed extraction is kept and handed to the next
+        call for the URL instead of extracting it again.
+        """
+        with self.lock:
+            url_lock = self.url_locks.setdefault(url, threading.Lock())
+
+        with url_lock:
+            if url in self.failures:
+                error = self.failures.pop(url)
+                if error is None:
+                    return None
+                raise error
+            if url not in self.infos:
+                start = time.monotonic()
+                try:
+                    info = self.extractor(url)
+                except Exception as e:
+                    if remember_failure:
+                        self.failures[url] = e
+                    raise
+                finally:
+                    with self.lock:
+                        self.extraction_counts[url] = self.extraction_counts.get(url, 0) + 1
+                        self.extraction_seconds[url] = self.extraction_seconds.get(url, 0.0) + time.monotonic() - start
+                if not info:
+                    if remember_failure:
+                        self.failures[url] = None
+                    return None
+                self.infos[url] = info
+            return copy.deepcopy(self.infos[url])
+
+    def expire(self, url: str) -> None:
+        """Drop the cached info for a URL (its media URLs expire) but keep its extraction counters, e.g. before a retry"""
+        with self.lock:
+            self.infos.pop(url, None)
+            self.failures.pop(url, None)
+
+    def discard(self, url: str) -> None:
+        """Forget everything about a URL, e.g. once its item has been recorded"""
+        with self.lock:
+            self.infos.pop(url, None)
+            self.failures.pop(url, None)
+            self.url_locks.pop(url, None)
+            self.extraction_counts.pop(url, None)
+            self.extraction_seconds.pop(url, None)
+
+    def extraction_count(self, url: str) -> int:
+        """Number of times a URL has been extracted"""
+        with self.lock:
+            return self.extraction_counts.get(url, 0)
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'ytad')
+
+class ThumbnailCache:
+    """Content-addressed on-disk cache of thumbnails and their converted forms (thread-safe)
+
+    Each image is stored once under its SHA-256; a pointer file per thumbnail URL
+    names the image. Reading a file refreshes its mtime, and the least recently
+    used files are evicted once the cache grows past max_bytes.
+    """
+    IMAGE_TYPES = ((b'\xff\xd8\xff', 'jpg'), (b'\x89PNG', 'png'))
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _pointer(self, url: str) -> str:
+        return os.path.join(self.directory, 'urls', hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def get(self, url: str, fetch: Callable[[str], bytes]) -> str:
+        """Path of the cached image for a thumbnail URL, fetching it on a miss"""
+        pointer = self._pointer(url)
+        try:
+            with open(pointer, encoding='ascii') as f:
+                path = os.path.join(self.directory, 'objects', f.read().strip())
+            if self._touch(path):
+                with self.lock:
+                    self.hits += 1
+                return path
+        except OSError:
+            pass
+
+        data = fetch(url)
+        ext = next((ext for magic, ext in self.IMAGE_TYPES if data.startswith(magic)), 'img')
+        name = f'{hashlib.sha256(data).hexdigest()}.{ext}'
+        path = os.path.join(self.directory, 'objects', name)
+        if not self._touch(path):
+            self._write(path, data)
+        self._write(pointer, name.encode('ascii'))
+        with self.lock:
+            self.misses += 1
+        self.evict(keep=path)
+        return path
+
+    def converted(self, path: str, ext: str, convert: Callable[[str, str], None]) -> str:
+        """Path of a cached image converted to ext, running convert(source, target) only once"""
+        stem, current_ext = os.path.splitext(path)
+        if current_ext == f'.{ext}':
+            return path
+        target = f'{stem}.{ext}'
+        if self._touch(target):
+            return target
+        temp_path = f'{stem}.{threading.get_ident()}.tmp.{ext}'
+        convert(path, temp_path)
+        os.replace(temp_path, target)
+        self.evict(keep=target)
+        return target
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used images, except keep, until the cache fits in max_bytes
+
+        URL pointers count towards the size; once images are removed, pointers
+        naming an image that no longer exists are removed too.
+        """
+        with self.lock:
+            files = []
+            try:
+                for entry in os.scandir(os.path.join(self.directory, 'objects')):
+                    if '.tmp' not in entry.name:
+                        with contextlib.suppress(OSError):
+                            st = entry.stat()
+                            files.append((st.st_mtime, st.st_size, entry.path))
+            except OSError:
+                return
+            pointers = []
+            with contextlib.suppress(OSError):
+                for entry in os.scandir(os.path.join(self.directory, 'urls')):
+                    if '.tmp' not in entry.name:
+                        with contextlib.suppress(OSError):
+                            pointers.append((entry.path, entry.stat().st_size))
+            total = sum(size for _, size, _ in files) + sum(size for _, size in pointers)
+            names = {os.path.basename(path) for _, _, path in files}
+            removed = False
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                    total -= size
+                    names.discard(os.path.basename(path))
+                    removed = True
+            if not removed:
+                return
+            for path, size in pointers:
+                with contextlib.suppress(OSError):
+                    with open(path, encoding='ascii') as f:
+                        name = f.read().strip()
+                    if name not in names:
+                        os.remove(path)
+
+class FinalizeMediaPP(yt_dlp.postprocessor.FFmpegPostProcessor):
+    """Convert the audio, write the tags and embed the cover in a single FFmpeg pass
+
+    Replaces FFmpegExtractAudio, EmbedThumbnail and FFmpegMetadata, which each
+    rewrite the whole file. Covers are taken from the thumbnail cache. The audio
+    stream is copied whenever the source codec already fits the target, and for
+    audio downloads info['__finalize_mode'] records whether it was 'copy' or 'transcode'.
+    Separately downloaded video and audio streams listed in info['__streams_to_merge']
+    are merged in the same pass, replacing yt-dlp's Merger. cpu_seconds adds up the
+    CPU time that FFmpeg reports for each of its runs.
+    """
+    # Audio target: (extension, encoder, source codecs that can be stream-copied)
+    TARGETS = {
+        'mp3': ('mp3', 'libmp3lame', ('mp3',)),
+        'm4a': ('m4a', 'aac', ('mp4a', 'aac')),
+        'opus': ('opus', 'libopus', ('opus',)),
+        'ogg': ('ogg', 'libvorbis', ('vorbis',)),
+        'mka': ('mka', None, ()),
+    }
+    COVER_EXTS = ('mp3', 'mp4', 'm4a', 'mov')
+    BENCH_RE = re.compile(r'bench: utime=([\d.]+)s stime=([\d.]+)s')
+
+    def __init__(self, downloader=None, thumbnail_cache: Optional[ThumbnailCache] = None,
+                 codec: Optional[str] = None, quality: Optional[str] = None,
+                 metadata: Optional[dict] = None):
+        super().__init__(downloader)
+        self.thumbnail_cache = thumbnail_cache
+        self.codec = codec
+        self.quality = quality
+        self.metadata = metadata or {}
+        self.cpu_seconds = 0.0
+        self.thumbnail_hit: Optional[bool] = None  # whether the cover came from the cache, if there was one
+
+    def real_run_ffmpeg(self, input_path_opts, output_path_opts, **kwargs):
+        # Per-process user + system time, unlike getrusage(RUSAGE_CHILDREN), which
+        # also counts FFmpeg runs of other workers
+        output_path_opts = [(path, ['-benchmark'] + list(opts)) for path, opts in output_path_opts]
+        stderr = super().real_run_ffmpeg(input_path_opts, output_path_opts, **kwargs)
+        for utime, stime in self.BENCH_RE.findall(stderr or ''):
+            self.cpu_seconds += float(utime) + float(stime)
+        return stderr
+
+    def metadata_args(self, info: dict) -> List[str]:
+        """FFmpeg -metadata options from the info dict, overridden by user-supplied values"""
+        tags = {
+            'title': info.get('track') or info.get('title'),
+            'artist': info.get('artist') or info.get('creator') or info.get('uploader'),
+            'album': info.get('album'),
+            'date': info.get('upload_date'),
+            'description': info.get('description'),
+            'purl': info.get('webpage_url'),
+            'comment': info.get('webpage_url'),
+        }
+        tags.update({key: value for key, value in self.metadata.items() if value})
+        args = []
+        for key, value in tags.items():
+            if value not in (None, ''):
+                args += ['-metadata', f"{key}={str(value).replace(chr(0), '')}"]
+        return args
+
+    def cover(self, info: dict) -> Optional[str]:
+        """Cached JPEG/PNG cover for the item, or None if it has no usable thumbnail"""
+        thumbnails = [t['url'] for t in info.get('thumbnails') or [] if t.get('url')]
+        url = info.get('thumbnail') or (thumbnails[-1] if thumbnails else None)
+        if not url or self.thumbnail_cache is None:
+            return None
+        def fetch(url: str) -> bytes:
+            self.thumbnail_hit = False
+            return self._downloader.urlopen(url).read()
+
+        try:
+            self.thumbnail_hit = True
+            path = self.thumbnail_cache.get(url, fetch)
+            return self.thumbnail_cache.converted(
+                path, 'jpg',
+                lambda source, target: self.real_run_ffmpeg([(source, [])], [(target, ['-frames:v', '1'])]),
+            ) if not path.endswith(('.jpg', '.png')) else path
+        except Exception as e:
+            self.report_warning(f'Unable to embed thumbnail: {e}')
+            return None
+
+    def audio_target(self, source: str) -> Tuple[str, Optional[str], bool]:
+        """(extension, encoder, stream copy) for the requested codec and a source codec such as 'opus' or 'mp4a'"""
+        target = self.codec
+        if target == AudioCodec.NATIVE.value:
+            # Keep the source codec in its natural container; anything else goes into Matroska
+            target = next((name for name, (_, _, sources) in self.TARGETS.items() if source in sources), 'mka')
+        ext, encoder, sources = self.TARGETS[target]
+        return ext, encoder, encoder is None or source in sources
+
+    def run(self, info):
+        path = info['filepath']
+        stem, ext = os.path.splitext(path)
+        ext = ext[1:]
+        copy_audio = True
+        if self.codec:
+            source = (info.get('acodec') or '').split('.')[0].lower()
+            ext, encoder, copy_audio = self.audio_target(source)
+        out_path = f'{stem}.{ext}'
+        cover = self.cover(info) if ext in self.COVER_EXTS else None
+        # Video first, then audio
+        streams = info.pop('__streams_to_merge', None) or [path]
+        inputs = streams + ([cover] if cover else [])
+
+        if len(streams) > 1:
+            opts = ['-map', '0:v:0', '-map', '1:a:0']
+            if cover:
+                opts += ['-map', '2:v:0', '-disposition:v:1', 'attached_pic']
+            opts += ['-c', 'copy']
+        elif self.codec:
+            opts = ['-map', '0:a:0']
+            opts += ['-c:a', 'copy'] if copy_audio else ['-c:a', encoder, '-b:a', f'{self.quality}k']
+            if cover:
+                opts += ['-map', '1:v:0', '-c:v', 'copy', '-disposition:v:0', 'attached_pic']
+                if ext == 'mp3':
+                    opts += ['-metadata:s:v', 'title=Album cover', '-metadata:s:v', 'comment=Cover (front)']
+        elif cover:
+            opts = ['-map', '0:v:0', '-map', '0:a?', '-map', '1:v:0', '-c', 'copy',
+                    '-disposition:v:1', 'attached_pic']
+        else:
+            opts = ['-map', '0', '-dn', '-c', 'copy']
+        if ext == 'mp3':
+            opts += ['-id3v2_version', '3', '-write_id3v1', '1']
+        opts += self.metadata_args(info)
+
+        self.to_screen(f'Finalizing "{out_path}"')
+        temp_path = yt_dlp.utils.prepend_extension(out_path, 'temp')
+        self.run_ffmpeg_multiple_files(inputs, temp_path, opts)
+        os.replace(temp_path, out_path)
+
+        info['filepath'] = out_path
+        info['ext'] = ext
+        if self.codec:
+            info['__finalize_mode'] = 'copy' if copy_audio else 'transcode'
+        return [stream for stream in streams if stream != out_path], info
+
+class FormatStrategy(Enum):
+    BEST = "best"
+    SMALLEST = "smallest"
+    NO_TRANSCODE = "no-transcode"
+
+class FormatEntry(NamedTuple):
+    """One yt-dlp format reduced to the fields used for ranking
+
+    Codecs are normalized to their family ('opus', 'mp4a', 'avc1', ...); None means
+    the stream is absent and '' that it is present but unknown.
+    """
+    format_id: str
+    ext: str
+    acodec: Optional[str]
+    vcodec: Optional[str]
+    abr: float
+    height: int
+    fps: float
+    filesize: int
+    protocol: str
+
+    @staticmethod
+    def _codec(value: Optional[str]) -> Optional[str]:
+        if value == 'none':
+            return None
+        return (value or '').split('.')[0].lower()
+
+    @classmethod
+    def from_format(cls, f: dict, duration: Optional[float] = None) -> 'FormatEntry':
+        """Build an entry from a yt-dlp format dict, estimating the size from the bitrate if needed"""
+        acodec, vcodec = cls._codec(f.get('acodec')), cls._codec(f.get('vcodec'))
+        abr = f.get('abr') or (f.get('tbr') if vcodec is None else 0) or 0
+        filesize = f.get('filesize') or f.get('filesize_approx') or 0
+        if not filesize and f.get('tbr') and duration:
+            filesize = f['tbr'] * 125 * duration
+        return cls(
+            format_id=str(f.get('format_id', 'unknown')),
+            ext=f.get('ext') or 'unknown',
+            acodec=acodec,
+            vcodec=vcodec,
+            abr=float(abr),
+            height=int(f.get('height') or 0),
+            fps=float(f.get('fps') or 0),
+            filesize=int(filesize),
+            # Unprocessed infos leave the protocol of plain HTTP(S) formats unset
+            protocol=f.get('protocol') or (yt_dlp.utils.determine_protocol(f) if f.get('url') else ''),
+        )
+
+    @property
+    def has_audio(self) -> bool:
+        return self.acodec is not None
+
+    @property
+    def has_video(self) -> bool:
+        return self.vcodec is not None
+
+class FormatTarget(NamedTuple):
+    """What the user asked for: the ranking input besides the formats themselves"""
+    download_format: DownloadFormat
+    audio_bitrate: int
+    height: int
+    audio_codec: AudioCodec = AudioCodec.MP3
+
+class FormatChoice(NamedTuple):
+    """A downloadable selection: one combined format, or a video-only plus an audio-only format"""
+    video: Optional[FormatEntry]
+    audio: Optional[FormatEntry]
+
+    @property
+    def parts(self) -> List[FormatEntry]:
+        parts = [self.video] if self.video is not None else []
+        if self.audio is not None and self.audio != self.video:
+            parts.append(self.audio)
+        return parts
+
+    @property
+    def spec(self) -> str:
+        """yt-dlp format selector for this choice, e.g. '137+140' or '251'"""
+        return '+'.join(entry.format_id for entry in self.parts)
+
+    @property
+    def filesize(self) -> int:
+        return sum(entry.filesize for entry in self.parts)
+
+    @property
+    def height(self) -> int:
+        return self.video.height if self.video else 0
+
+    @property
+    def fps(self) -> float:
+        return self.video.fps if self.video else 0.0
+
+    @property
+    def abr(self) -> float:
+        return self.audio.abr if self.audio else 0.0
+
+    @property
+    def label(self) -> str:
+        """Short description for menus, e.g. '720p30 avc1+mp4a' or '160kbps opus'"""
+        if self.video:
+            codecs = '+'.join(filter(None, (self.video.vcodec, self.audio.acodec if self.audio else None)))
+            return f"{self.height}p{int(self.fps) if self.fps else ''} {codecs}".strip()
+        return f"{int(self.abr)}kbps {self.audio.acodec if self.audio else ''}".strip()
+
+    @property
+    def streamed(self) -> bool:
+        """True if a part needs a segmented protocol (HLS/DASH) instead of plain HTTP"""
+        return any(entry.protocol not in ('http', 'https', '') for entry in self.parts)
+
+    def copyable(self, target: FormatTarget) -> bool:
+        """True if the output can be written by stream copy, without transcoding"""
+        if target.download_format == DownloadFormat.VIDEO:
+            return bool(self.video and self.video.vcodec == 'avc1' and self.audio and self.audio.acodec == 'mp4a')
+        if target.audio_codec == AudioCodec.NATIVE:
+            return True
+        return bool(self.audio and self.audio.acodec in FinalizeMediaPP.TARGETS[target.audio_codec.value][2])
+
+def _excess_height(choice: FormatChoice, target: FormatTarget) -> int:
+    return max(0, choice.height - target.height) if target.download_format == DownloadFormat.VIDEO else 0
+
+def cost_best(choice: FormatChoice, target: FormatTarget) -> tuple:
+    """Highest quality within the requested limit; compatibility and size break ties"""
+    return (_excess_height(choice, target), -choice.height, -choice.fps, -choice.abr,
+            not choice.copyable(target), choice.streamed, choice.filesize)
+
+def cost_smallest(choice: FormatChoice, target: FormatTarget) -> tuple:
+    """Smallest file that still meets the requested bitrate or height (or comes closest)"""
+    if target.download_format == DownloadFormat.VIDEO:
+        shortfall = target.height - min(choice.height, target.height)
+    else:
+        shortfall = max(0.0, target.audio_bitrate - choice.abr)
+    return (_excess_height(choice, target), shortfall, choice.filesize, choice.streamed)
+
+def cost_no_transcode(choice: FormatChoice, target: FormatTarget) -> tuple:
+    """Best quality among streams that can be stream-copied to the output, then the rest"""
+    return (_excess_height(choice, target), not choice.copyable(target), -choice.height, -choice.fps,
+            -choice.abr, choice.streamed, choice.filesize)
+
+FORMAT_COSTS: Dict[FormatStrategy, Callable[[FormatChoice, FormatTarget], tuple]] = {
+    FormatStrategy.BEST: cost_best,
+    FormatStrategy.SMALLEST: cost_smallest,
+    FormatStrategy.NO_TRANSCODE: cost_no_transcode,
+}
+
+class FormatIndex:
+    """Typed index over a video's formats, ranked by a cost function (lower is better)"""
+    def __init__(self, formats: Iterable[dict], duration: Optional[float] = None):
+        entries: Dict[str, FormatEntry] = {}
+        for f in formats:
+            entry = FormatEntry.from_format(f, duration)
+            if entry.has_audio or entry.has_video:
+                entries[entry.format_id] = entry
+        self.entries = list(entries.values())
+
+    @classmethod
+    def from_info(cls, info: dict) -> 'FormatIndex':
+        return cls(info.get('formats') or [], info.get('duration'))
+
+    def choices(self, target: FormatTarget) -> List[FormatChoice]:
+        """Every candidate selection for the target"""
+        audio_only = [entry for entry in self.entries if entry.has_audio and not entry.has_video]
+        if target.download_format == DownloadFormat.AUDIO:
+            candidates = audio_only or [entry for entry in self.entries if entry.has_audio]
+            return [FormatChoice(None, entry) for entry in candidates]
+
+        choices = [FormatChoice(entry, entry) for entry in self.entries if entry.has_audio and entry.has_video]
+        for video in self.entries:
+            if video.has_video and not video.has_audio:
+                choices += [FormatChoice(video, audio) for audio in audio_only]
+        return choices
+
+    def rank(self, target: FormatTarget,
+             cost: Callable[[FormatChoice, FormatTarget], tuple] = cost_no_transcode) -> List[FormatChoice]:
+        """All choices for the target, cheapest first"""
+        return sorted(self.choices(target), key=lambda choice: cost(choice, target))
+
+    def select(self, target: FormatTarget,
+               cost: Callable[[FormatChoice, FormatTarget], tuple] = cost_no_transcode) -> Optional[FormatChoice]:
+        """The cheapest choice for the target, or None if there is no usable format"""
+        return min(self.choices(target), key=lambda choice: cost(choice, target), default=None)
+
+class JobOptions(NamedTuple):
+    """Immutable download settings of one job; derive variants with _replace()"""
+    download_format: DownloadFormat = DownloadFormat.AUDIO
+    audio_codec: AudioCodec = AudioCodec.MP3
+    audio_quality: AudioQuality = AudioQuality.BEST
+    video_quality: VideoQuality = VideoQuality.HD
+    format_strategy: FormatStrategy = FormatStrategy.NO_TRANSCODE
+
+    @property
+    def target(self) -> FormatTarget:
+        """Format ranking target for these settings"""
+        return FormatTarget(self.download_format, int(self.audio_quality.value),
+                            int(self.video_quality.value), self.audio_codec)
+
+    @property
+    def format_cost(self) -> Callable[[FormatChoice, FormatTarget], tuple]:
+        return FORMAT_COSTS[self.format_strategy]
+
+    def to_json(self) -> dict:
+        return {
+            'format': self.download_format.value,
+            'audio_format': self.audio_codec.value,
+            'audio_quality': self.audio_quality.value,
+            'video_quality': self.video_quality.value,
+            'format_strategy': self.format_strategy.value,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict, defaults: Optional['JobOptions'] = None) -> 'JobOptions':
+        """Options from a to_json() dict, filling missing keys from defaults
+
+        A 'quality' key is read as the audio or the video quality depending on
+        the format. Raises ValueError for unknown values.
+        """
+        options = defaults or cls()
+        download_format = DownloadFormat(data.get('format', options.download_format.value))
+        options = options._replace(
+            download_format=download_format,
+            audio_codec=AudioCodec(data.get('audio_format', options.audio_codec.value)),
+            audio_quality=parse_quality(str(data.get('audio_quality', options.audio_quality.value)), DownloadFormat.AUDIO),
+            video_quality=parse_quality(str(data.get('video_quality', options.video_quality.value)), DownloadFormat.VIDEO),
+            format_strategy=FormatStrategy(data.get('format_strategy', options.format_strategy.value)),
+        )
+        if data.get('quality') is not None:
+            quality = parse_quality(str(data['quality']), download_format)
+            field = 'audio_quality' if download_format == DownloadFormat.AUDIO else 'video_quality'
+            options = options._replace(**{field: quality})
+        return options
+
+class ItemResult(NamedTuple):
+    """Outcome of one downloaded item"""
+    url: str
+    id: Optional[str]
+    title: str
+    status: str  # 'ok', 'skipped' or 'failed'
+    path: Optional[str]
+    bytes: Optional[int]
+    seconds: Optional[float]
+    error_class: Optional[str]
+    error: Optional[str]
+    attempts: int
+    failure: Optional[str]  # 'transient' or 'permanent' for failed items
+    reused: Optional[str]  # 'hardlink', 'reflink' or 'copy' when an existing file was reused
+
+class JobResults:
+    """Per-item outcomes and counters of one job (thread-safe)
+
+    Every job gets its own collector, so jobs running side by side in one
+    process never share counters, stage timings or retry allowances. Items are
+    keyed by item_key, so a video listed twice in a playlist counts as two items.
+    The listener, if any, is called with each ItemResult as it is added.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, options: JobOptions, listener: Optional[Callable[[ItemResult], None]] = None,
+                 job_id: Optional[int] = None):
+        self.options = options
+        self.listener = listener
+        self.job_id = job_id if job_id is not None else next(JobResults._ids)
+        self.lock = threading.Lock()
+        self.metrics = Metrics()
+        self.items: List[ItemResult] = []
+        self.statuses: Dict[str, int] = collections.Counter()
+        self.discovered = 0
+        self.playlist_entries = 0  # discovered items that came from a playlist
+        self.playlist_done = 0
+        self.copied = 0
+        self.transcoded = 0
+        self.retries = 0
+        self.attempts: Dict[str, int] = collections.Counter()
+        self.reused = 0
+        self.saved_bytes = 0
+        self.saved_seconds = 0.0
+        self.thumbnail_hits = 0
+        self.thumbnail_misses = 0
+        self.disk_waits = 0
+
+    @staticmethod
+    def item_key(url: str, item_num: Optional[int] = None) -> str:
+        """Key of an item within its job: the URL, plus its position for playlist entries"""
+        return url if item_num is None else f'{url}#{item_num}'
+
+    def add(self, item: ItemResult, playlist_entry: bool = False) -> None:
+        with self.lock:
+            self.items.append(item)
+            self.statuses[item.status] += 1
+            if playlist_entry:
+                self.playlist_done += 1
+        if self.listener:
+            self.listener(item)
+
+    def note_discovered(self, playlist_entry: bool = False) -> None:
+        """Count a newly discovered item; playlist entries also count toward the playlist progress"""
+        with self.lock:
+            self.discovered += 1
+            if playlist_entry:
+                self.playlist_entries += 1
+
+    def note_audio_mode(self, mode: str) -> None:
+        """Count an item whose audio was stream-copied ('copy') or transcoded"""
+        with self.lock:
+            if mode == 'copy':
+                self.copied += 1
+            else:
+                self.transcoded += 1
+
+    def note_reused(self, entry: 'ContentEntry') -> None:
+        """Count an item served from an existing file instead of being downloaded and converted"""
+        with self.lock:
+            self.reused += 1
+            self.saved_bytes += entry.size
+            self.saved_seconds += entry.seconds
+
+    def note_thumbnail(self, hit: bool) -> None:
+        """Count a cover taken from the thumbnail cache (hit) or downloaded (miss)"""
+        with self.lock:
+            if hit:
+                self.thumbnail_hits += 1
+            else:
+                self.thumbnail_misses += 1
+
+    def note_disk_wait(self) -> None:
+        """Count an item that had to wait for disk space"""
+        with self.lock:
+            self.disk_waits += 1
+
+    def take_retry(self, key: str, policy: 'RetryPolicy') -> Optional[int]:
+        """Claim a retry for an item by its item_key; returns its retry number, or None if the item or job is out of retries"""
+        with self.lock:
+            if self.attempts[key] >= policy.retries or self.retries >= policy.budget:
+                return None
+            self.attempts[key] += 1
+            self.retries += 1
+            return self.attempts[key]
+
+    def count(self, status: str) -> int:
+        with self.lock:
+            return self.statuses[status]
+
+    def failures(self, kind: 'FailureKind') -> int:
+        """Number of failed items of one failure kind"""
+        with self.lock:
+            return sum(1 for item in self.items if item.failure == kind.value)
+
+    @property
+    def succeeded(self) -> int:
+        return self.count('ok')
+
+    @property
+    def skipped(self) -> int:
+        return self.count('skipped')
+
+    @property
+    def failed(self) -> int:
+        return self.count('failed')
+
+    @property
+    def done(self) -> int:
+        with self.lock:
+            return len(self.items)
+
+class DiskReservation:
+    """Disk space set aside for one item on each filesystem it writes to
+
+    Whatever the item has already written under its stems is reflected in the
+    free space itself, so only the rest of the estimate is held back.
+    """
+    def __init__(self, gate: 'DiskSpaceGate', needs: Dict[str, Tuple[int, int]], stems: List[str]):
+        self.gate = gate
+        # device -> (a directory on it, bytes needed, free bytes to keep)
+        self.required: Dict[int, Tuple[str, int, int]] = {}
+        for directory, (nbytes, floor) in needs.items():
+            device = self.device(directory)
+            previous = self.required.get(device, (directory, 0, 0))
+            self.required[device] = (previous[0], previous[1] + nbytes, max(previous[2], floor))
+        self.stems = [(stem, self.device(os.path.dirname(stem) or '.')) for stem in stems]
+
+    @staticmethod
+    def device(directory: str) -> int:
+        """Filesystem (device number) a directory is on"""
+        return os.stat(directory).st_dev
+
+    def outstanding(self, device: int) -> int:
+        """Reserved bytes on a filesystem that the item has not written yet"""
+        if device not in self.required:
+            return 0
+        written = 0
+        for stem, stem_device in self.stems:
+            if stem_device != device:
+                continue
+            for path in glob.glob(glob.escape(stem) + '.*'):
+                with contextlib.suppress(OSError):
+                    written += os.path.getsize(path)
+        return max(0, self.required[device][1] - written)
+
+    def release(self) -> None:
+        self.gate.release(self)
+
+class DiskSpaceGate:
+    """Admission control on free disk space (thread-safe)
+
+    Before an item starts downloading it reserves its estimated size on every
+    filesystem it writes to, and waits while that would leave less than the
+    filesystem's floor free after the outstanding reservations of the items in
+    flight: min_free on the output filesystem, scratch_min_free on a separate
+    scratch filesystem (often a small tmpfs). An item that does not fit even with
+    nothing else in flight fails with ENOSPC.
+    """
+    POLL_INTERVAL = 5.0
+
+    def __init__(self, min_free: int = 512 * 1024 * 1024, scratch_min_free: int = 0):
+        self.min_free = min_free
+        self.scratch_min_free = scratch_min_free
+        self.condition = threading.Condition()
+        self.reservations: List[DiskReservation] = []
+        self.waits = 0
+
+    def available(self, directory: str, device: int, floor: int) -> int:
+        """Free bytes on a directory's filesystem after the floor and outstanding reservations"""
+        held = sum(reservation.outstanding(device) for reservation in self.reservations)
+        return shutil.disk_usage(directory).free - floor - held
+
+    def reserve(self, needs: Dict[str, int], stems: List[str], scratch: Iterable[str] = (),
+                on_wait: Optional[Callable[[str, int, int], None]] = None) -> DiskReservation:
+        """Reserve bytes per directory for an item writing files named stem.*, waiting for space if needed
+
+        Directories listed in scratch keep scratch_min_free free instead of min_free,
+        unless they share a filesystem with a non-scratch directory.
+        """
+        scratch = set(scratch)
+        reservation = DiskReservation(self, {
+            directory: (nbytes, self.scratch_min_free if directory in scratch else self.min_free)
+            for directory, nbytes in needs.items()
+        }, stems)
+        waited = False
+        with self.condition:
+            while True:
+                short = None
+                for device, (directory, nbytes, floor) in reservation.required.items():
+                    available = self.available(directory, device, floor)
+                    if available < nbytes:
+                        short = (device, directory, nbytes, available)
+                        break
+                if short is None:
+                    self.reservations.append(reservation)
+                    return reservation
+
+                device, directory, nbytes, available = short
+                if not any(device in other.required for other in self.reservations):
+                    raise OSError(errno.ENOSPC, f"not enough disk space in {directory}: "
+                                                f"{nbytes / (1024 * 1024):.1f} MiB needed, "
+                                                f"{max(0, available) / (1024 * 1024):.1f} MiB available")
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                    if on_wait:
+                        on_wait(directory, nbytes, max(0, available))
+                self.condition.wait(self.POLL_INTERVAL)
+
+    def release(self, reservation: DiskReservation) -> None:
+        with self.condition:
+            if reservation in self.reservations:
+                self.reservations.remove(reservation)
+                self.condition.notify_all()
+
+def move_atomic(path: str, directory: str) -> str:
+    """Move a finished file into a directory, where it appears complete or not at all"""
+    target = os.path.join(directory, os.path.basename(path))
+    try:
+        os.replace(path, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        temp_path = f'{target}.{threading.get_ident()}.tmp'
+        try:
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+        os.remove(path)
+    return target
+
+class FetchedItem(NamedTuple):
+    """A downloaded item handed from the fetch stage to the postprocessing stage"""
+    url: str
+    title: str
+    info: dict
+    postprocess_opts: dict
+    output_dir: str
+    results: JobResults
+    started: float
+    reservation: Optional[DiskReservation] = None
+    claim: Optional[threading.Event] = None  # content index claim to index and release when done
+    item_num: Optional[int] = None  # position in the playlist, for JobResults.item_key
+
+class JobStatus(Enum):
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class JobStore:
+    """Persistent download archive for one output directory (SQLite, thread-safe)
+
+    Items are keyed by (video_id, format, quality) so reruns can skip finished
+    downloads and retry only failed or interrupted ones. close() releases the
+    connection; a closed store reconnects on its next use.
+    """
+    FILENAME = '.ytad_archive.sqlite3'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+        with self.lock, self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS items ('
+                'video_id TEXT NOT NULL, format TEXT NOT NULL, quality TEXT NOT NULL, '
+                'status TEXT NOT NULL, path TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, '
+                'updated_at REAL NOT NULL, PRIMARY KEY (video_id, format, quality))'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """The open connection, reconnecting if the store was closed (call with the lock held)"""
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        return self.conn
+
+    def close(self) -> None:
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Tuple[JobStatus, Optional[str]]]:
+        """Return (status, path) for an item, or None if it was never started"""
+        with self.lock:
+            row = self._connection().execute(
+                'SELECT status, path FROM items WHERE video_id = ? AND format = ? AND quality = ?', key
+            ).fetchone()
+        return (JobStatus(row[0]), row[1]) if row else None
+
+    def is_complete(self, key: Tuple[str, str, str]) -> bool:
+        """Check whether an item finished and its output file still exists"""
+        entry = self.get(key)
+        return bool(entry and entry[0] == JobStatus.COMPLETED and entry[1] and os.path.exists(entry[1]))
+
+    def mark(self, key: Tuple[str, str, str], status: JobStatus,
+             path: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Record the state of an item"""
+        attempts = 1 if status == JobStatus.IN_PROGRESS else 0
+        with self.lock, self._connection() as conn:
+            conn.execute(
+                'INSERT INTO items (video_id, format, quality, status, path, error, attempts, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (video_id, format, quality) DO UPDATE SET '
+                'status = excluded.status, path = COALESCE(excluded.path, items.path), '
+                'error = excluded.error, attempts = items.attempts + excluded.attempts, '
+                'updated_at = excluded.updated_at',
+                (*key, status.value, path, error, attempts, time.time())
+            )
+
+    def count(self, status: JobStatus) -> int:
+        """Number of items in a given state"""
+        with self.lock:
+            return self._connection().execute('SELECT COUNT(*) FROM items WHERE status = ?', (status.value,)).fetchone()[0]
+
+    @staticmethod
+    def cleanup_partials(stem: str) -> None:
+        """Remove leftover partial and intermediate files for an output path stem"""
+        pattern = glob.escape(stem)
+        for leftover in (glob.glob(pattern + '.*.part') + glob.glob(pattern + '.*.part.segments')
+                         + glob.glob(pattern + '.*.ytdl') + glob.glob(pattern + '.part')):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+
+class CloneMethod(Enum):
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+    COPY = "copy"
+
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (Btrfs, XFS)
+
+def reflink(source: str, target: str) -> bool:
+    """Clone a file as a copy-on-write reflink; False if the filesystem cannot"""
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(target)
+        return False
+
+class ContentEntry(NamedTuple):
+    """A finished output file in the content index"""
+    path: str
+    size: int
+    seconds: float  # CPU time of the FFmpeg runs of the finalize pass that produced it
+
+class ContentIndex:
+    """Index of finished output files across directories and runs (SQLite, thread-safe)
+
+    Items are keyed by (extractor, video_id, format, quality). A later request for
+    the same content is served by cloning an indexed file instead of downloading
+    and converting it again. Content that another worker is producing right now
+    is claimed, so duplicates in one run wait for it instead of fetching it twice.
+    """
+    FILENAME = 'content.sqlite3'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.in_flight: Dict[tuple, threading.Event] = {}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS content ('
+                'extractor TEXT NOT NULL, video_id TEXT NOT NULL, format TEXT NOT NULL, quality TEXT NOT NULL, '
+                'path TEXT NOT NULL, size INTEGER NOT NULL, seconds REAL NOT NULL, updated_at REAL NOT NULL, '
+                'PRIMARY KEY (extractor, video_id, format, quality, path))'
+            )
+
+    def find(self, key: Tuple[str, str, str, str]) -> Optional[ContentEntry]:
+        """Return an indexed file for the content that still exists unchanged; forget the others"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT path, size, seconds FROM content '
+                'WHERE extractor = ? AND video_id = ? AND format = ? AND quality = ? ORDER BY updated_at', key
+            ).fetchall()
+        stale = []
+        found = None
+        for path, size, seconds in rows:
+            try:
+                unchanged = os.path.isfile(path) and os.path.getsize(path) == size
+            except OSError:
+                unchanged = False
+            if not unchanged:
+                stale.append(path)
+            elif found is None:
+                found = ContentEntry(path, size, seconds)
+        if stale:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    'DELETE FROM content WHERE extractor = ? AND video_id = ? AND format = ? AND quality = ? AND path = ?',
+                    [(*key, path) for path in stale]
+                )
+        return found
+
+    def add(self, key: Tuple[str, str, str, str], path: str, seconds: float) -> None:
+        """Index a finished output file"""
+        path = os.path.abspath(path)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO content (extractor, video_id, format, quality, path, size, seconds, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (*key, path, os.path.getsize(path), seconds, time.time())
+            )
+
+    def claim(self, key: Tuple[str, str, str, str]) -> Tuple[Optional[ContentEntry], Optional[threading.Event]]:
+        """Return (entry, None) if the content exists, else (None, claim) after claiming it
+
+        Blocks while another worker holds the claim. The holder must pass its claim
+        to release() once the content is indexed or has failed.
+        """
+        while True:
+            entry = self.find(key)
+            if entry:
+                return entry, None
+            with self.lock:
+                pending = self.in_flight.get(key)
+                if pending is None:
+                    claim = self.in_flight[key] = threading.Event()
+                    return None, claim
+            pending.wait()
+
+    def release(self, key: Tuple[str, str, str, str], claim: threading.Event) -> None:
+        with self.lock:
+            if self.in_flight.get(key) is claim:
+                del self.in_flight[key]
+        claim.set()
+
+    @staticmethod
+    def clone(source: str, target: str) -> CloneMethod:
+        """Create target as a hardlink, reflink or copy of source, whichever works first"""
+        temp_path = f'{target}.{threading.get_ident()}.tmp'
+        try:
+            try:
+                os.link(source, temp_path)
+                method = CloneMethod.HARDLINK
+            except OSError:
+                if reflink(source, temp_path):
+                    method = CloneMethod.REFLINK
+                else:
+                    shutil.copyfile(source, temp_path)
+                    method = CloneMethod.COPY
+            os.replace(temp_path, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+        return method
+
+class QueuedJobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class JobQueue:
+    """Persistent job queue of the download daemon (SQLite, thread-safe)
+
+    A job is one submitted URL (video or playlist) with its item counters. Jobs
+    that were queued or running when the daemon stopped are queued again on the
+    next start; the download archive then skips their finished items.
+    """
+    FIELDS = ('id', 'url', 'output_dir', 'options', 'status', 'items', 'succeeded', 'failed', 'skipped',
+              'error', 'created_at', 'updated_at')
+    COUNTERS = ('items', 'succeeded', 'failed', 'skipped')
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, output_dir TEXT NOT NULL, '
+                'status TEXT NOT NULL, items INTEGER NOT NULL DEFAULT 0, succeeded INTEGER NOT NULL DEFAULT 0, '
+                'failed INTEGER NOT NULL DEFAULT 0, skipped INTEGER NOT NULL DEFAULT 0, error TEXT, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL, options TEXT)'
+            )
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')]
+            if 'options' not in columns:
+                self.conn.execute('ALTER TABLE jobs ADD COLUMN options TEXT')
+
+    def _job(self, row: tuple) -> dict:
+        job = dict(zip(self.FIELDS, row))
+        job['options'] = json.loads(job['options']) if job['options'] else None
+        return job
+
+    def add(self, url: str, output_dir: str, options: Optional[dict] = None) -> dict:
+        """Queue a new job with its JobOptions as JSON and return it"""
+        now = time.time()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO jobs (url, output_dir, options, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (url, output_dir, json.dumps(options) if options else None, QueuedJobStatus.QUEUED.value, now, now)
+            )
+        return self.get(cursor.lastrowid)
+
+    def get(self, job_id: int) -> Optional[dict]:
+        """Return a job as a dict, or None if it does not exist"""
+        with self.lock:
+            row = self.conn.execute(f'SELECT {", ".join(self.FIELDS)} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def list(self, status: Optional[QueuedJobStatus] = None) -> List[dict]:
+        """Return all jobs, or the jobs in one state, oldest first"""
+        query = f'SELECT {", ".join(self.FIELDS)} FROM jobs'
+        params: tuple = ()
+        if status is not None:
+            query += ' WHERE status = ?'
+            params = (status.value,)
+        with self.lock:
+            rows = self.conn.execute(query + ' ORDER BY id', params).fetchall()
+        return [self._job(row) for row in rows]
+
+    def set_status(self, job_id: int, status: QueuedJobStatus, error: Optional[str] = None,
+                   only_from: Iterable[QueuedJobStatus] = ()) -> bool:
+        """Move a job to a new state, optionally only from the given states; False if it did not move"""
+        query = 'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?'
+        params = [status.value, error, time.time(), job_id]
+        only_from = [s.value for s in only_from]
+        if only_from:
+            query += f' AND status IN ({", ".join("?" * len(only_from))})'
+            params += only_from
+        with self.lock, self.conn:
+            return self.conn.execute(query, params).rowcount > 0
+
+    def set_counts(self, job_id: int, counts: Dict[str, int]) -> None:
+        """Store the item counters of a job"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                f'UPDATE jobs SET {", ".join(f"{name} = ?" for name in self.COUNTERS)}, updated_at = ? WHERE id = ?',
+                (*(counts.get(name, 0) for name in self.COUNTERS), time.time(), job_id)
+            )
+
+    def resume(self) -> List[int]:
+        """Queue interrupted jobs again with fresh counters and return every queued job id, oldest first"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                f'UPDATE jobs SET status = ?, {", ".join(f"{name} = 0" for name in self.COUNTERS)} WHERE status = ?',
+                (QueuedJobStatus.QUEUED.value, QueuedJobStatus.RUNNING.value)
+            )
+            rows = self.conn.execute('SELECT id FROM jobs WHERE status = ? ORDER BY id',
+                                     (QueuedJobStatus.QUEUED.value,)).fetchall()
+        return [row[0] for row in rows]
+
+class StageStats:
+    """Busy-time accounting for one pipeline stage (thread-safe)"""
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.busy_seconds = 0.0
+        self.items = 0
+
+    def record(self, seconds: float) -> None:
+        """Record one processed item"""
+        with self.lock:
+            self.busy_seconds += seconds
+            self.items += 1
+
+    def utilization(self, wall_seconds: float) -> float:
+        """Fraction of available worker time spent busy"""
+        if wall_seconds <= 0 or self.workers <= 0:
+            return 0.0
+        return min(1.0, self.busy_seconds / (self.workers * wall_seconds))
+
+class FetchOutcome(Enum):
+    OK = "ok"
+    SLOW = "slow"
+    THROTTLED = "throttled"
+    FAILED = "failed"
+    RETRIED = "retried"
+    SKIPPED = "skipped"
+
+THROTTLING_ERROR = re.compile(r'HTTP Error (403|429)|Too Many Requests', re.IGNORECASE)
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Check whether an error means the server is throttling us (HTTP 403/429)"""
+    return bool(THROTTLING_ERROR.search(str(error)))
+
+class FailureKind(Enum):
+    TRANSIENT = "transient"
+    PERMANENT = "permanent"
+
+TRANSIENT_HTTP_STATUSES = (403, 408, 416, 425, 429, 500, 502, 503, 504)
+HTTP_STATUS = re.compile(r'HTTP Error (\d{3})')
+PERMANENT_ERROR = re.compile(
+    r'private video|video unavailable|has been removed|no longer available|not available in your country'
+    r'|geo.?restrict|confirm your age|members.only|copyright|account .*terminated|unsupported url'
+    r'|requested format is not available',
+    re.IGNORECASE)
+TRANSIENT_ERROR = re.compile(
+    r'timed? ?out|temporar|connection (reset|refused|aborted)|broken pipe|remote end closed|incomplete ?read'
+    r'|name or service not known|network is unreachable|eof occurred|read error',
+    re.IGNORECASE)
+
+def classify_error(error: BaseException) -> FailureKind:
+    """Classify a failed item: timeouts, dropped connections, HTTP 5xx and throttling are
+    transient and worth retrying; private, removed and geo-blocked videos are permanent
+
+    Unrecognised errors count as permanent, so they do not use up the retry budget.
+    """
+    if isinstance(error, yt_dlp.utils.DownloadCancelled):
+        return FailureKind.PERMANENT
+    causes = [error, error.__cause__]
+    exc_info = getattr(error, 'exc_info', None)
+    if exc_info:
+        causes.append(exc_info[1])
+    for cause in causes:
+        if isinstance(cause, (yt_dlp.utils.GeoRestrictedError, yt_dlp.utils.UnsupportedError)):
+            return FailureKind.PERMANENT
+        if isinstance(cause, (TimeoutError, ConnectionError, http.client.HTTPException,
+                              yt_dlp.networking.exceptions.TransportError)):
+            return FailureKind.TRANSIENT
+
+    message = str(error)
+    if PERMANENT_ERROR.search(message):
+        return FailureKind.PERMANENT
+    status = HTTP_STATUS.search(message)
+    if status:
+        return FailureKind.TRANSIENT if int(status.group(1)) in TRANSIENT_HTTP_STATUSES else FailureKind.PERMANENT
+    return FailureKind.TRANSIENT if TRANSIENT_ERROR.search(message) else FailureKind.PERMANENT
+
+class RetryLater(Exception):
+    """Raised by a pipeline fetch to have its job queued again after a delay"""
+    def __init__(self, delay: float):
+        super().__init__(f'retry in {delay:.1f}s')
+        self.delay = delay
+
+class RetryPolicy:
+    """Jittered exponential backoff with per-item and per-job retry limits"""
+    def __init__(self, retries: int = 3, budget: int = 50, base_delay: float = 2.0, max_delay: float = 60.0):
+        self.retries = retries
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        """Backoff before the given retry (1 for the first): half fixed, half random"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+def host_key(url: str) -> Optional[str]:
+    """Concurrency key for a URL: the CDN domain (e.g. googlevideo.com) or the IP address"""
+    host = urllib.parse.urlparse(url).hostname
+    if not host:
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        return '.'.join(host.split('.')[-2:])
+
+class AdaptiveLimiter:
+    """Asyncio concurrency limit that adapts to server health (AIMD)
+
+    The limit halves when a request is throttled, drops by one when throughput
+    is slow, and grows by one after a full window of healthy completions.
+    """
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = self.maximum
+        self.active = 0
+        self.healthy_streak = 0
+        self.condition: Optional[asyncio.Condition] = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        return self.condition
+
+    async def acquire(self) -> None:
+        """Wait for a free slot"""
+        condition = self._condition()
+        async with condition:
+            await condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self, outcome: FetchOutcome) -> None:
+        """Free a slot and adjust the limit from the request outcome"""
+        condition = self._condition()
+        async with condition:
+            self.active -= 1
+            if outcome == FetchOutcome.THROTTLED:
+                self.limit = max(self.minimum, self.limit // 2)
+                self.healthy_streak = 0
+            elif outcome == FetchOutcome.SLOW:
+                self.limit = max(self.minimum, self.limit - 1)
+                self.healthy_streak = 0
+            elif outcome == FetchOutcome.OK:
+                self.healthy_streak += 1
+                if self.healthy_streak >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.healthy_streak = 0
+            condition.notify_all()
+
+class SchedulerStats:
+    """Throughput and error-rate counters for the download scheduler"""
+    def __init__(self):
+        self.started = time.monotonic()
+        self.outcomes: Dict[FetchOutcome, int] = {outcome: 0 for outcome in FetchOutcome}
+        self.bytes = 0
+        self.throttled = 0
+
+    def record(self, outcome: FetchOutcome, nbytes: int = 0, throttled: bool = False) -> None:
+        """Record one finished fetch attempt"""
+        self.outcomes[outcome] += 1
+        self.bytes += nbytes
+        self.throttled += throttled
+
+    @property
+    def attempted(self) -> int:
+        return sum(count for outcome, count in self.outcomes.items() if outcome != FetchOutcome.SKIPPED)
+
+    def error_rate(self) -> float:
+        """Fraction of attempted fetches that failed, were throttled or will be retried"""
+        errors = (self.outcomes[FetchOutcome.FAILED] + self.outcomes[FetchOutcome.THROTTLED]
+                  + self.outcomes[FetchOutcome.RETRIED])
+        return errors / self.attempted if self.attempted else 0.0
+
+    def items_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        finished = self.attempted - self.outcomes[FetchOutcome.RETRIED]
+        return finished / elapsed if elapsed > 0 else 0.0
+
+    def bytes_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+class DownloadPipeline:
+    """Asyncio-scheduled two-stage pipeline: download workers feed postprocessing workers
+
+    Network-bound fetches and CPU-bound FFmpeg work run in separate worker pools so
+    neither stage waits for the other. Fetches are admitted through a global and a
+    per-host AdaptiveLimiter, which back off when the server throttles and ramp up
+    again while it stays healthy. A job takes its host slot before its global
+    slot, so jobs waiting for a busy host leave the global slots to other hosts
+    (only the host lookup runs in a global slot). The queues between stages are bounded, so
+    download workers wait when postprocessing falls behind.
+
+    ``fetch(*job)`` returns an item for ``postprocess(*item)``, returns None for a
+    skipped job, or raises on failure. Raising RetryLater puts the job back at the
+    end of the queue once its delay has passed, so a backing-off item never holds
+    a download worker; the run only ends after every retry has been fetched.
+    """
+    _DONE = object()
+
+    def __init__(self, fetch: Callable, postprocess: Callable,
+                 download_workers: int, postprocess_workers: int, queue_size: Optional[int] = None,
+                 host_of: Optional[Callable[..., Optional[str]]] = None,
+                 size_of: Optional[Callable[[tuple], int]] = None,
+                 per_host_limit: Optional[int] = None, slow_bytes_per_second: Optional[float] = None):
+        self.fetch = fetch
+        self.postprocess = postprocess
+        self.host_of = host_of
+        self.size_of = size_of
+        self.download_stats = StageStats('download', download_workers)
+        self.postprocess_stats = StageStats('postprocess', postprocess_workers)
+        self.queue_size = queue_size or postprocess_workers
+        self.global_limiter = AdaptiveLimiter(download_workers)
+        self.per_host_limit = per_host_limit or download_workers
+        self.host_limiters: Dict[str, AdaptiveLimiter] = {}
+        self.slow_bytes_per_second = slow_bytes_per_second
+        self.scheduler_stats = SchedulerStats()
+        self.wall_seconds = 0.0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.retry_tasks: set = set()
+        self.flush: Optional[asyncio.Event] = None
+
+    def _host_limiter(self, host: str) -> AdaptiveLimiter:
+        if host not in self.host_limiters:
+            self.host_limiters[host] = AdaptiveLimiter(self.per_host_limit)
+        return self.host_limiters[host]
+
+    async def _produce(self, jobs: Iterator[tuple], job_queue: asyncio.Queue, executor: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await loop.run_in_executor(executor, next, jobs, self._DONE)
+            if job is self._DONE:
+                return
+            await job_queue.put(job)
+
+    async def _requeue(self, job: tuple, delay: float, job_queue: asyncio.Queue) -> None:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.flush.wait(), delay)
+        await job_queue.put(job)
+
+    def _retry(self, job: tuple, delay: float, job_queue: asyncio.Queue) -> None:
+        task = asyncio.create_task(self._requeue(job, delay, job_queue))
+        self.retry_tasks.add(task)
+        task.add_done_callback(self.retry_tasks.discard)
+
+    async def _drain(self, job_queue: asyncio.Queue) -> None:
+        """Wait until every queued job, including delayed retries, has been fetched"""
+        while True:
+            await job_queue.join()
+            if not self.retry_tasks:
+                return
+            await asyncio.gather(*self.retry_tasks)
+
+    def flush_retries(self) -> None:
+        """Queue delayed retries now instead of after their backoff, e.g. when shutting down (thread-safe)"""
+        loop = self.loop
+        if loop is not None and self.flush is not None:
+            loop.call_soon_threadsafe(self.flush.set)
+
+    async def _fetch(self, job: tuple, executor: ThreadPoolExecutor, job_queue: asyncio.Queue) -> Optional[tuple]:
+        loop = asyncio.get_running_loop()
+        # host_of may extract the job, so it runs inside a global slot
+        await self.global_limiter.acquire()
+        limiters = [self.global_limiter]
+
+        item = None
+        nbytes = 0
+        outcome = FetchOutcome.FAILED
+        throttled = False
+        start = time.monotonic()
+        try:
+            if self.host_of:
+                host = None
+                # A failed lookup is raised again by fetch, which records or retries it
+                with contextlib.suppress(Exception):
+                    host = await loop.run_in_executor(executor, self.host_of, *job)
+                if host:
+                    # Wait for the host without holding a global slot, so a throttled host
+                    # cannot park every global slot and stall the other hosts
+                    limiters.remove(self.global_limiter)
+                    await self.global_limiter.release(FetchOutcome.SKIPPED)
+                    limiter = self._host_limiter(host)
+                    await limiter.acquire()
+                    limiters.append(limiter)
+                    await self.global_limiter.acquire()
+                    limiters.insert(0, self.global_limiter)
+                start = time.monotonic()
+            item = await loop.run_in_executor(executor, self.fetch, *job)
+            if item is None:
+                outcome = FetchOutcome.SKIPPED
+            else:
+                nbytes = self.size_of(item) if self.size_of else 0
+                elapsed = time.monotonic() - start
+                slow = (self.slow_bytes_per_second and nbytes and elapsed > 0
+                        and nbytes / elapsed < self.slow_bytes_per_second)
+                outcome = FetchOutcome.SLOW if slow else FetchOutcome.OK
+        except RetryLater as e:
+            throttled = is_throttling_error(e.__cause__ or e)
+            outcome = FetchOutcome.RETRIED
+            self._retry(job, e.delay, job_queue)
+        except Exception as e:
+            throttled = is_throttling_error(e)
+            outcome = FetchOutcome.THROTTLED if throttled else FetchOutcome.FAILED
+        finally:
+            self.download_stats.record(time.monotonic() - start)
+            self.scheduler_stats.record(outcome, nbytes, throttled)
+            for limiter in reversed(limiters):
+                await limiter.release(FetchOutcome.THROTTLED if throttled else outcome)
+        return item
+
+    async def _download_worker(self, job_queue: asyncio.Queue, results: asyncio.Queue,
+                               executor: ThreadPoolExecutor) -> None:
+        while True:
+            job = await job_queue.get()
+            try:
+                if job is self._DONE:
+                    return
+                item = await self._fetch(job, executor, job_queue)
+                if item is not None:
+                    await results.put(item)
+            finally:
+                job_queue.task_done()
+
+    async def _postprocess_worker(self, results: asyncio.Queue, executor: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await results.get()
+            if item is self._DONE:
+                return
+            start = time.monotonic()
+            await loop.run_in_executor(executor, self.postprocess, *item)
+            self.postprocess_stats.record(time.monotonic() - start)
+
+    async def _run(self, jobs: Iterator[tuple]) -> None:
+        job_queue: asyncio.Queue = asyncio.Queue(maxsize=self.download_stats.workers * 2)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.loop = asyncio.get_running_loop()
+        self.flush = asyncio.Event()
+        with ThreadPoolExecutor(max_workers=1) as producer_executor, \
+                ThreadPoolExecutor(max_workers=self.download_stats.workers) as fetch_executor, \
+                ThreadPoolExecutor(max_workers=self.postprocess_stats.workers) as postprocess_executor:
+            producer = asyncio.create_task(self._produce(jobs, job_queue, producer_executor))
+            downloaders = [asyncio.create_task(self._download_worker(job_queue, results, fetch_executor))
+                           for _ in range(self.download_stats.workers)]
+            postprocessors = [asyncio.create_task(self._postprocess_worker(results, postprocess_executor))
+                              for _ in range(self.postprocess_stats.workers)]
+            try:
+                await producer
+                await self._drain(job_queue)
+            finally:
+                for _ in downloaders:
+                    await job_queue.put(self._DONE)
+                await asyncio.gather(*downloaders)
+                for _ in postprocessors:
+                    await results.put(self._DONE)
+                await asyncio.gather(*postprocessors)
+
+    def run(self, jobs: Iterable[tuple]) -> None:
+        """Run every job through both stages and wait for completion
+
+        Jobs are pulled lazily, so a generator can feed the pipeline while it runs.
+        """
+        if self.download_stats.workers < 1:
+            return
+        self.scheduler_stats = SchedulerStats()
+        start = time.monotonic()
+        try:
+            asyncio.run(self._run(iter(jobs)))
+        finally:
+            self.loop = None
+            self.wall_seconds = time.monotonic() - start
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values (0.0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+class Metrics:
+    """Per-item stage timings, bytes and retries with JSON and Prometheus export (thread-safe)
+
+    Each job records its items in JobResults.metrics under their item_key; the
+    Downloader's instance collects the finished records of every job for export.
+    Finished records are added to running totals, and only the last `window` of
+    them are kept for the percentiles and the JSON export, so a long-running
+    daemon does not grow with every item it ever downloaded. Stages are 'extract',
+    'fetch', 'postprocess' and one entry per yt-dlp postprocessor (FinalizeMedia, Merger, ...).
+    """
+    # Shared by all instances: pooled YoutubeDL objects call the same hook for every job
+    local = threading.local()
+
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.window = window
+        self.items: Dict[str, dict] = {}  # records still being filled in
+        self.finished: Dict[str, dict] = collections.OrderedDict()  # the last `window` finished records
+        self.stages: Dict[str, List[float]] = {}  # stage: [count, total seconds] of all finished records
+        self.statuses: Dict[str, int] = collections.Counter()
+        self.audio_modes: Dict[str, int] = collections.Counter()
+        self.bytes = 0
+        self.retries = 0
+
+    def _item(self, key: str) -> dict:
+        item = self.items.get(key)
+        if item is None:
+            item = self.items[key] = {'stages': {}, 'bytes': 0, 'retries': 0, 'status': None, 'audio': None}
+        return item
+
+    def add_time(self, key: str, stage: str, seconds: float) -> None:
+        """Add time spent by an item in a stage"""
+        with self.lock:
+            stages = self._item(key)['stages']
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def update(self, key: str, **fields) -> None:
+        """Set per-item fields such as bytes or status"""
+        with self.lock:
+            self._item(key).update(fields)
+
+    def add_retry(self, key: str) -> None:
+        """Count one retry for an item"""
+        with self.lock:
+            self._item(key)['retries'] += 1
+
+    def record(self, key: str) -> dict:
+        """Copy of an item's record"""
+        with self.lock:
+            return copy.deepcopy(self._item(key))
+
+    def add_item(self, key: str, record: dict) -> None:
+        """Add the finished record of an item, e.g. one taken from a job's metrics, to the totals"""
+        with self.lock:
+            for stage, seconds in record['stages'].items():
+                totals = self.stages.setdefault(stage, [0, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+            if record['status']:
+                self.statuses[record['status']] += 1
+            if record['audio']:
+                self.audio_modes[record['audio']] += 1
+            self.bytes += record['bytes']
+            self.retries += record['retries']
+            self.finished.pop(key, None)
+            self.finished[key] = record
+            while len(self.finished) > self.window:
+                self.finished.popitem(last=False)
+
+    @contextlib.contextmanager
+    def timed(self, key: str, stage: str):
+        """Time a with-block as a stage of an item; postprocessor hooks in it are attributed to the item"""
+        previous = getattr(Metrics.local, 'current', None)
+        Metrics.local.current = (self, key)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(key, stage, time.monotonic() - start)
+            Metrics.local.current = previous
+
+    @staticmethod
+    def postprocessor_hook(d: dict) -> None:
+        """yt-dlp postprocessor hook: time each postprocessor of the item in the current timed block"""
+        current = getattr(Metrics.local, 'current', None)
+        if current is None:
+            return
+        metrics, key = current
+        starts = Metrics.local.__dict__.setdefault('pp_starts', {})
+        if d['status'] == 'started':
+            starts[d['postprocessor']] = time.monotonic()
+        elif d['status'] == 'finished' and d['postprocessor'] in starts:
+            metrics.add_time(key, d['postprocessor'], time.monotonic() - starts.pop(d['postprocessor']))
+
+    def stage_summary(self) -> Dict[str, Tuple[int, float, float, float]]:
+        """Per stage: (count, p50 seconds, p95 seconds, total seconds)
+
+        Counts and totals cover every item; the percentiles cover the retained records.
+        """
+        with self.lock:
+            totals = {stage: list(counts) for stage, counts in self.stages.items()}
+            samples: Dict[str, List[float]] = {}
+            for item in self.finished.values():
+                for stage, seconds in item['stages'].items():
+                    samples.setdefault(stage, []).append(seconds)
+            for item in self.items.values():
+                for stage, seconds in item['stages'].items():
+                    samples.setdefault(stage, []).append(seconds)
+                    counts = totals.setdefault(stage, [0, 0.0])
+                    counts[0] += 1
+                    counts[1] += seconds
+        return {
+            stage: (int(count), percentile(samples.get(stage, []), 0.5), percentile(samples.get(stage, []), 0.95), total)
+            for stage, (count, total) in totals.items()
+        }
+
+    def totals(self) -> Tuple[Dict[str, int], Dict[str, int], int, int]:
+        """Items by status, items by audio mode, bytes and retries of every item"""
+        with self.lock:
+            statuses = collections.Counter(self.statuses)
+            modes = collections.Counter(self.audio_modes)
+            nbytes, retries = self.bytes, self.retries
+            for item in self.items.values():
+                if item['status']:
+                    statuses[item['status']] += 1
+                if item['audio']:
+                    modes[item['audio']] += 1
+                nbytes += item['bytes']
+                retries += item['retries']
+        return statuses, modes, nbytes, retries
+
+    def to_json(self) -> dict:
+        """The retained per-item records plus the stage summary"""
+        with self.lock:
+            items = copy.deepcopy({**self.finished, **self.items})
+        return {
+            'items': items,
+            'stages': {
+                stage: {'count': count, 'p50': p50, 'p95': p95, 'total': total}
+                for stage, (count, p50, p95, total) in self.stage_summary().items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        statuses, modes, nbytes, retries = self.totals()
+        lines = [
+            '# HELP ytad_stage_seconds Time spent per item in each stage.',
+            '# TYPE ytad_stage_seconds summary',
+        ]
+        for stage, (count, p50, p95, total) in sorted(self.stage_summary().items()):
+            lines.append(f'ytad_stage_seconds{{stage="{stage}",quantile="0.5"}} {p50:.6f}')
+            lines.append(f'ytad_stage_seconds{{stage="{stage}",quantile="0.95"}} {p95:.6f}')
+            lines.append(f'ytad_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'ytad_stage_seconds_count{{stage="{stage}"}} {count}')
+
+        lines += ['# HELP ytad_items_total Finished items by status.', '# TYPE ytad_items_total counter']
+        lines += [f'ytad_items_total{{status="{status}"}} {count}' for status, count in sorted(statuses.items())]
+        lines += ['# HELP ytad_audio_items_total Finished items by audio handling (copy or transcode).',
+                  '# TYPE ytad_audio_items_total counter']
+        lines += [f'ytad_audio_items_total{{mode="{mode}"}} {count}' for mode, count in sorted(modes.items())]
+        lines += [
+            '# HELP ytad_bytes_total Bytes downloaded.',
+            '# TYPE ytad_bytes_total counter',
+            f'ytad_bytes_total {nbytes}',
+            '# HELP ytad_retries_total Download retries.',
+            '# TYPE ytad_retries_total counter',
+            f'ytad_retries_total {retries}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> http.server.ThreadingHTTPServer:
+        """Serve /metrics (Prometheus) and /metrics.json on a local port from a background thread"""
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = metrics.to_prometheus().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(metrics.to_json()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+class ProgressBoard:
+    """Aggregated download progress drawn by a single renderer thread
+
+    yt-dlp progress hooks only replace their item's entry in a dict (atomic under
+    the GIL, no lock and no console I/O). The renderer redraws a multi-line
+    dashboard at a fixed rate on a TTY, or prints a periodic one-line summary
+    when output is redirected. Status messages logged while it runs are printed
+    above the dashboard so the two never overwrite each other.
+    """
+    MAX_ROWS = 8
+
+    def __init__(self, translate: Callable[..., str], refresh_interval: float = 0.25,
+                 summary_interval: float = 10.0):
+        self.t = translate
+        self.refresh_interval = refresh_interval
+        self.summary_interval = summary_interval
+        self.items: Dict[str, tuple] = {}
+        self.converting: Dict[str, str] = {}
+        self.finished_bytes = 0
+        self.lock = threading.Lock()
+        self.messages: collections.deque = collections.deque()
+        self.stream: TextIO = sys.stdout
+        self.is_tty = False
+        self.drawn_lines = 0
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def hook(self, d: dict) -> None:
+        """yt-dlp progress hook: record the latest counters for one stream"""
+        key = d.get('filename') or d.get('tmpfilename') or ''
+        if d['status'] == 'downloading':
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            title = (d.get('info_dict') or {}).get('title') or os.path.basename(key)
+            self.items[key] = (title, d.get('downloaded_bytes') or 0, total, d.get('speed') or 0.0)
+        else:
+            entry = self.items.pop(key, None)
+            if d['status'] == 'finished':
+                nbytes = d.get('total_bytes') or d.get('downloaded_bytes') or (entry[1] if entry else 0)
+                with self.lock:
+                    self.finished_bytes += nbytes
+
+    def set_converting(self, key: str, title: Optional[str]) -> None:
+        """Show an item as being postprocessed, or clear it with title=None"""
+        if title is None:
+            self.converting.pop(key, None)
+        else:
+            self.converting[key] = title
+
+    def log(self, message: str) -> None:
+        """Print a status line, above the dashboard while it is running"""
+        if self.thread is not None and self.is_tty:
+            self.messages.append(message)
+        else:
+            print(message, file=self.stream if self.thread is not None else sys.stdout, flush=True)
+
+    def summary(self) -> str:
+        """One-line aggregate: active streams, speed, bytes done and ETA"""
+        items = list(self.items.values())
+        speed = sum(item[3] for item in items)
+        remaining = sum(max(0, item[2] - item[1]) for item in items if item[2])
+        done = self.finished_bytes + sum(item[1] for item in items)
+        eta = yt_dlp.utils.formatSeconds(remaining / speed) if speed and remaining else '--:--'
+        return self.t('dashboard_summary', len(items), len(self.converting),
+                      yt_dlp.utils.format_bytes(speed), yt_dlp.utils.format_bytes(done), eta)
+
+    def render(self) -> List[str]:
+        """Dashboard lines: the summary plus one row per active stream"""
+        lines = [f"↘️ {self.summary()}"]
+        for title, downloaded, total, speed in list(self.items.values())[:self.MAX_ROWS]:
+            percent = f"{downloaded * 100 / total:5.1f}%" if total else "  ?  "
+            lines.append(f"   [{percent}] {title[:48]:<48} {yt_dlp.utils.format_bytes(speed):>11}/s")
+        for title in list(self.converting.values())[:self.MAX_ROWS]:
+            lines.append(f"   [ ffmpeg] {title[:48]}")
+        return lines
+
+    def _draw(self) -> None:
+        out = []
+        if self.drawn_lines:
+            out.append(f"\x1b[{self.drawn_lines}F\x1b[J")
+        while self.messages:
+            out.append(self.messages.popleft() + "\n")
+        lines = self.render()
+        out.append("\n".join(lines) + "\n")
+        self.drawn_lines = len(lines)
+        self.stream.write("".join(out))
+        self.stream.flush()
+
+    def _run(self) -> None:
+        interval = self.refresh_interval if self.is_tty else self.summary_interval
+        while not self.stop_event.wait(interval):
+            if self.is_tty:
+                self._draw()
+            elif self.items or self.converting:
+                print(f"↘️ {self.summary()}", file=self.stream, flush=True)
+
+    def start(self) -> None:
+        """Start the renderer thread"""
+        if self.thread is not None:
+            return
+        self.stream = sys.stdout
+        self.is_tty = self.stream.isatty()
+        self.drawn_lines = 0
+        self.finished_bytes = 0
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the renderer and remove the dashboard, keeping pending messages"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        if self.is_tty:
+            self.items.clear()
+            self.converting.clear()
+            self._draw()
+            self.stream.write(f"\x1b[{self.drawn_lines}F\x1b[J")
+            self.stream.flush()
+        self.thread = None
+        self.drawn_lines = 0
+
+    @contextlib.contextmanager
+    def running(self):
+        """Run the renderer for the duration of a with-block"""
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
+
+    def debug(self, message: str) -> None:
+        """yt-dlp logger interface: screen output is covered by the dashboard"""
+
+    def info(self, message: str) -> None:
+        """yt-dlp logger interface: screen output is covered by the dashboard"""
+
+    def warning(self, message: str) -> None:
+        """yt-dlp logger interface: show warnings as status lines"""
+        self.log(f"⚠️ {message}")
+
+    def error(self, message: str) -> None:
+        """yt-dlp logger interface: errors are reported through the failed item's result"""
+
 class Downloader:
-    def __init__(self, language: str = 'en'):
+    # Size estimates for items whose formats report no filesize
+    TYPICAL_KBPS = {DownloadFormat.AUDIO: 320, DownloadFormat.VIDEO: 8000}
+    TYPICAL_ITEM_BYTES = 64 * 1024 * 1024
+    # Download archives whose SQLite connection is kept open
+    MAX_OPEN_ARCHIVES = 16
+
+    def __init__(self, language: str = 'en', info_cache: Optional[InfoCache] = None,
+                 cache_dir: Optional[str] = None):
         self.language = language
         self.translations = LANGUAGES.get(language, LANGUAGES['en'])
         self.lock = threading.Lock()
-        self.success_count = 0
-        self.failed_count = 0
+        self.ydl_pool = YoutubeDLPool()
+        self.info_cache = info_cache or InfoCache(ydl_pool=self.ydl_pool)
+        self.result_stream: Optional[TextIO] = None
+        self.progress_listeners: List[Callable[[dict], None]] = []
+        self.board = ProgressBoard(self.t)
+        self.metrics = Metrics()
+        self.retry_policy = RetryPolicy()
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.thumbnail_cache = ThumbnailCache(os.path.join(self.cache_dir, 'thumbnails'))
         self.max_workers = 5  
-        self.download_format = DownloadFormat.AUDIO
-        self.audio_quality = AudioQuality.BEST
-        self.video_quality = VideoQuality.HD
+        self.postprocess_workers = os.cpu_count() or 1
+        self.max_per_host: Optional[int] = None
+        self.segment_connections = 4
+        self.stream_merge_enabled = True
+        self.segment_min_bytes = 10 * 1024 * 1024
+        self.slow_bytes_per_second: Optional[float] = None
+        self.disk_gate = DiskSpaceGate()
+        self.scratch_dir: Optional[str] = None
+        self.dedupe_enabled = True
+        self.content_index: Optional[ContentIndex] = None
+        # Most recently used last; the least recently used stores are closed past MAX_OPEN_ARCHIVES
+        self.archives: Dict[str, JobStore] = collections.OrderedDict()
+        self.options = JobOptions()
         self.ffmpeg_path = shutil.which('ffmpeg')
         if not self.ffmpeg_path:
             print(f"⚠️ {self.t('ffmpeg_missing')}")
@@ -142,41 +2442,28 @@ class Downloader:
         filename = re.sub(r'[<>:"/\\|?*\x00-\x1F]', '', filename)
         return filename.strip()[:200]
 
-    def get_available_formats(self, url: str) -> Optional[List[Tuple[str, str, str, int]]]:
-        """Get available formats for a YouTube video"""
+    def choose_format(self, info: dict, options: JobOptions) -> Optional[FormatChoice]:
+        """The format choice the download will use for an info dict"""
+        return FormatIndex.from_info(info).select(options.target, options.format_cost)
+
+    def get_available_formats(self, url: str, options: Optional[JobOptions] = None) -> Optional[List[FormatChoice]]:
+        """Get the ranked format choices for a YouTube video; the first is the one that will be downloaded"""
         try:
             print(f"⏳ {self.t('checking_formats')}")
-            ydl_opts = {'quiet': True, 'no_warnings': True, 'extract_flat': False}
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    return None
-                
-                formats = []
-                for f in info.get('formats', []):
-                    if self.download_format == DownloadFormat.AUDIO and f.get('acodec') != 'none':
-                        formats.append(
-                            f.get('format_id', 'unknown'),
-                            f.get('ext', 'unknown'),
-                            f"{int(f.get('abr', 0))}kbps" if f.get('abr') else self.t('best_quality'),
-                            int(f.get('filesize', f.get('filesize_approx', 0)) // (1024 * 1024)
-                        ))
-                    elif self.download_format == DownloadFormat.VIDEO and f.get('vcodec') != 'none' and f.get('acodec') != 'none':
-                        formats.append(
-                            f.get('format_id', 'unknown'),
-                            f.get('ext', 'unknown'),
-                            f"{f.get('height', '?')}p",
-                            int(f.get('filesize', f.get('filesize_approx', 0)) // (1024 * 1024)
-                        ))
-                
-                
-                formats = list({f[0]: f for f in formats}.values())  
-                if self.download_format == DownloadFormat.AUDIO:
-                    formats.sort(key=lambda x: int(x[2].replace('kbps', '')) if 'kbps' in x[2] else 0, reverse=True)
-                else:
-                    formats.sort(key=lambda x: int(x[2].replace('p', '')) if x[2].endswith('p') else 0, reverse=True)
-                
-                return formats[:10]  
+            info = self.info_cache.get(url)
+            if not info:
+                return None
+
+            options = options or self.options
+            choices = []
+            seen = set()
+            for choice in FormatIndex.from_info(info).rank(options.target, options.format_cost):
+                # One line per video stream (its best audio pairing), or per audio stream
+                key = (choice.video or choice.audio).format_id
+                if key not in seen:
+                    seen.add(key)
+                    choices.append(choice)
+            return choices[:10]
         except Exception as e:
             print(f"❌ Error getting available formats: {e}")
             return None
@@ -200,7 +2487,7 @@ class Downloader:
 
     def select_quality(self) -> None:
         """Interactive quality selection based on format"""
-        if self.download_format == DownloadFormat.AUDIO:
+        if self.options.download_format == DownloadFormat.AUDIO:
             print(f"\n{self.t('select_quality')} (Audio)")
             for i, quality in enumerate(AudioQuality, 1):
                 print(f"{i}. {quality.name.ljust(8)} - {quality.value}kbps")
@@ -209,12 +2496,12 @@ class Downloader:
                 try:
                     choice = input(f"\n{self.t('select_quality')} (1-6, default=1): ").strip()
                     if not choice:
-                        self.audio_quality = AudioQuality.BEST
+                        self.options = self.options._replace(audio_quality=AudioQuality.BEST)
                         return
                     
                     choice_idx = int(choice) - 1
                     if 0 <= choice_idx < len(AudioQuality):
-                        self.audio_quality = list(AudioQuality)[choice_idx]
+                        self.options = self.options._replace(audio_quality=list(AudioQuality)[choice_idx])
                         return
                     print("Invalid choice. Please select 1-6.")
                 except ValueError:
@@ -228,177 +2515,658 @@ class Downloader:
                 try:
                     choice = input(f"\n{self.t('select_quality')} (1-6, default=3): ").strip()
                     if not choice:
-                        self.video_quality = VideoQuality.HD
+                        self.options = self.options._replace(video_quality=VideoQuality.HD)
                         return
                     
                     choice_idx = int(choice) - 1
                     if 0 <= choice_idx < len(VideoQuality):
-                        self.video_quality = list(VideoQuality)[choice_idx]
+                        self.options = self.options._replace(video_quality=list(VideoQuality)[choice_idx])
                         return
                     print("Invalid choice. Please select 1-6.")
                 except ValueError:
                     print("Please enter a number.")
 
-    def download_single_file(self, url: str, output_dir: str, 
-                           custom_filename: Optional[str], metadata: Optional[dict], 
-                           item_num: Optional[int] = None) -> Tuple[bool, Optional[str]]:
-        """Download a single file (audio or video) (thread-safe)"""
+    def open_archive(self, output_dir: str) -> JobStore:
+        """Get the download archive for an output directory (thread-safe)
+
+        Only the MAX_OPEN_ARCHIVES most recently used archives keep their SQLite
+        connection open, so a long-running daemon does not hold one per directory
+        it ever wrote to.
+        """
+        output_dir = os.path.abspath(output_dir)
+        with self.lock:
+            archive = self.archives.pop(output_dir, None)
+            if archive is None:
+                os.makedirs(output_dir, exist_ok=True)
+                archive = JobStore(os.path.join(output_dir, JobStore.FILENAME))
+            self.archives[output_dir] = archive
+            while len(self.archives) > self.MAX_OPEN_ARCHIVES:
+                # A worker still holding the evicted store reconnects on its next use
+                self.archives.popitem(last=False)[1].close()
+            return archive
+
+    def open_content_index(self) -> ContentIndex:
+        """Get the content index shared by all output directories (thread-safe)"""
+        with self.lock:
+            if self.content_index is None:
+                self.content_index = ContentIndex(os.path.join(self.cache_dir, ContentIndex.FILENAME))
+            return self.content_index
+
+    def content_key(self, info: dict, options: JobOptions) -> Tuple[str, str, str, str]:
+        """Content index key for a video: its extractor plus the archive key"""
+        return (info.get('extractor_key') or '', *self.archive_key(info, options))
+
+    def archive_key(self, info: dict, options: JobOptions) -> Tuple[str, str, str]:
+        """Archive key for a video (info dict or flat playlist entry) in a job's format and quality"""
+        video_id = self.sanitize_filename(info.get('id') or info.get('title') or '')
+        download_format = options.download_format.value
+        if options.download_format == DownloadFormat.AUDIO:
+            quality = options.audio_quality.value
+            if options.audio_codec != AudioCodec.MP3:
+                download_format = f'{download_format}-{options.audio_codec.value}'
+        else:
+            quality = options.video_quality.value
+        return (video_id, download_format, quality)
+
+    def build_ydl_opts(self, output_dir: str, metadata: Optional[dict], options: JobOptions) -> Tuple[dict, dict]:
+        """Build yt-dlp options for the fetch stage and the postprocessing stage"""
+        fetch_opts = {
+            'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
+            'quiet': True,
+            'progress_hooks': [self.progress_hook],
+            'noprogress': True,
+            'logger': self.board,
+            'postprocessor_hooks': [Metrics.postprocessor_hook],
+            'ffmpeg_location': self.ffmpeg_path or '',
+            'segment_connections': self.segment_connections,
+            'segment_min_bytes': self.segment_min_bytes,
+            'concurrent_fragment_downloads': self.segment_connections,
+        }
+        postprocess_opts = {
+            'quiet': True,
+            'logger': self.board,
+            'postprocessor_hooks': [Metrics.postprocessor_hook],
+            'ffmpeg_location': self.ffmpeg_path or '',
+        }
+
+        # Options for FinalizeMediaPP, which replaces FFmpegExtractAudio, EmbedThumbnail and FFmpegMetadata
+        finalize = {'metadata': metadata}
+        # Fallback selectors for extractors that report no formats; otherwise fetch_file
+        # replaces them with the format engine's choice
+        if options.download_format == DownloadFormat.AUDIO:
+            fetch_opts['format'] = {
+                AudioCodec.M4A: 'bestaudio[ext=m4a]/bestaudio/best',
+                AudioCodec.OPUS: 'bestaudio[acodec=opus]/bestaudio/best',
+            }.get(options.audio_codec, 'bestaudio/best')
+            finalize['codec'] = options.audio_codec.value
+            finalize['quality'] = options.audio_quality.value
+        else:
+            height = options.video_quality.value
+            fetch_opts['format'] = f'bestvideo[height<={height}]+bestaudio/best[height<={height}]'
+            fetch_opts['format_sort'] = ['vcodec:h264', 'acodec:aac']
+            fetch_opts['merge_output_format'] = 'mp4'
+        postprocess_opts['finalize'] = finalize
+
+        return fetch_opts, postprocess_opts
+
+    def record_result(self, results: JobResults, url: str, title: str, path: Optional[str] = None,
+                      error: Optional[Exception] = None, skipped: bool = False,
+                      video_id: Optional[str] = None, started: Optional[float] = None,
+                      reused: Optional[CloneMethod] = None, item_num: Optional[int] = None) -> ItemResult:
+        """Add a finished item to its job's results, report it, and emit a JSON-lines record in batch mode (thread-safe)
+
+        The item's metrics record is also handed to the process-wide metrics.
+        """
+        if skipped:
+            status = 'skipped'
+        elif path and error is None:
+            status = 'ok'
+        else:
+            status = 'failed'
+
+        item_key = results.item_key(url, item_num)
+        extraction_seconds = self.info_cache.extraction_seconds.get(url)
+        if extraction_seconds is not None:
+            results.metrics.add_time(item_key, 'extract', extraction_seconds)
+        results.metrics.update(item_key, status=status)
+        self.metrics.add_item(f'{results.job_id}:{item_key}', results.metrics.record(item_key))
+
+        item = ItemResult(
+            url=url,
+            id=video_id,
+            title=title,
+            status=status,
+            path=os.path.abspath(path) if path else None,
+            bytes=os.path.getsize(path) if path and os.path.exists(path) else None,
+            seconds=time.monotonic() - started if started is not None else None,
+            error_class=type(error).__name__ if error is not None else None,
+            error=str(error) if error is not None else None,
+            attempts=results.attempts[item_key] + 1,
+            failure=classify_error(error).value if error is not None else None,
+            reused=reused.value if reused else None,
+        )
+        results.add(item, playlist_entry=item_num is not None)
+
+        if status == 'ok':
+            self.board.log(f"✅ {title} {self.t('download_complete')}")
+        elif status == 'failed':
+            if error is None or isinstance(error, yt_dlp.utils.DownloadError):
+                self.board.log(f"❌ {title} {self.t('download_failed')}: {str(error or '')}")
+            else:
+                self.board.log(f"❌ {title} {self.t('error')}: {str(error)}")
+        if status != 'skipped' and item_num is not None:
+            self.board.log(f"📋 {self.t('discovery_progress', results.playlist_done, results.playlist_entries)}")
+
+        if self.result_stream is not None:
+            with self.lock:
+                self.result_stream.write(json.dumps(item._asdict(), ensure_ascii=False) + '\n')
+                self.result_stream.flush()
+        return item
+
+    def release_item(self, item: ItemResult) -> None:
+        """JobResults listener: drop the cached info and extraction counters of a recorded item"""
+        self.info_cache.discard(item.url)
+
+    def fetch_file(self, url: str, output_dir: str,
+                   custom_filename: Optional[str], metadata: Optional[dict],
+                   item_num: Optional[int], results: JobResults,
+                   raise_errors: bool = False) -> Optional[FetchedItem]:
+        """Fetch stage: download (and merge) the media without postprocessing (thread-safe)
+
+        Returns the item for postprocess_file, or None if the item failed or was
+        already downloaded. Failures are recorded in results; with raise_errors they
+        are also re-raised so the scheduler can react to throttling, and a transient
+        failure with retries left raises RetryLater instead of being recorded.
+        """
+        title = url
+        stem = None
+        reservation = None
+        claim = None
+        started = time.monotonic()
+        options = results.options
         try:
             os.makedirs(output_dir, exist_ok=True)
-            
-            ydl_opts = {
-                'outtmpl': os.path.join(output_dir, '%(title)s.%(ext)s'),
-                'quiet': True,
-                'progress_hooks': [self.progress_hook],
-                'writethumbnail': True,
-                'noprogress': True,
-            }
-
-            if self.download_format == DownloadFormat.AUDIO:
-                ydl_opts['format'] = 'bestaudio/best'
-                ydl_opts['postprocessors'] = [
-                    {
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': self.audio_quality.value,
-                    },
-                    {'key': 'EmbedThumbnail'},
-                    {'key': 'FFmpegMetadata'},
-                ]
-                ydl_opts['extractaudio'] = True
-                ydl_opts['prefer_ffmpeg'] = True
-                ydl_opts['ffmpeg_location'] = self.ffmpeg_path or ''
+            work_dir = self.work_dir(output_dir)
+            fetch_opts, postprocess_opts = self.build_ydl_opts(output_dir, metadata, options)
+
+            info = self.info_cache.get(url)
+            if not info:
+                raise yt_dlp.utils.DownloadError(f"no video information for {url}")
+
+            title = info.get('title', 'Unknown Title')
+            sanitized_title = self.sanitize_filename(title)
+            video_id = self.sanitize_filename(info.get('id') or sanitized_title)
+
+            if custom_filename:
+                sanitized_custom = self.sanitize_filename(custom_filename)
+                if item_num is not None:
+                    stem = os.path.join(work_dir, f'{sanitized_custom}_{item_num:02d}')
+                else:
+                    stem = os.path.join(work_dir, sanitized_custom)
             else:
-                
-                ydl_opts['format'] = f'bestvideo[height<={self.video_quality.value}]+bestaudio/best[height<={self.video_quality.value}]'
-                ydl_opts['merge_output_format'] = 'mp4'
-                ydl_opts['postprocessors'] = [
-                    {'key': 'EmbedThumbnail'},
-                    {'key': 'FFmpegMetadata'},
-                ]
-                
-                ydl_opts['format_sort'] = ['vcodec:h264', 'acodec:aac']
-                ydl_opts['merge_output_format'] = 'mp4'
-
-            if metadata:
-                ydl_opts['postprocessor_args'] = [
-                    '-metadata', f'title={metadata.get("title", "")}',
-                    '-metadata', f'artist={metadata.get("artist", "")}',
-                    '-metadata', f'album={metadata.get("album", "")}',
-                    '-metadata', f'date={metadata.get("date", "")}',
-                ]
-
-            with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    return (False, None)
-                
-                title = info.get('title', 'Unknown Title')
-                sanitized_title = self.sanitize_filename(title)
-                
-                if custom_filename:
-                    sanitized_custom = self.sanitize_filename(custom_filename)
-                    if item_num is not None:
-                        ydl_opts['outtmpl'] = os.path.join(output_dir, f'{sanitized_custom}_{item_num:02d}.%(ext)s')
-                    else:
-                        ydl_opts['outtmpl'] = os.path.join(output_dir, f'{sanitized_custom}.%(ext)s')
+                if item_num is not None:
+                    stem = os.path.join(work_dir, f'{sanitized_title}_{item_num:02d}_{video_id}')
                 else:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    if item_num is not None:
-                        ydl_opts['outtmpl'] = os.path.join(output_dir, f'{sanitized_title}_{item_num:02d}_{timestamp}.%(ext)s')
-                    else:
-                        ydl_opts['outtmpl'] = os.path.join(output_dir, f'{sanitized_title}_{timestamp}.%(ext)s')
+                    stem = os.path.join(work_dir, f'{sanitized_title}_{video_id}')
+            fetch_opts['outtmpl'] = stem + '.%(ext)s'
+            choice = self.choose_format(info, options)
+            if choice:
+                fetch_opts['format'] = choice.spec
+
+            archive = self.open_archive(output_dir)
+            key = self.archive_key(info, options)
+            previous = archive.get(key)
+            if previous and archive.is_complete(key):
+                self.record_result(results, url, title, path=previous[1], skipped=True,
+                                   video_id=info.get('id'), started=started, item_num=item_num)
+                return None
+            if previous and previous[1] and os.path.splitext(previous[1])[0] != stem:
+                JobStore.cleanup_partials(os.path.splitext(previous[1])[0])
+            if self.dedupe_enabled and not metadata:
+                entry, claim = self.open_content_index().claim(self.content_key(info, options))
+                if entry:
+                    self.reuse_content(entry, url, title, info, stem, output_dir, results, started, item_num)
+                    return None
+            reservation = self.reserve_disk_space(info, choice, results, stem, output_dir)
+            archive.mark(key, JobStatus.IN_PROGRESS, path=stem)
+
+            self.board.log(f"📥 {self.t('download_start')} {title}")
+
+            try:
+                ydl = self.ydl_pool.get(fetch_opts)
+                with results.metrics.timed(results.item_key(url, item_num), 'fetch'):
+                    downloaded = None
+                    if self.can_stream_merge(choice, options):
+                        downloaded = self.stream_merge(ydl, info, stem)
+                    if downloaded is None:
+                        result = ydl.process_ie_result(info, download=True)
+            except Exception as e:
+                archive.mark(key, JobStatus.FAILED, error=str(e))
+                raise
+
+            if downloaded is None:
+                requested = result.pop('requested_downloads', None) or [{}]
+                downloaded = {**result, **requested[0]}
+                downloaded.pop('__postprocessors', None)
+                if not downloaded.get('filepath'):
+                    downloaded['filepath'] = ydl.prepare_filename(downloaded)
+            return FetchedItem(url, title, downloaded, postprocess_opts, output_dir, results, started,
+                               reservation, claim, item_num)
 
-            with self.lock:
-                print(f"\n📥 {self.t('download_start')} {title}")
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                info = ydl.extract_info(url, download=False)
-                filename = ydl.prepare_filename(info)
-                if self.download_format == DownloadFormat.AUDIO:
-                    final_filename = os.path.splitext(filename)[0] + '.mp3'
-                else:
-                    final_filename = os.path.splitext(filename)[0] + '.mp4'
-            
-            with self.lock:
-                print(f"✅ {title} {self.t('download_complete')}")
-                self.success_count += 1
-            return (True, final_filename)
-        
-        except yt_dlp.utils.DownloadError as e:
-            with self.lock:
-                print(f"❌ {title} {self.t('download_failed')}: {str(e)}")
-                self.failed_count += 1
-            return (False, None)
         except Exception as e:
-            with self.lock:
-                print(f"❌ {title} {self.t('error')}: {str(e)}")
-                self.failed_count += 1
+            if reservation:
+                reservation.release()
+            if claim:
+                self.content_index.release(self.content_key(info, options), claim)
+            delay = self.retry_delay(results, url, e, item_num) if raise_errors else None
+            if delay is not None:
+                self.board.log(f"🔁 {self.t('retry_scheduled', title, delay, e)}")
+                if stem and 'HTTP Error 416' in str(e):
+                    JobStore.cleanup_partials(stem)
+                raise RetryLater(delay) from e
+            self.record_result(results, url, title, error=e, started=started, item_num=item_num)
+            if raise_errors:
+                raise
+            return None
+
+    def reuse_content(self, entry: ContentEntry, url: str, title: str, info: dict, stem: str,
+                      output_dir: str, results: JobResults, started: float, item_num: Optional[int] = None) -> str:
+        """Serve an item by cloning an existing file with the same content into the output directory"""
+        target = os.path.join(output_dir, os.path.basename(stem) + os.path.splitext(entry.path)[1])
+        method = ContentIndex.clone(entry.path, target)
+        self.content_index.add(self.content_key(info, results.options), target, entry.seconds)
+        self.open_archive(output_dir).mark(self.archive_key(info, results.options), JobStatus.COMPLETED, path=target)
+        results.note_reused(entry)
+        results.metrics.update(results.item_key(url, item_num), bytes=entry.size)
+        self.board.log(f"🔗 {self.t('content_reused', title, method.value, entry.path)}")
+        self.record_result(results, url, title, path=target, video_id=info.get('id'), started=started,
+                           reused=method, item_num=item_num)
+        return target
+
+    def work_dir(self, output_dir: str) -> str:
+        """Directory for an item's partial and intermediate files: the output
+        directory itself, or a folder of it in the scratch directory"""
+        if not self.scratch_dir:
+            return output_dir
+        digest = hashlib.sha1(os.path.abspath(output_dir).encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(self.scratch_dir, digest)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def estimate_size(self, info: dict, choice: Optional[FormatChoice], options: JobOptions) -> Tuple[int, int]:
+        """Estimated (downloaded, output) bytes of an item
+
+        Uses the filesize/filesize_approx of the chosen formats, falling back to the
+        duration at a typical bitrate. Transcoded audio is sized at its target bitrate.
+        """
+        duration = info.get('duration') or 0
+        fetched = (choice.filesize if choice else 0) or info.get('filesize') or info.get('filesize_approx') or 0
+        if not fetched:
+            fetched = duration * self.TYPICAL_KBPS[options.download_format] * 125 or self.TYPICAL_ITEM_BYTES
+        output = fetched
+        if options.download_format == DownloadFormat.AUDIO:
+            output = max(output, duration * int(options.audio_quality.value) * 125)
+        return int(fetched), int(output)
+
+    def reserve_disk_space(self, info: dict, choice: Optional[FormatChoice], results: JobResults,
+                           stem: str, output_dir: str) -> DiskReservation:
+        """Wait until there is room for an item and reserve it (thread-safe)
+
+        The work directory holds the download and the finished file side by side;
+        with a scratch directory, the output directory also needs room for the
+        finished file.
+        """
+        fetched, output = self.estimate_size(info, choice, results.options)
+        work_dir = os.path.dirname(stem)
+        needs = {work_dir: fetched + output}
+        stems = [stem]
+        scratch = []
+        if os.path.abspath(work_dir) != os.path.abspath(output_dir):
+            needs[output_dir] = output
+            stems.append(os.path.join(output_dir, os.path.basename(stem)))
+            scratch.append(work_dir)
+
+        def on_wait(directory: str, nbytes: int, available: int) -> None:
+            results.note_disk_wait()
+            self.board.log(f"💾 {self.t('disk_wait', directory, nbytes / (1024 * 1024), available / (1024 * 1024))}")
+
+        return self.disk_gate.reserve(needs, stems, scratch, on_wait)
+
+    def retry_delay(self, results: JobResults, url: str, error: Exception,
+                    item_num: Optional[int] = None) -> Optional[float]:
+        """Backoff before retrying a failed fetch, or None if it should fail now
+
+        Only transient failures are retried, within the item's and the job's retry
+        budget. The cached info is dropped so the retry gets fresh media URLs.
+        """
+        if classify_error(error) != FailureKind.TRANSIENT:
+            return None
+        item_key = results.item_key(url, item_num)
+        retry = results.take_retry(item_key, self.retry_policy)
+        if retry is None:
+            return None
+        results.metrics.add_retry(item_key)
+        self.info_cache.expire(url)
+        return self.retry_policy.delay(retry)
+
+    def can_stream_merge(self, choice: Optional[FormatChoice], options: JobOptions) -> bool:
+        """True if a choice is a separate video and audio stream that can be fetched in parallel and merged by FinalizeMediaPP"""
+        return bool(
+            self.stream_merge_enabled and self.ffmpeg_path
+            and options.download_format == DownloadFormat.VIDEO
+            and choice and choice.video and choice.audio and choice.video != choice.audio
+        )
+
+    def stream_merge(self, ydl: yt_dlp.YoutubeDL, info: dict, stem: str) -> Optional[dict]:
+        """Download the video and audio streams in parallel, leaving the merge to FinalizeMediaPP (thread-safe)
+
+        yt-dlp downloads the streams one after the other and merges them into a
+        third file that the finalize pass then rewrites again. Here each stream gets
+        its own downloader (chunked or segmented as for any other download) and the
+        single finalize pass merges them and adds the tags and cover. Returns the
+        info dict for postprocess_file, or None to fall back to yt-dlp's download.
+        """
+        processed = ydl.process_ie_result(copy.deepcopy(info), download=False)
+        requested = processed.pop('requested_formats', None) or []
+        if len(requested) != 2:
+            return None
+        requested.sort(key=lambda f: f.get('vcodec') in (None, 'none'))
+
+        abort = threading.Event()
+        streams = []
+        for f in requested:
+            stream = {**processed, **f, '__abort': abort}
+            streams.append((f"{stem}.f{f['format_id']}.{f['ext']}", stream))
+
+        def fetch(path: str, stream: dict) -> None:
+            try:
+                if not ydl.dl(path, stream):
+                    raise yt_dlp.utils.DownloadError(f"unable to download format {stream['format_id']}")
+            except BaseException:
+                # Stop the other stream instead of finishing a download that is useless now
+                abort.set()
+                raise
+
+        with ThreadPoolExecutor(max_workers=len(streams)) as executor:
+            futures = [executor.submit(fetch, path, stream) for path, stream in streams]
+            concurrent.futures.wait(futures)
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise next((e for e in errors if not isinstance(e, yt_dlp.utils.DownloadCancelled)), errors[0])
+
+        processed.update({'filepath': stem + '.mp4', 'ext': 'mp4',
+                          '__streams_to_merge': [path for path, _ in streams]})
+        return processed
+
+    def postprocess_file(self, url: str, title: str, info: dict, postprocess_opts: dict,
+                         output_dir: str, results: JobResults, started: float,
+                         reservation: Optional[DiskReservation] = None,
+                         claim: Optional[threading.Event] = None,
+                         item_num: Optional[int] = None) -> Optional[str]:
+        """Postprocessing stage: run the FFmpeg postprocessors on a fetched file (thread-safe)"""
+        item_key = results.item_key(url, item_num)
+        archive = self.open_archive(output_dir)
+        key = self.archive_key(info, results.options)
+        content_key = self.content_key(info, results.options)
+        try:
+            stem = os.path.splitext(info['filepath'])[0]
+            finalize = postprocess_opts.get('finalize') or {}
+            ydl = self.ydl_pool.get({k: v for k, v in postprocess_opts.items() if k != 'finalize'})
+            self.board.set_converting(stem, title)
+            results.metrics.update(item_key, bytes=self.file_size(info))
+            finalizer = FinalizeMediaPP(ydl, self.thumbnail_cache, **finalize)
+            try:
+                with results.metrics.timed(item_key, 'postprocess'):
+                    info = ydl.run_pp(finalizer, info)
+            finally:
+                self.board.set_converting(stem, None)
+                if finalizer.thumbnail_hit is not None:
+                    results.note_thumbnail(finalizer.thumbnail_hit)
+            if os.path.dirname(os.path.abspath(info['filepath'])) != os.path.abspath(output_dir):
+                info['filepath'] = move_atomic(info['filepath'], output_dir)
+            archive.mark(key, JobStatus.COMPLETED, path=info['filepath'])
+            if claim:
+                self.content_index.add(content_key, info['filepath'], finalizer.cpu_seconds)
+            JobStore.cleanup_partials(stem)
+            mode = info.pop('__finalize_mode', None)
+            if mode:
+                results.metrics.update(item_key, audio=mode)
+                results.note_audio_mode(mode)
+
+            self.record_result(results, url, title, path=info['filepath'], video_id=info.get('id'),
+                               started=started, item_num=item_num)
+            return info['filepath']
+
+        except Exception as e:
+            archive.mark(key, JobStatus.FAILED, error=str(e))
+            self.record_result(results, url, title, error=e, video_id=info.get('id'), started=started,
+                               item_num=item_num)
+            return None
+        finally:
+            if reservation:
+                reservation.release()
+            if claim:
+                self.content_index.release(content_key, claim)
+
+    def download_single_file(self, url: str, output_dir: str, 
+                           custom_filename: Optional[str], metadata: Optional[dict], 
+                           item_num: Optional[int] = None,
+                           results: Optional[JobResults] = None) -> Tuple[bool, Optional[str]]:
+        """Download a single file (audio or video) (thread-safe)"""
+        results = results or JobResults(self.options)
+        info = self.info_cache.get(url)
+        if info and info.get('id'):
+            archive = self.open_archive(output_dir)
+            key = self.archive_key(info, results.options)
+            if archive.is_complete(key):
+                entry = archive.get(key)
+                self.board.log(f"⏭️ {self.t('already_downloaded')} {entry[1]}")
+                self.record_result(results, url, info.get('title', url), path=entry[1], skipped=True,
+                                   video_id=info['id'], item_num=item_num)
+                return (True, entry[1])
+
+        while True:
+            try:
+                item = self.fetch_file(url, output_dir, custom_filename, metadata, item_num, results, raise_errors=True)
+                break
+            except RetryLater as e:
+                time.sleep(e.delay)
+            except Exception:
+                return (False, None)
+        if not item:
             return (False, None)
 
+        final_filename = self.postprocess_file(*item)
+        return (final_filename is not None, final_filename)
+
+    def job_host(self, url: str, *args) -> Optional[str]:
+        """Concurrency key for a job: the CDN serving its media, or the page host"""
+        info = self.info_cache.get(url, remember_failure=True)
+        formats = (info or {}).get('formats') or []
+        media_url = next((f['url'] for f in reversed(formats) if f.get('url')), None)
+        return host_key(media_url or url)
+
+    @staticmethod
+    def file_size(info: dict) -> int:
+        """Size of the file, or the streams still to be merged, downloaded for an info dict"""
+        paths = info.get('__streams_to_merge') or [info.get('filepath')]
+        return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+    @staticmethod
+    def item_size(item: FetchedItem) -> int:
+        """Bytes fetched for a pipeline item"""
+        return Downloader.file_size(item.info)
+
+    def create_pipeline(self, download_workers: int, postprocess_workers: int,
+                        fetch: Optional[Callable] = None) -> DownloadPipeline:
+        """Build the download pipeline with this downloader's stages and scheduler settings"""
+        return DownloadPipeline(
+            fetch or functools.partial(self.fetch_file, raise_errors=True),
+            self.postprocess_file,
+            download_workers,
+            postprocess_workers,
+            host_of=self.job_host,
+            size_of=self.item_size,
+            per_host_limit=self.max_per_host,
+            slow_bytes_per_second=self.slow_bytes_per_second,
+        )
+
+    def print_pipeline_summary(self, pipeline: DownloadPipeline, results: JobResults) -> None:
+        """Print per-stage utilization and scheduler throughput for a finished run"""
+        for stats in (pipeline.download_stats, pipeline.postprocess_stats):
+            print(f"📊 {self.t('stage_utilization', stats.name, stats.utilization(pipeline.wall_seconds) * 100, stats.workers, stats.items)}")
+        scheduler = pipeline.scheduler_stats
+        print(f"📈 {self.t('scheduler_stats', scheduler.items_per_second(), scheduler.bytes_per_second() / (1024 * 1024), scheduler.error_rate() * 100, scheduler.throttled, pipeline.global_limiter.limit, pipeline.global_limiter.maximum)}")
+        for host, limiter in sorted(pipeline.host_limiters.items()):
+            print(f"   {self.t('host_limit', host, limiter.limit, limiter.maximum)}")
+        if results.copied or results.transcoded:
+            print(f"🎧 {self.t('audio_modes', results.copied, results.transcoded)}")
+        if results.thumbnail_hits or results.thumbnail_misses:
+            print(f"🖼️ {self.t('thumbnail_cache', results.thumbnail_hits, results.thumbnail_misses)}")
+        if results.retries or results.failed:
+            print(f"🔁 {self.t('retry_summary', results.retries, results.failures(FailureKind.TRANSIENT), results.failures(FailureKind.PERMANENT))}")
+        if results.disk_waits:
+            print(f"💾 {self.t('disk_waits', results.disk_waits)}")
+        if results.reused:
+            print(f"🔗 {self.t('content_saved', results.reused, results.saved_bytes / (1024 * 1024), results.saved_seconds)}")
+        self.print_timing_summary(results)
+
+    def print_timing_summary(self, results: JobResults) -> None:
+        """Print the p50/p95 table of a job's per-item stage timings"""
+        summary = results.metrics.stage_summary()
+        if not summary:
+            return
+        print(f"\n⏱️ {self.t('timing_header')}")
+        print(f"   {'stage':<22} {'count':>6} {'p50':>9} {'p95':>9} {'total':>10}")
+        order = ['extract', 'fetch', 'postprocess']
+        for stage in sorted(summary, key=lambda name: (order.index(name) if name in order else len(order), name)):
+            count, p50, p95, total = summary[stage]
+            print(f"   {stage:<22} {count:>6} {p50:>8.2f}s {p95:>8.2f}s {total:>9.1f}s")
+
     def progress_hook(self, d):
-        """Progress hook for yt-dlp"""
-        if d['status'] == 'downloading':
-            with self.lock:
-                percent = d.get('_percent_str', '?')
-                speed = d.get('_speed_str', '?')
-                eta = d.get('_eta_str', '?')
-                print(f"\r↘️ Downloading: {percent} @ {speed} | ETA: {eta}", end='', flush=True)
-        elif d['status'] == 'finished':
-            with self.lock:
-                print("\r", end='', flush=True)
+        """Progress hook for yt-dlp (lock-free, rendered by the progress board)
+
+        Progress listeners may raise yt_dlp.utils.DownloadCancelled to abort the download;
+        so does a set info_dict['__abort'] event (see stream_merge).
+        """
+        self.board.hook(d)
+        abort = (d.get('info_dict') or {}).get('__abort')
+        if abort is not None and abort.is_set() and d.get('status') == 'downloading':
+            raise yt_dlp.utils.DownloadCancelled('the other stream failed')
+        for listener in self.progress_listeners:
+            listener(d)
+
+    def extract_playlist(self, url: str) -> Optional[dict]:
+        """Extract the flat playlist info without resolving its entries
+
+        The entries are left as the extractor's lazy iterable, so later pages are
+        only fetched as the pipeline consumes them.
+        """
+        ydl = self.ydl_pool.get({'quiet': True, 'extract_flat': 'in_playlist'})
+        info = ydl.extract_info(url, download=False, process=False)
+        if not info or info.get('entries') is None:
+            return None
+        return info
+
+    def playlist_jobs(self, info: dict, output_dir: str, metadata: Optional[dict],
+                      results: JobResults) -> Iterator[tuple]:
+        """Yield pipeline jobs for a flat playlist as its entries are discovered, skipping archived items"""
+        playlist_dir = os.path.join(output_dir, self.sanitize_filename(info.get('title') or 'Untitled Playlist'))
+        archive = self.open_archive(playlist_dir)
+        for i, entry in enumerate(info['entries'], 1):
+            if not entry or not entry.get('url'):
+                continue
+            results.note_discovered(playlist_entry=True)
+            if entry.get('id'):
+                key = self.archive_key(entry, results.options)
+                if archive.is_complete(key):
+                    self.record_result(results, entry['url'], entry.get('title') or entry['url'],
+                                       path=archive.get(key)[1], skipped=True, video_id=entry['id'], item_num=i)
+                    continue
+            yield (entry['url'], playlist_dir, None, metadata, i, results)
 
     def download_playlist(self, url: str, output_dir: str, metadata: Optional[dict] = None) -> bool:
         """Download a YouTube playlist with parallel downloads"""
         try:
-            with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if not info or 'entries' not in info:
-                    return False
-                
-                playlist_title = info.get('title', 'Untitled Playlist')
-                entries = info['entries']
-                total_videos = len(entries)
-                
-                print(f"\n🎵 {self.t('playlist_download', total_videos)}: {playlist_title}")
-                print(f"🚀 {self.t('parallel_download', min(self.max_workers, total_videos))}")
-                
-                self.success_count = 0
-                self.failed_count = 0
-                
-                
-                playlist_dir = os.path.join(output_dir, self.sanitize_filename(playlist_title))
-                os.makedirs(playlist_dir, exist_ok=True)
-                
-                with ThreadPoolExecutor(max_workers=min(self.max_workers, total_videos)) as executor:
-                    futures = []
-                    for i, entry in enumerate(entries, 1):
-                        video_url = entry.get('url')
-                        if not video_url:
-                            continue
-                        
-                        futures.append(
-                            executor.submit(
-                                self.download_single_file,
-                                video_url,
-                                playlist_dir,
-                                None,
-                                metadata,
-                                i
-                            )
-                        )
-                    
-                    for future in as_completed(futures):
-                        
-                        pass
-                
-                print(f"\n🎉 {self.t('download_progress', self.success_count, total_videos, self.failed_count)}")
-                return self.success_count > 0
+            info = self.extract_playlist(url)
+            if not info:
+                return False
+
+            playlist_title = info.get('title') or 'Untitled Playlist'
+
+            print(f"\n🎵 {self.t('playlist_download')}: {playlist_title}")
+            print(f"🚀 {self.t('parallel_download', self.max_workers)}")
+            print(f"⚙️ {self.t('pipeline_workers', self.max_workers, self.postprocess_workers)}")
+
+            results = JobResults(self.options, self.release_item)
+            playlist_dir = os.path.join(output_dir, self.sanitize_filename(playlist_title))
+            resumed = self.open_archive(playlist_dir).count(JobStatus.IN_PROGRESS)
+            if resumed:
+                print(f"🔁 {self.t('archive_resume', resumed)}")
+
+            pipeline = self.create_pipeline(self.max_workers, self.postprocess_workers)
+            with self.board.running():
+                pipeline.run(self.playlist_jobs(info, output_dir, metadata, results))
+
+            if results.skipped:
+                print(f"⏭️ {self.t('archive_skip', results.skipped)}")
+            print(f"\n🎉 {self.t('download_progress', results.succeeded + results.skipped, results.discovered, results.failed)}")
+            self.print_pipeline_summary(pipeline, results)
+            return results.succeeded + results.skipped > 0
         except Exception as e:
             print(f"\n❌ {self.t('error')} {str(e)}")
             return False
 
+    def batch_jobs(self, urls: Iterable[str], output_dir: str, results: JobResults) -> Iterator[tuple]:
+        """Yield pipeline jobs for a stream of video and playlist URLs"""
+        for url in urls:
+            if not self.validate_url(url):
+                results.note_discovered()
+                self.record_result(results, url, url, error=ValueError(self.t('invalid_url')))
+                continue
+            if not self.is_playlist(url):
+                results.note_discovered()
+                yield (url, output_dir, None, None, None, results)
+                continue
+            try:
+                info = self.extract_playlist(url)
+            except Exception as e:
+                results.note_discovered()
+                self.record_result(results, url, url, error=e)
+                continue
+            if not info:
+                results.note_discovered()
+                self.record_result(results, url, url)
+                continue
+            yield from self.playlist_jobs(info, output_dir, None, results)
+
+    def download(self, urls: Iterable[str], output_dir: str, options: Optional[JobOptions] = None,
+                 listener: Optional[Callable[[ItemResult], None]] = None) -> JobResults:
+        """Download video and playlist URLs as one job and return its per-item results (thread-safe)
+
+        Every call runs its own pipeline with its own results, so several jobs can
+        run in parallel threads of one process. Without a listener, each item's
+        cached info is dropped once it is recorded.
+        """
+        results = JobResults(options or self.options, listener or self.release_item)
+        self.create_pipeline(self.max_workers, self.postprocess_workers).run(self.batch_jobs(urls, output_dir, results))
+        return results
+
+    def run_batch(self, urls: Iterable[str], output_dir: str) -> JobResults:
+        """Non-interactive mode: run every URL through one long-lived download pipeline"""
+        results = JobResults(self.options, self.release_item)
+        print(f"⚙️ {self.t('pipeline_workers', self.max_workers, self.postprocess_workers)}")
+        pipeline = self.create_pipeline(self.max_workers, self.postprocess_workers)
+        try:
+            with self.board.running():
+                pipeline.run(self.batch_jobs(urls, output_dir, results))
+        finally:
+            self.ydl_pool.close()
+
+        print(f"\n🎉 {self.t('download_progress', results.succeeded + results.skipped, results.discovered, results.failed)}")
+        self.print_pipeline_summary(pipeline, results)
+        return results
+
     def validate_url(self, url: str) -> bool:
         """Validate YouTube URL"""
         patterns = [
@@ -444,18 +3212,19 @@ class Downloader:
                 print(f"❌ {self.t('invalid_url')}")
 
             
-            self.download_format = self.select_format()
+            self.options = self.options._replace(download_format=self.select_format())
             
             
+            self.select_quality()
+
             if not self.is_playlist(url):
                 formats = self.get_available_formats(url)
                 if formats:
                     print(f"\nℹ️ {self.t('available_formats')}")
-                    for i, (format_id, ext, quality, size) in enumerate(formats[:5], 1):
-                        print(self.t('format_info', i, ext.upper(), quality, size))
-
-            
-            self.select_quality()
+                    for i, choice in enumerate(formats[:5], 1):
+                        ext = (choice.video or choice.audio).ext
+                        line = self.t('format_info', i, ext.upper(), choice.label, choice.filesize // (1024 * 1024))
+                        print(f"{line} ✅ {self.t('format_selected')}" if i == 1 else line)
             
             
             custom_dir = input(f"\n📁 {self.t('download_dir')} ").strip()
@@ -477,7 +3246,8 @@ class Downloader:
             if self.is_playlist(url):
                 success = self.download_playlist(url, output_dir, metadata)
             else:
-                success, filepath = self.download_single_file(url, output_dir, custom_filename, metadata)
+                with self.board.running():
+                    success, filepath = self.download_single_file(url, output_dir, custom_filename, metadata)
                 if success and filepath:
                     print(f"\n🎧 {self.t('download_complete')}:\n{os.path.abspath(filepath)}")
             
@@ -493,6 +3263,567 @@ class Downloader:
             print(f"\n\n💥 {self.t('error')} {e}")
             sys.exit(1)
 
+class EventBus:
+    """Fan-out of daemon events to server-sent-event subscribers (thread-safe)
+
+    Every subscriber gets a bounded queue; a subscriber that falls behind loses
+    events instead of blocking the downloads that publish them.
+    """
+    def __init__(self, backlog: int = 1000):
+        self.backlog = backlog
+        self.lock = threading.Lock()
+        self.subscribers: List[queue.Queue] = []
+        self.next_id = 1
+
+    def publish(self, event: dict) -> None:
+        """Send an event to every subscriber"""
+        with self.lock:
+            event = {'id': self.next_id, 'time': time.time(), **event}
+            self.next_id += 1
+            for subscriber in self.subscribers:
+                with contextlib.suppress(queue.Full):
+                    subscriber.put_nowait(event)
+
+    @contextlib.contextmanager
+    def subscribe(self):
+        """Yield a queue that receives every event published while the context is open"""
+        subscriber: queue.Queue = queue.Queue(maxsize=self.backlog)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        try:
+            yield subscriber
+        finally:
+            with self.lock:
+                self.subscribers.remove(subscriber)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded HTTP server on a Unix domain socket"""
+    daemon_threads = True
+
+class DownloadDaemon:
+    """Long-running download service with a local job API
+
+    One warm Downloader (pooled YoutubeDL instances, cached infos, thumbnails and
+    FFmpeg lookup) and one download pipeline stay alive between jobs, so a job
+    only pays for extraction and the network. Jobs are persisted in a JobQueue
+    and served over HTTP on a local port or a Unix socket:
+
+        POST /jobs {"url": ..., "output_dir": ..., "options": {...}}   submit a video or playlist
+                                                     (output_dir is relative to, and inside, the daemon's)
+        GET /jobs, GET /jobs/<id>                    list jobs, job status
+        DELETE /jobs/<id>                            cancel a queued or running job
+        GET /events                                  progress as server-sent events
+        GET /metrics, GET /metrics.json              pipeline metrics
+    """
+    PROGRESS_INTERVAL = 0.5
+    KEEPALIVE_INTERVAL = 15.0
+    _STOP = object()
+
+    def __init__(self, downloader: Downloader, job_queue: JobQueue, output_dir: str):
+        self.downloader = downloader
+        self.job_queue = job_queue
+        self.output_dir = output_dir
+        self.events = EventBus()
+        self.submitted: queue.Queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.active: Dict[int, JobResults] = {}
+        self.pending: Dict[int, int] = {}
+        self.cancelled: set = set()
+        self.url_jobs: Dict[str, List[int]] = {}
+        self.last_progress: Dict[str, float] = {}
+
+    @staticmethod
+    def is_local_address(address: str) -> bool:
+        """True if a --serve address is a Unix socket or a loopback host"""
+        host, _, port = address.rpartition(':')
+        if not port.isdigit() or '/' in address:
+            return True
+        host = host.strip('[]')
+        if not host or host == 'localhost':
+            return True
+        try:
+            return ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            return False
+
+    def job_output_dir(self, output_dir: Optional[str]) -> str:
+        """Resolve a job's output_dir against the daemon's; ValueError if it points outside it"""
+        root = os.path.realpath(self.output_dir)
+        if not output_dir:
+            return self.output_dir
+        path = os.path.realpath(os.path.join(root, output_dir))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(self.downloader.t('output_dir_outside', self.output_dir))
+        return path
+
+    def submit(self, url: str, output_dir: Optional[str] = None, options: Optional[dict] = None) -> dict:
+        """Queue a video or playlist URL with optional JobOptions overrides and return the new job"""
+        if not self.downloader.validate_url(url):
+            raise ValueError(self.downloader.t('invalid_url'))
+        job_options = JobOptions.from_json(options or {}, self.downloader.options)
+        job = self.job_queue.add(url, self.job_output_dir(output_dir), job_options.to_json())
+        self.downloader.board.log(f"📨 {self.downloader.t('job_submitted', job['id'], url)}")
+        self.events.publish({'type': 'job', 'job': job})
+        self.submitted.put(job['id'])
+        return job
+
+    def cancel(self, job_id: int) -> Optional[dict]:
+        """Cancel a queued or running job; its in-flight downloads are aborted"""
+        cancellable = (QueuedJobStatus.QUEUED, QueuedJobStatus.RUNNING)
+        with self.lock:
+            cancelled = self.job_queue.set_status(job_id, QueuedJobStatus.CANCELLED, only_from=cancellable)
+            if cancelled:
+                self.cancelled.add(job_id)
+        job = self.job_queue.get(job_id)
+        if cancelled:
+            self.events.publish({'type': 'job', 'job': job})
+        return job
+
+    def _set_status(self, job_id: int, status: QueuedJobStatus, **kwargs) -> bool:
+        moved = self.job_queue.set_status(job_id, status, **kwargs)
+        if moved:
+            self.events.publish({'type': 'job', 'job': self.job_queue.get(job_id)})
+        return moved
+
+    def _counts(self, results: JobResults) -> Dict[str, int]:
+        return {'items': results.discovered, 'succeeded': results.succeeded,
+                'failed': results.failed, 'skipped': results.skipped}
+
+    def _job_of(self, results: JobResults) -> Optional[int]:
+        """Job id of an active job's results (call with the lock held)"""
+        return next((job_id for job_id, active in self.active.items() if active is results), None)
+
+    def _finish_if_done(self, job_id: int) -> None:
+        with self.lock:
+            results = self.active.get(job_id)
+            # A job is done once it is fully expanded and every yielded item has reported
+            if results is None or self.pending.get(job_id, 0) > 0:
+                return
+            del self.active[job_id]
+            self.pending.pop(job_id, None)
+            self.cancelled.discard(job_id)
+        failures = [item for item in results.items if item.status == 'failed']
+        status = QueuedJobStatus.FAILED if failures else QueuedJobStatus.COMPLETED
+        if self._set_status(job_id, status, error=failures[0].error if failures else None,
+                            only_from=(QueuedJobStatus.RUNNING,)):
+            self.downloader.board.log(f"🏁 {self.downloader.t('job_finished', job_id, status.value, results.succeeded, results.skipped, len(failures))}")
+
+    def jobs(self) -> Iterator[tuple]:
+        """Blocking pipeline job source: expand submitted jobs into items until the daemon stops"""
+        while not self.stopping.is_set():
+            job_id = self.submitted.get()
+            if job_id is self._STOP:
+                return
+            with self.lock:
+                job = self.job_queue.get(job_id)
+                if not job or not self.job_queue.set_status(job_id, QueuedJobStatus.RUNNING,
+                                                            only_from=(QueuedJobStatus.QUEUED,)):
+                    continue
+                try:
+                    options = JobOptions.from_json(job['options'] or {}, self.downloader.options)
+                except ValueError:
+                    options = self.downloader.options
+                results = self.active[job_id] = JobResults(options, functools.partial(self.on_result, job_id), job_id)
+                # Held at one until the job is expanded, so it cannot finish early
+                self.pending[job_id] = 1
+            self.events.publish({'type': 'job', 'job': self.job_queue.get(job_id)})
+            try:
+                for item in self.downloader.batch_jobs([job['url']], job['output_dir'], results):
+                    if self.stopping.is_set():
+                        return
+                    with self.lock:
+                        if job_id in self.cancelled:
+                            break
+                        self.url_jobs.setdefault(item[0], []).append(job_id)
+                        self.pending[job_id] += 1
+                    yield item
+            finally:
+                with self.lock:
+                    self.pending[job_id] -= 1
+            self.job_queue.set_counts(job_id, self._counts(results))
+            self._finish_if_done(job_id)
+
+    def fetch(self, url: str, *args) -> Optional[tuple]:
+        """Pipeline fetch stage that skips the items of cancelled jobs"""
+        results = args[-1]
+        with self.lock:
+            cancelled = self.stopping.is_set() or self._job_of(results) in self.cancelled
+        if cancelled:
+            self.downloader.record_result(results, url, url, error=yt_dlp.utils.DownloadCancelled('job cancelled'))
+            return None
+        return self.downloader.fetch_file(url, *args, raise_errors=True)
+
+    def on_result(self, job_id: int, item: ItemResult) -> None:
+        """JobResults listener: persist a job's counters and publish the item"""
+        if self.stopping.is_set():
+            return
+        with self.lock:
+            results = self.active.get(job_id)
+            jobs = self.url_jobs.get(item.url)
+            if jobs and job_id in jobs:
+                jobs.remove(job_id)
+                self.pending[job_id] -= 1
+                if not jobs:
+                    del self.url_jobs[item.url]
+                    self.last_progress.pop(item.url, None)
+            finished_url = item.url not in self.url_jobs
+        if results is None:
+            return
+        if finished_url:
+            self.downloader.info_cache.discard(item.url)
+        self.job_queue.set_counts(job_id, self._counts(results))
+        self.events.publish({'type': 'item', 'job': job_id, **item._asdict()})
+        self._finish_if_done(job_id)
+
+    def on_progress(self, d: dict) -> None:
+        """Downloader progress listener: abort cancelled downloads and publish throttled progress"""
+        info = d.get('info_dict') or {}
+        url = info.get('original_url') or info.get('webpage_url')
+        now = time.monotonic()
+        # Stopping once every byte is written would leave a complete .part file behind
+        complete = d.get('status') != 'downloading' or d.get('downloaded_bytes') == d.get('total_bytes')
+        with self.lock:
+            jobs = self.url_jobs.get(url)
+            if not complete and (self.stopping.is_set() or (jobs and jobs[0] in self.cancelled)):
+                raise yt_dlp.utils.DownloadCancelled('job cancelled')
+            if not jobs or (d.get('status') == 'downloading'
+                            and now - self.last_progress.get(url, 0.0) < self.PROGRESS_INTERVAL):
+                return
+            self.last_progress[url] = now
+            job_id = jobs[0]
+        self.events.publish({
+            'type': 'progress',
+            'job': job_id,
+            'url': url,
+            'status': d.get('status'),
+            'downloaded_bytes': d.get('downloaded_bytes'),
+            'total_bytes': d.get('total_bytes') or d.get('total_bytes_estimate'),
+            'speed': d.get('speed'),
+        })
+
+    def make_handler(self) -> type:
+        """Build the request handler class for the job API"""
+        daemon = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def send_json(self, status: int, payload) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def job_id(self) -> Optional[int]:
+                match = re.fullmatch(r'/jobs/(\d+)', urllib.parse.urlsplit(self.path).path)
+                return int(match.group(1)) if match else None
+
+            def do_GET(self):
+                path = urllib.parse.urlsplit(self.path).path
+                if path == '/jobs':
+                    status = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get('status')
+                    try:
+                        self.send_json(200, daemon.job_queue.list(QueuedJobStatus(status[0]) if status else None))
+                    except ValueError as e:
+                        self.send_json(400, {'error': str(e)})
+                elif path == '/events':
+                    self.stream_events()
+                elif path == '/metrics':
+                    body = daemon.downloader.metrics.to_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == '/metrics.json':
+                    self.send_json(200, daemon.downloader.metrics.to_json())
+                elif self.job_id() is not None:
+                    job = daemon.job_queue.get(self.job_id())
+                    self.send_json(200 if job else 404, job or {'error': 'no such job'})
+                else:
+                    self.send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if urllib.parse.urlsplit(self.path).path != '/jobs':
+                    self.send_json(404, {'error': 'not found'})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                    if not isinstance(request, dict) or not isinstance(request.get('url'), str):
+                        raise ValueError("expected a JSON object with a 'url'")
+                    if not isinstance(request.get('options') or {}, dict):
+                        raise ValueError("'options' must be a JSON object")
+                    if not isinstance(request.get('output_dir') or '', str):
+                        raise ValueError("'output_dir' must be a string")
+                    job = daemon.submit(request['url'].strip(), request.get('output_dir'), request.get('options'))
+                except ValueError as e:
+                    self.send_json(400, {'error': str(e)})
+                    return
+                self.send_json(201, job)
+
+            def do_DELETE(self):
+                job = daemon.cancel(self.job_id()) if self.job_id() is not None else None
+                self.send_json(200 if job else 404, job or {'error': 'no such job'})
+
+            def stream_events(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                with daemon.events.subscribe() as events:
+                    try:
+                        while not daemon.stopping.is_set():
+                            try:
+                                event = events.get(timeout=daemon.KEEPALIVE_INTERVAL)
+                            except queue.Empty:
+                                self.wfile.write(b': keepalive\n\n')
+                            else:
+                                data = json.dumps(event, ensure_ascii=False)
+                                self.wfile.write(f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n".encode())
+                            self.wfile.flush()
+                    except OSError:
+                        pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve(self, address: str) -> socketserver.BaseServer:
+        """Serve the job API from a background thread on [HOST:]PORT (127.0.0.1 by default) or a Unix socket path"""
+        handler = self.make_handler()
+        host, _, port = address.rpartition(':')
+        if port.isdigit() and '/' not in address:
+            server = http.server.ThreadingHTTPServer((host or '127.0.0.1', int(port)), handler)
+        else:
+            with contextlib.suppress(FileNotFoundError):
+                if stat.S_ISSOCK(os.stat(address).st_mode):
+                    os.remove(address)
+            server = UnixHTTPServer(address, handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def run(self, address: str) -> None:
+        """Serve the job API and run submitted jobs until interrupted"""
+        resumed = self.job_queue.resume()
+        if resumed:
+            print(f"🔁 {self.downloader.t('daemon_resumed', len(resumed))}")
+        for job_id in resumed:
+            self.submitted.put(job_id)
+
+        self.downloader.progress_listeners.append(self.on_progress)
+        server = self.serve(address)
+        print(f"📡 {self.downloader.t('daemon_listening', address)}")
+        print(f"⚙️ {self.downloader.t('pipeline_workers', self.downloader.max_workers, self.downloader.postprocess_workers)}")
+        pipeline = self.downloader.create_pipeline(self.downloader.max_workers, self.downloader.postprocess_workers,
+                                                   fetch=self.fetch)
+        worker = threading.Thread(target=pipeline.run, args=(self.jobs(),), daemon=True)
+        try:
+            with self.downloader.board.running():
+                worker.start()
+                while worker.is_alive():
+                    worker.join(0.5)
+        except KeyboardInterrupt:
+            print(f"\n🛑 {self.downloader.t('daemon_stopping')}")
+        finally:
+            self.stopping.set()
+            self.submitted.put(self._STOP)
+            pipeline.flush_retries()
+            server.shutdown()
+            server.server_close()
+            if isinstance(server, UnixHTTPServer):
+                with contextlib.suppress(OSError):
+                    os.remove(address)
+            worker.join()
+            self.downloader.ydl_pool.close()
+
+def parse_quality(value: str, download_format: DownloadFormat):
+    """Resolve a quality given as a name (BEST, HD) or value (320, 720p) for the format"""
+    qualities = AudioQuality if download_format == DownloadFormat.AUDIO else VideoQuality
+    normalized = re.sub(r'(KBPS|K|P)$', '', value.strip().upper())
+    for quality in qualities:
+        if normalized in (quality.name, quality.value):
+            return quality
+    raise ValueError(f"invalid {download_format.value} quality: {value}")
+
+def iter_urls(urls: List[str], input_file: Optional[str]) -> Iterator[str]:
+    """Yield URLs from the command line, then from a file or stdin ('-'), skipping blanks and comments"""
+    yield from urls
+    if input_file is None:
+        return
+
+    stream = sys.stdin if input_file == '-' else open(input_file, encoding='utf-8')
+    try:
+        for line in stream:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line arguments for non-interactive (batch) mode"""
+    parser = argparse.ArgumentParser(
+        description="YouTube video & audio downloader. Run without arguments for interactive mode."
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--audio', dest='format', action='store_const', const=DownloadFormat.AUDIO,
+                      help="download audio only (MP3, default)")
+    mode.add_argument('--video', dest='format', action='store_const', const=DownloadFormat.VIDEO,
+                      help="download video with audio (MP4)")
+    parser.set_defaults(format=DownloadFormat.AUDIO)
+    parser.add_argument('--audio-format', type=AudioCodec, default=AudioCodec.MP3,
+                        choices=list(AudioCodec), metavar='{' + ','.join(c.value for c in AudioCodec) + '}',
+                        help="audio output: mp3 (default), m4a or opus, copied when the source already matches, "
+                             "or native to always keep the source codec without transcoding")
+    parser.add_argument('urls', nargs='*', metavar='URL', help="video or playlist URLs")
+    parser.add_argument('--format-strategy', type=FormatStrategy, default=FormatStrategy.NO_TRANSCODE,
+                        choices=list(FormatStrategy), metavar='{' + ','.join(s.value for s in FormatStrategy) + '}',
+                        help="how formats are ranked: no-transcode (default) prefers streams that can be copied, "
+                             "best the highest quality, smallest the smallest file that meets --quality")
+    parser.add_argument('-i', '--input-file', metavar='FILE',
+                        help="read URLs from FILE, one per line ('-' for stdin)")
+    parser.add_argument('-q', '--quality',
+                        help="audio bitrate (320, 256, ...) or video height (1080, 720, ...), or a name such as BEST or HD")
+    parser.add_argument('-o', '--output-dir', default='downloads', help="download directory (default: downloads)")
+    parser.add_argument('-w', '--workers', type=int, default=5, help="parallel download workers (default: 5)")
+    parser.add_argument('--postprocess-workers', type=int, default=None,
+                        help="parallel FFmpeg workers (default: CPU count)")
+    parser.add_argument('--max-per-host', type=int, default=None, metavar='N',
+                        help="concurrent downloads per host/CDN (default: same as --workers)")
+    parser.add_argument('--slow-speed', type=float, default=None, metavar='KBPS',
+                        help="back off when a download averages below this speed in KiB/s")
+    parser.add_argument('--retries', type=int, default=3, metavar='N',
+                        help="retry an item up to N times after a transient failure (default: 3, 0 to disable)")
+    parser.add_argument('--retry-budget', type=int, default=50, metavar='N',
+                        help="retries allowed per job across all of its items (default: 50)")
+    parser.add_argument('--segments', type=int, default=4, metavar='N',
+                        help="connections per large file, downloaded as parallel byte ranges (default: 4, 1 to disable)")
+    parser.add_argument('--segment-min-size', type=float, default=10, metavar='MB',
+                        help="only split files of at least this many MiB (default: 10)")
+    parser.add_argument('--no-stream-merge', dest='stream_merge', action='store_false',
+                        help="let yt-dlp download video and audio one after the other and merge them, instead of "
+                             "downloading both at once and merging them in the finalize pass")
+    parser.add_argument('--scratch-dir', metavar='DIR',
+                        help="write partial and intermediate files to DIR (e.g. a tmpfs) and move finished files "
+                             "into the output directory")
+    parser.add_argument('--min-free-space', type=float, default=512, metavar='MB',
+                        help="hold back new downloads while they would leave less than this many MiB free "
+                             "in the output directory (default: 512)")
+    parser.add_argument('--scratch-min-free-space', type=float, default=0, metavar='MB',
+                        help="the same for --scratch-dir when it is on another filesystem (default: 0)")
+    parser.add_argument('--no-dedupe', dest='dedupe', action='store_false',
+                        help="always download and convert, instead of reusing a file already produced "
+                             "for the same video, format and quality")
+    parser.add_argument('--jsonl', default='-', metavar='FILE',
+                        help="append one JSON result per item to FILE ('-' for stdout, default)")
+    parser.add_argument('--metrics-json', metavar='FILE',
+                        help="write per-item stage timings, bytes and retries to FILE as JSON")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, metavar='DIR',
+                        help=f"cache directory for thumbnails (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--thumbnail-cache-size', type=int, default=64, metavar='MB',
+                        help="maximum size of the thumbnail cache in MiB (default: 64)")
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help="run as a daemon that accepts jobs over HTTP on [HOST:]PORT (127.0.0.1 by default) "
+                             "or on a Unix socket path; URLs given on the command line are queued as jobs")
+    parser.add_argument('--serve-public', action='store_true',
+                        help="allow --serve on a non-loopback host; the job API has no authentication")
+    parser.add_argument('--queue-db', metavar='FILE',
+                        help="daemon job queue, kept across restarts (default: daemon.sqlite3 in --cache-dir)")
+    parser.add_argument('--lang', choices=sorted(LANGUAGES), default='en', help="message language")
+
+    args = parser.parse_args(argv)
+    if args.quality:
+        try:
+            args.quality = parse_quality(args.quality, args.format)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.serve and not args.serve_public and not DownloadDaemon.is_local_address(args.serve):
+        parser.error("--serve on a non-loopback host needs --serve-public")
+    if not args.urls and args.input_file is None and not args.serve and not sys.stdin.isatty():
+        args.input_file = '-'
+    if args.workers < 1 or args.segments < 1 or any(value is not None and value < 1 for value in (args.postprocess_workers, args.max_per_host)):
+        parser.error("worker counts must be at least 1")
+    if args.retries < 0 or args.retry_budget < 0:
+        parser.error("retry counts must not be negative")
+    if args.min_free_space < 0 or args.scratch_min_free_space < 0:
+        parser.error("free space limits must not be negative")
+    return args
+
+def run_cli(argv: Optional[List[str]] = None) -> int:
+    """Entry point for non-interactive mode; returns the process exit code"""
+    args = parse_args(argv)
+    result_stream = sys.stdout if args.jsonl == '-' else open(args.jsonl, 'a', encoding='utf-8')
+    console = sys.stderr if result_stream is sys.stdout else sys.stdout
+    try:
+        with contextlib.redirect_stdout(console):
+            downloader = Downloader(args.lang, cache_dir=os.path.expanduser(args.cache_dir))
+            downloader.thumbnail_cache.max_bytes = args.thumbnail_cache_size * 1024 * 1024
+            downloader.result_stream = result_stream
+            options = JobOptions(download_format=args.format, audio_codec=args.audio_format,
+                                 format_strategy=args.format_strategy)
+            if isinstance(args.quality, AudioQuality):
+                options = options._replace(audio_quality=args.quality)
+            elif isinstance(args.quality, VideoQuality):
+                options = options._replace(video_quality=args.quality)
+            downloader.options = options
+            downloader.max_workers = args.workers
+            if args.postprocess_workers:
+                downloader.postprocess_workers = args.postprocess_workers
+            downloader.max_per_host = args.max_per_host
+            downloader.retry_policy = RetryPolicy(args.retries, args.retry_budget)
+            downloader.disk_gate.min_free = int(args.min_free_space * 1024 * 1024)
+            downloader.disk_gate.scratch_min_free = int(args.scratch_min_free_space * 1024 * 1024)
+            downloader.dedupe_enabled = args.dedupe
+            if args.scratch_dir:
+                downloader.scratch_dir = os.path.abspath(os.path.expanduser(args.scratch_dir))
+            downloader.segment_connections = args.segments
+            downloader.stream_merge_enabled = args.stream_merge
+            downloader.segment_min_bytes = int(args.segment_min_size * 1024 * 1024)
+            if args.slow_speed:
+                downloader.slow_bytes_per_second = args.slow_speed * 1024
+            metrics_server = downloader.metrics.serve(args.metrics_port) if args.metrics_port else None
+
+            if args.serve:
+                queue_db = os.path.expanduser(args.queue_db or os.path.join(downloader.cache_dir, 'daemon.sqlite3'))
+                daemon = DownloadDaemon(downloader, JobQueue(queue_db), os.path.expanduser(args.output_dir))
+                try:
+                    for url in iter_urls(args.urls, args.input_file):
+                        try:
+                            daemon.submit(url)
+                        except ValueError as e:
+                            print(f"❌ {url}: {e}")
+                    daemon.run(args.serve)
+                finally:
+                    if metrics_server is not None:
+                        metrics_server.shutdown()
+                return 0
+
+            try:
+                results = downloader.run_batch(
+                    iter_urls(args.urls, args.input_file),
+                    os.path.expanduser(args.output_dir),
+                )
+            except KeyboardInterrupt:
+                print(f"\n\n🛑 {downloader.t('cancelled')}")
+                return 130
+            finally:
+                if args.metrics_json:
+                    with open(args.metrics_json, 'w', encoding='utf-8') as f:
+                        json.dump(downloader.metrics.to_json(), f, indent=2)
+                if metrics_server is not None:
+                    metrics_server.shutdown()
+        return 0 if results.failed == 0 else 1
+    finally:
+        if result_stream is not sys.stdout:
+            result_stream.close()
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli())
     downloader = Downloader()
     downloader.main()
\ No newline at end of file